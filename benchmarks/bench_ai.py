@@ -0,0 +1,179 @@
+"""AI 请求路径压力测试：在本地启动模拟接口（mock_llm.py），用程序同样的 AIClient、AIScheduler 和
+request_explanation（请求体由 build_explain_request 生成，结果写入临时的 AICache）并发请求解析，统计吞吐量、端到端延迟和首个片段耗时（TTFT）的分位数，以及重试和各类错误的次数。
+
+用法：
+    python benchmarks/bench_ai.py                                         # 200 次流式解析，并发 8
+    python benchmarks/bench_ai.py --error-429 0.1 --error-5xx 0.05 --drop 0.02 --out bench_ai.json
+    python benchmarks/bench_ai.py --mode ping --requests 50               # 测试连接使用的短请求
+    python benchmarks/bench_ai.py --url http://127.0.0.1:8765/v1/chat/completions   # 使用已启动的接口
+
+限流默认放宽到 --rate 50，程序自身的默认值是每秒 2 个请求，需要复现真实限流时用 --rate 2。
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiku_core import (AICache, AIClient, AIRequestError, AIScheduler, TRUNCATED_NOTICE, TimingLog,  # noqa: E402
+                       request_explanation)
+from bench_core import summarize  # noqa: E402
+from mock_llm import add_server_arguments, server_from_args  # noqa: E402
+
+
+def classify(exc, event, truncated=False):
+    """把一次请求的结果归类：ok、truncated（流被截断，带未完整提示返回）、http_状态码或异常类名"""
+    if exc is None:
+        return 'truncated' if truncated else 'ok'
+    if isinstance(exc, AIRequestError) and event.get('status'):
+        return f"http_{event['status']}"
+    return type(exc).__name__
+
+
+def run_explain(args, url, client, log):
+    """按程序的路径（AIScheduler.submit -> request_explanation）发出全部请求，题目各不相同，调度器不会合并。
+    返回 [(请求编号, 异常, 端到端秒数, 是否被截断)]"""
+    scheduler = AIScheduler(max_workers=args.concurrency)
+    config = {'model': args.model, 'api_url': url, 'api_key': 'mock', 'stream': not args.no_stream,
+              'enable_reasoning': args.enable_thinking}
+    results, lock, done = [], threading.Lock(), threading.Event()
+
+    def make_fetch(i, cache):
+        def fetch(emit, cancelled):
+            # request_explanation 的计时不带请求编号，先记在单独的 TimingLog 里，结束后加上编号转入 log
+            timings = TimingLog(capacity=1, enabled=True)
+            try:
+                return request_explanation(client, cache, config, timings, f"压力测试第 {i} 题", "A",
+                                           on_delta=emit, cancelled=cancelled)
+            finally:
+                for event in timings.recent(1):
+                    fields = {k: v for k, v in event.items() if k not in ('name', 'time', 'ms')}
+                    log.record(event['name'], event['ms'] / 1000, request=i, **fields)
+        return fetch
+
+    def finished(i, submitted):
+        def callback(future):
+            exc = future.exception()
+            truncated = exc is None and future.result()[1].endswith(TRUNCATED_NOTICE)
+            with lock:
+                results.append((i, exc, time.perf_counter() - submitted, truncated))
+                if len(results) == args.requests:
+                    done.set()
+        return callback
+
+    with tempfile.TemporaryDirectory() as folder:
+        cache = AICache(os.path.join(folder, 'ai_cache.db'))
+        for i in range(args.requests):
+            sub = scheduler.submit(f"bench-{i}", make_fetch(i, cache))
+            sub.add_done_callback(finished(i, time.perf_counter()))
+        done.wait()
+        scheduler.shutdown()
+    return results, scheduler.stats()
+
+
+def run_ping(args, url, client, log):
+    """与“测试连接”相同的短请求，每个在独立线程中发出"""
+    headers = {"Authorization": "Bearer mock", "Content-Type": "application/json"}
+    payload = {"model": args.model, "messages": [{"role": "user", "content": "你好"}], "max_tokens": 10}
+
+    def ping(i):
+        submitted = time.perf_counter()
+        try:
+            with log.span('ai_request', request=i) as sp:
+                r = client.post(url, payload, headers, timeout=(5, 10))
+                sp.set(status=r.status_code, first_byte_ms=round(r.elapsed.total_seconds() * 1000, 3))
+                r.close()
+                if r.status_code != 200:
+                    raise AIRequestError(f"状态码:{r.status_code}")
+            exc = None
+        except Exception as e:
+            exc = e
+        return i, exc, time.perf_counter() - submitted, False
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        return list(pool.map(ping, range(args.requests))), None
+
+
+def run(args):
+    server = None
+    url = args.url
+    if not url:
+        server = server_from_args(args, seed=args.seed).start()
+        url = server.url
+    client = AIClient(max_retries=args.max_retries, backoff=args.backoff, rate=args.rate, burst=args.burst,
+                      timeout=(5, args.timeout), pool_size=max(8, args.concurrency))
+    log = TimingLog(capacity=args.requests, enabled=True)
+    start = time.perf_counter()
+    try:
+        results, scheduler_stats = (run_ping if args.mode == 'ping' else run_explain)(args, url, client, log)
+    finally:
+        wall = time.perf_counter() - start
+        server_stats = server.stats() if server else None
+        if server:
+            server.stop()
+
+    events = {e['request']: e for e in log.recent(args.requests)}
+    outcomes = Counter(classify(exc, events.get(i, {}), truncated) for i, exc, _, truncated in results)
+    ok = [seconds for i, exc, seconds, _ in results if exc is None]
+
+    def field(name):
+        return [events[i][name] / 1000 for i, exc, _, _ in results if exc is None and name in events.get(i, {})]
+
+    report = {'requests': len(results), 'wall_s': round(wall, 3),
+              'throughput_ok_per_s': round(len(ok) / wall, 2) if wall > 0 else None,
+              'outcomes': dict(outcomes), 'client': client.stats(), 'scheduler': scheduler_stats,
+              'server': server_stats}
+    for name, values in [('latency', ok), ('ttft', field('first_token_ms')), ('first_byte', field('first_byte_ms')),
+                         ('client_wait', field('wait_ms'))]:
+        if values:
+            report[name] = summarize(values, total=wall)
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', default='explain', choices=['explain', 'ping'])
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--concurrency', type=int, default=8, help="AIScheduler 工作线程数（程序默认 4）")
+    parser.add_argument('--no-stream', action='store_true', help="使用非流式响应")
+    parser.add_argument('--enable-thinking', action='store_true', help="请求中带 enable_thinking")
+    parser.add_argument('--model', default='mock-model')
+    parser.add_argument('--url', help="已有接口地址；不给时在本进程启动模拟接口")
+    parser.add_argument('--rate', type=float, default=50.0, help="客户端令牌桶速率（每秒请求数）")
+    parser.add_argument('--burst', type=int, default=8)
+    parser.add_argument('--max-retries', type=int, default=3)
+    parser.add_argument('--backoff', type=float, default=0.5)
+    parser.add_argument('--timeout', type=float, default=60.0, help="读超时（秒）")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--label', default='')
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_ai_results.json'),
+                        help="结果 JSON，默认写到 benchmarks/bench_ai_results.json")
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+
+    report = run(args)
+    report['meta'] = {'label': args.label, 'args': vars(args), 'python': platform.python_version(),
+                      'platform': platform.platform(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+    print(f"{report['requests']} 次请求，用时 {report['wall_s']} s，成功 {report['throughput_ok_per_s']} 次/秒")
+    print(f"结果：{report['outcomes']}  客户端：{report['client']}")
+    if report['server'] is not None:
+        print(f"模拟接口：{report['server']}")
+    for name in ('latency', 'ttft', 'first_byte', 'client_wait'):
+        if name in report:
+            r = report[name]
+            print(f"{name:12s} p50 {r['p50_ms']:.1f}ms  p95 {r['p95_ms']:.1f}ms  p99 {r['p99_ms']:.1f}ms  "
+                  f"max {r['max_ms']:.1f}ms")
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.out}")
+
+
+if __name__ == '__main__':
+    main()
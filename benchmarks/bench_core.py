@@ -0,0 +1,201 @@
+"""题库核心逻辑基准测试：生成合成题库，测量加载、检索、抽题和判分的吞吐量与延迟分位数。
+
+用法：
+    python benchmarks/bench_core.py                      # 默认 1k,10k,100k
+    python benchmarks/bench_core.py --sizes 1k,1m --out bench.json --label v5.2
+
+结果写入 JSON，便于不同版本之间对比。1m 规模的 CSV 约 300 MB，内存模式建索引需要数 GB 内存。
+"""
+import argparse
+import csv
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from tiku_core import ExamHistory, QuestionLibrary, grade_answer  # noqa: E402
+
+# 合成题干用的常用字，按 1/k 的频率分布抽取，接近真实中文文本中少数高频字占多数的情况
+COMMON = ("的是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可主发年动同工也能下过子说产种面而方后多定行学法"
+          "所民得经十三之进着等部度家电力里如水化高自二理起小物现实加量都两体制机当使点从业本去把性好应开它合还因由其些然前外天政"
+          "四日那社义事平形相全表间样与关各重新线内数正心反你明看原又么利比或但质气第向道命此变条只没结解问意建月公无系军很情者最"
+          "立代想已通并提直题党程展五果料象员革位入常文总次品式活设及管特件长求老头基资边流路级少图山统接知较将组见计别她手角期根"
+          "论运农指几九区强放决西被干做必战先回则任取据处队南给色光门即保治北造百规热领七海口东导器压志世金增争济阶油思术极交受联"
+          "什认六共权收证改清美再采转更单风切打白教速花带安场身车例真务具万每目至达走积示议声报斗完类八离华名确才科张信马节话米整"
+          "空元况今集温传土许步群广石记需段研界拉林律叫且究观越织装影算低持音众书布复容儿须际商非验连断深难近矿千周委素技备半办青"
+          "省列习响约支般史感劳便团往酸历市克何除消构府称太准精值号率族维划选标写存候毛亲快效斯院查江型眼王按格养易置派层片始却专"
+          "货币银行汇通胀央信贷债券股票期权险负息投融汇储蓄")
+WEIGHTS = [1.0 / (k + 1) for k in range(len(COMMON))]
+SIZES = {'1k': 1_000, '10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+
+
+def make_text(rng, lo, hi):
+    return ''.join(rng.choices(COMMON, WEIGHTS, k=rng.randint(lo, hi)))
+
+
+def generate_bank(folder, n, seed=0):
+    """在 folder 下生成与正式题库格式相同的四个 CSV：主题库 n 题，三个分类题库各 n // 3 题"""
+    rng = random.Random(seed)
+    os.makedirs(folder, exist_ok=True)
+    paths = {key: os.path.join(folder, name) for key, name in
+             [('main', '题库.csv'), ('choice', '题库_选择题.csv'), ('fill', '题库_填空题.csv'), ('judge', '题库_判断题.csv')]}
+    with open(paths['main'], 'w', encoding='utf-8-sig', newline='') as f:
+        w = csv.writer(f)
+        w.writerow(['题目', '题目的文字答案'])
+        for _ in range(n):
+            w.writerow([make_text(rng, 15, 60), make_text(rng, 4, 30)])
+    with open(paths['choice'], 'w', encoding='utf-8-sig', newline='') as f:
+        w = csv.writer(f)
+        for _ in range(n // 3):
+            multi = rng.random() < 0.3
+            answer = ''.join(sorted(rng.sample('ABCD', rng.randint(2, 4)))) if multi else rng.choice('ABCD')
+            options = [make_text(rng, 2, 12) for _ in range(4)]
+            if rng.random() < 0.1:
+                options[3] = ''
+            w.writerow([make_text(rng, 15, 60), *options, answer, '多选题' if multi else '单选题'])
+    with open(paths['fill'], 'w', encoding='utf-8-sig', newline='') as f:
+        w = csv.writer(f)
+        for _ in range(n // 3):
+            w.writerow([make_text(rng, 15, 60), '|'.join(make_text(rng, 2, 6) for _ in range(rng.randint(1, 3)))])
+    with open(paths['judge'], 'w', encoding='utf-8-sig', newline='') as f:
+        w = csv.writer(f)
+        for _ in range(n // 3):
+            w.writerow([make_text(rng, 15, 60), rng.choice('对错')])
+    return paths
+
+
+def summarize(latencies, total=None):
+    """latencies 为每次操作的耗时（秒）"""
+    lat = sorted(latencies)
+    total = sum(lat) if total is None else total
+
+    def pct(p):
+        return lat[min(len(lat) - 1, int(len(lat) * p))] * 1000
+
+    return {'count': len(lat), 'total_s': round(total, 6),
+            'ops_per_s': round(len(lat) / total, 2) if total > 0 else None,
+            'p50_ms': round(pct(0.50), 4), 'p95_ms': round(pct(0.95), 4),
+            'p99_ms': round(pct(0.99), 4), 'max_ms': round(lat[-1] * 1000, 4)}
+
+
+def measure(fn, inputs):
+    latencies = []
+    for args in inputs:
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - start)
+    return summarize(latencies)
+
+
+def timed_load(paths, backend, db_path):
+    start = time.perf_counter()
+    library = QuestionLibrary.load(paths, backend=backend, db_path=db_path)
+    return library, time.perf_counter() - start
+
+
+def bench_size(name, n, workdir, args):
+    folder = os.path.join(workdir, name)
+    start = time.perf_counter()
+    paths = generate_bank(folder, n, seed=args.seed)
+    print(f"[{name}] 生成 {n} 题用时 {time.perf_counter() - start:.1f}s", flush=True)
+    db_path = os.path.join(folder, '题库.db')
+    rng = random.Random(args.seed)
+    result = {'questions': n}
+
+    # 加载：冷启动需要解析 CSV、去重、建索引并写缓存，热启动直接读题库缓存和索引缓存（LibraryCache）
+    _, cold = timed_load(paths, args.backend, db_path)
+    library, warm = timed_load(paths, args.backend, db_path)
+    result['load_cold'] = {'seconds': round(cold, 4), 'questions_per_s': round(n / cold, 1)}
+    result['load_warm'] = {'seconds': round(warm, 4), 'questions_per_s': round(n / warm, 1)}
+    print(f"[{name}] 冷加载 {cold:.2f}s，热加载 {warm:.2f}s", flush=True)
+
+    # 检索：从题干中截取 2~8 字的子串；模糊检索用题干片段打乱后拼接，基本没有精确命中。
+    # fuzzy 为 difflib 规则的 close_matches，similar 为 TF-IDF 相似度（覆盖分类题库）
+    stems = library.questions
+    picks = [stems[rng.randrange(len(stems))] for _ in range(args.queries)]
+    keywords = []
+    for stem in picks:
+        k = rng.randint(2, 8)
+        i = rng.randrange(max(1, len(stem) - k))
+        keywords.append((stem[i:i + k],))
+    result['search'] = measure(library.search_index.search, keywords)
+    fuzzy = [(stem[:10][::-1] + stem[10:20],) for stem in picks[:max(1, args.queries // 4)]]
+    result['fuzzy'] = measure(lambda kw: library.search_index.close_matches(kw, n=3, cutoff=0.2), fuzzy)
+    result['similar'] = measure(lambda kw: library.similar(kw, k=10), fuzzy)
+
+    # 抽题
+    types = [(key,) for key in library.categorized] * max(1, args.queries // 3)
+    result['sample_exam'] = measure(lambda key: library.sample_exam(key, 15, rng), types)
+    # 混合组卷：按默认配额分层抽取，并避开最近 5 张试卷出过的题
+    generator, history = library.exam_generator(), ExamHistory(window=5)
+    quota = {'choice.single': 6, 'choice.multi': 3, 'fill': 3, 'judge': 3}
+
+    def exam_paper(seed):
+        history.add(library, generator.generate(quota, seed=seed, history=history)['questions'])
+    result['exam_paper'] = measure(exam_paper, [(seed,) for seed in range(args.queries)])
+
+    # 判分：一半答对一半答错
+    grades = []
+    for _ in range(args.queries * 10):
+        key = rng.choice(list(library.categorized))
+        bank = library.categorized[key]
+        if not len(bank):
+            continue
+        i = rng.randrange(len(bank))
+        correct = bank.answer(i)
+        user = correct if rng.random() < 0.5 else make_text(rng, 1, 4)
+        grades.append((key, i, user, correct))
+    # grade 使用加载时算好的判分键，grade_raw 每次都重新处理参考答案；grade_sheet 一次判完 15 题的答卷
+    result['grade'] = measure(lambda key, i, user, correct: library.grade(key, i, user), grades)
+    result['grade_raw'] = measure(lambda key, i, user, correct: grade_answer(key, user, correct), grades)
+    sheets = [([(key, i, user) for key, i, user, _ in grades[start:start + 15]],)
+              for start in range(0, len(grades), 15)]
+    result['grade_sheet'] = measure(library.grade_batch, sheets)
+    for op in ('search', 'fuzzy', 'similar', 'sample_exam', 'exam_paper', 'grade', 'grade_raw', 'grade_sheet'):
+        r = result[op]
+        print(f"[{name}] {op:12s} {r['ops_per_s']:>12} ops/s  p50 {r['p50_ms']:.3f}ms  "
+              f"p95 {r['p95_ms']:.3f}ms  p99 {r['p99_ms']:.3f}ms", flush=True)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='1k,10k,100k', help="逗号分隔，可选 " + ','.join(SIZES))
+    parser.add_argument('--backend', default='memory', choices=['memory', 'sqlite'])
+    parser.add_argument('--queries', type=int, default=200, help="每种检索操作的查询次数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workdir', help="合成题库存放目录，默认使用临时目录并在结束后删除")
+    parser.add_argument('--label', default='', help="写入结果的版本标记，便于对比")
+    parser.add_argument('--out', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_results.json'),
+                        help="结果 JSON，默认写到 benchmarks/bench_results.json")
+    args = parser.parse_args(argv)
+
+    sizes = [s.strip().lower() for s in args.sizes.split(',') if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        parser.error(f"未知规模：{', '.join(unknown)}")
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='tiku_bench_')
+    report = {'meta': {'label': args.label, 'backend': args.backend, 'seed': args.seed, 'queries': args.queries,
+                       'python': platform.python_version(), 'platform': platform.platform(),
+                       'time': time.strftime('%Y-%m-%dT%H:%M:%S')},
+              'results': {}}
+    try:
+        for name in sizes:
+            report['results'][name] = bench_size(name, SIZES[name], workdir, args)
+    finally:
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+    with open(args.out, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"结果已写入 {args.out}")
+
+
+if __name__ == '__main__':
+    main()
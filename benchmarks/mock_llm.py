@@ -0,0 +1,221 @@
+"""本地模拟的 OpenAI 兼容对话接口（/v1/chat/completions），用于离线测量 AI 客户端在延迟、报错和并发下的表现。
+
+用法：
+    python benchmarks/mock_llm.py --port 8765 --latency lognormal:400,0.6 --token-ms 15 --error-429 0.05
+然后把 config.json 的 api_url 改为 http://127.0.0.1:8765/v1/chat/completions（密钥随便填）即可让程序连到这里。
+
+支持流式（SSE）和非流式响应、reasoning_content（请求带 enable_thinking 或 --reasoning 时返回）、
+按比例注入 429（带 Retry-After）、5xx 和流式中途断开。GET /stats 返回按状态码统计的请求数。
+"""
+import argparse
+import json
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = ("喵", "这道题", "考查的是", "货币供给", "的决定因素", "，", "基础货币", "乘以", "货币乘数", "。",
+         "选项A", "错误", "因为", "中央银行", "可以通过", "公开市场操作", "调节", "准备金率", "(=^･ω･^=)", "\n")
+
+
+def parse_latency(spec):
+    """延迟分布，单位毫秒：fixed:300 | uniform:100,500 | normal:300,80 | lognormal:中位数,sigma | exp:均值"""
+    kind, _, args = spec.partition(':')
+    values = [float(v) for v in args.split(',') if v]
+    makers = {
+        'fixed': lambda rng: values[0],
+        'uniform': lambda rng: rng.uniform(values[0], values[1]),
+        'normal': lambda rng: max(0.0, rng.gauss(values[0], values[1])),
+        'lognormal': lambda rng: values[0] * rng.lognormvariate(0.0, values[1]),
+        'exp': lambda rng: rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0,
+    }
+    if kind not in makers:
+        raise ValueError(f"未知的延迟分布：{spec}")
+    return makers[kind]
+
+
+class _QuietServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端断开、连接池回收空闲连接都会让读写失败，属于正常情况
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class MockLLMServer:
+    """在后台线程中运行的模拟接口。latency 为首字节延迟分布（见 parse_latency），token_ms 为流式片段间隔，
+    tokens 为回答片段数范围；error_429 / error_5xx / drop 为注入 429、5xx 和流式中途断开的概率"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency='fixed:0', token_ms=0.0, tokens=(20, 60),
+                 error_429=0.0, error_5xx=0.0, drop=0.0, retry_after=1, reasoning=False, seed=None):
+        self.latency = parse_latency(latency) if isinstance(latency, str) else latency
+        self.token_ms = token_ms
+        self.tokens = tokens
+        self.error_429, self.error_5xx, self.drop = error_429, error_5xx, drop
+        self.retry_after = retry_after
+        self.reasoning = reasoning
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.counts = {}  # 状态码或 'drop' -> 次数
+        self.httpd = _QuietServer((host, port), self._handler())
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/chat/completions"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+    def _count(self, key):
+        with self.lock:
+            self.counts[key] = self.counts.get(key, 0) + 1
+
+    def _plan(self, payload):
+        """为一次请求抽取结果：(状态码, 首字节延迟秒, 回答片段, 思考片段, 流式断开位置)"""
+        with self.lock:
+            roll = self.rng.random()
+            delay = self.latency(self.rng) / 1000.0
+            limit = payload.get('max_tokens')
+            n = self.rng.randint(*self.tokens) if not limit else min(limit, self.tokens[1])
+            content = [self.rng.choice(WORDS) for _ in range(n)]
+            reasoning = [self.rng.choice(WORDS) for _ in range(n // 2)] if (
+                self.reasoning or payload.get('enable_thinking')) else []
+            drop_at = self.rng.randrange(1, n + 1) if self.rng.random() < self.drop else None
+        if roll < self.error_429:
+            return 429, delay, content, reasoning, None
+        if roll < self.error_429 + self.error_5xx:
+            return self.rng.choice([500, 502, 503]), delay, content, reasoning, None
+        return 200, delay, content, reasoning, drop_at
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 保持连接，与真实接口一样可以复用连接池
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip('/') == '/stats':
+                    self._send_json(200, server.stats())
+                else:
+                    self._send_json(404, {'error': {'message': 'not found'}})
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b'{}')
+                except ValueError:
+                    server._count(400)
+                    self._send_json(400, {'error': {'message': 'invalid json'}})
+                    return
+                if not self.path.rstrip('/').endswith('/chat/completions'):
+                    self._send_json(404, {'error': {'message': 'not found'}})
+                    return
+                status, delay, content, reasoning, drop_at = server._plan(payload)
+                time.sleep(delay)
+                if status != 200:
+                    server._count(status)
+                    headers = {'Retry-After': str(server.retry_after)} if status == 429 else {}
+                    self._send_json(status, {'error': {'message': f'injected {status}'}}, headers)
+                    return
+                if payload.get('stream'):
+                    self._stream(payload, content, reasoning, drop_at)
+                else:
+                    server._count(200)
+                    message = {'role': 'assistant', 'content': ''.join(content)}
+                    if reasoning:
+                        message['reasoning_content'] = ''.join(reasoning)
+                    self._send_json(200, {'id': 'mock', 'object': 'chat.completion', 'model': payload.get('model'),
+                                          'choices': [{'index': 0, 'message': message, 'finish_reason': 'stop'}],
+                                          'usage': {'completion_tokens': len(content) + len(reasoning)}})
+
+            def _send_json(self, status, body, headers=None):
+                data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _chunk(self, data):
+                self.wfile.write(b'%x\r\n%s\r\n' % (len(data), data))
+                self.wfile.flush()
+
+            def _stream(self, payload, content, reasoning, drop_at):
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.end_headers()
+                events = [('reasoning_content', t) for t in reasoning] + [('content', t) for t in content]
+                for i, (key, text) in enumerate(events, 1):
+                    if drop_at is not None and i - len(reasoning) == drop_at:
+                        # 模拟连接中途断开：不发结束块直接关闭
+                        server._count('drop')
+                        self.close_connection = True
+                        return
+                    chunk = {'id': 'mock', 'object': 'chat.completion.chunk', 'model': payload.get('model'),
+                             'choices': [{'index': 0, 'delta': {key: text}}]}
+                    self._chunk(b'data: ' + json.dumps(chunk, ensure_ascii=False).encode('utf-8') + b'\n\n')
+                    if server.token_ms:
+                        time.sleep(server.token_ms / 1000.0)
+                self._chunk(b'data: [DONE]\n\n')
+                self._chunk(b'')
+                server._count(200)
+
+        return Handler
+
+
+def add_server_arguments(parser):
+    parser.add_argument('--latency', default='lognormal:300,0.5', help="首字节延迟分布（毫秒），见 parse_latency")
+    parser.add_argument('--token-ms', type=float, default=10.0, help="流式片段间隔（毫秒）")
+    parser.add_argument('--tokens', default='20,60', help="回答片段数范围，如 20,60")
+    parser.add_argument('--error-429', type=float, default=0.0, help="返回 429 的概率")
+    parser.add_argument('--error-5xx', type=float, default=0.0, help="返回 500/502/503 的概率")
+    parser.add_argument('--drop', type=float, default=0.0, help="流式响应中途断开的概率")
+    parser.add_argument('--retry-after', type=int, default=1, help="429 响应的 Retry-After（秒）")
+    parser.add_argument('--reasoning', action='store_true', help="总是返回 reasoning_content")
+
+
+def server_from_args(args, port=0, seed=None):
+    lo, hi = (int(v) for v in args.tokens.split(','))
+    return MockLLMServer(port=port, latency=args.latency, token_ms=args.token_ms, tokens=(lo, hi),
+                         error_429=args.error_429, error_5xx=args.error_5xx, drop=args.drop,
+                         retry_after=args.retry_after, reasoning=args.reasoning, seed=seed)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--seed', type=int)
+    add_server_arguments(parser)
+    args = parser.parse_args(argv)
+    server = server_from_args(args, port=args.port, seed=args.seed)
+    print(f"模拟接口已启动：{server.url}（Ctrl+C 退出）", flush=True)
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import csv
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+MAIN = {
+    '货币乘数的大小取决于哪些因素？': '法定准备金率、超额准备金率和现金漏损率',
+    '什么是基础货币？': '流通中的现金加上商业银行的准备金',
+    '中央银行的三大传统货币政策工具是什么？': '法定存款准备金率、再贴现政策和公开市场业务',
+    '什么是久期？': '债券各期现金流现值加权的平均到期时间',
+}
+CHOICE = [
+    ['中央银行在公开市场上买入政府债券，货币供给将', '增加', '减少', '不变', '不确定', 'A', '单选题'],
+    ['下列属于货币政策工具的有', '再贴现率', '法定存款准备金率', '公开市场业务', '财政补贴', 'ABC', '多选题'],
+    ['商业银行的核心资本包括', '实收资本', '资本公积', '次级债券', '盈余公积', 'ABD', '多选题'],
+    ['费雪效应描述的是名义利率与哪一项的关系', '通货膨胀率', '汇率', '失业率', '经济增长率', 'A', '单选题'],
+]
+FILL = [
+    ['货币政策的最终目标包括稳定物价和', '充分就业|经济增长'],
+    ['某债券票面利率为3.5%，则每年每百元面值付息', '3.5'],
+    ['基础货币由流通中的现金和', '准备金'],
+]
+JUDGE = [
+    ['提高法定存款准备金率会扩大货币供给', '错'],
+    ['再贴现是中央银行对商业银行的融资', '对'],
+    ['通货膨胀时实际利率一定为负', '错'],
+]
+BANK_FILES = {'main': '题库.csv', 'choice': '题库_选择题.csv', 'fill': '题库_填空题.csv', 'judge': '题库_判断题.csv'}
+
+
+def write_bank(folder, main=MAIN, choice=CHOICE, fill=FILL, judge=JUDGE):
+    """按程序的格式写出四个题库 CSV，返回 题库 -> 路径"""
+    paths = {key: os.path.join(str(folder), name) for key, name in BANK_FILES.items()}
+    with open(paths['main'], 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['题目', '题目的文字答案'])
+        writer.writerows(main.items())
+    for key, rows in [('choice', choice), ('fill', fill), ('judge', judge)]:
+        with open(paths[key], 'w', encoding='utf-8-sig', newline='') as f:
+            csv.writer(f).writerows(rows)
+    return paths
+
+
+@pytest.fixture
+def bank_paths(tmp_path):
+    return write_bank(tmp_path)
+
+
+@pytest.fixture
+def mock_llm():
+    from mock_llm import MockLLMServer
+    server = MockLLMServer(token_ms=20, tokens=(20, 20), seed=1).start()
+    yield server
+    server.stop()
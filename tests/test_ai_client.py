@@ -0,0 +1,128 @@
+"""AI 接口客户端：429/5xx 与连接失败的重试和退避、Retry-After、令牌桶限流、不重试的错误"""
+import socket
+import threading
+import time
+
+import pytest
+import requests
+
+from mock_llm import MockLLMServer
+from tiku_core import AIClient, fetch_chat
+
+PAYLOAD = {'model': 'm', 'messages': [{'role': 'user', 'content': '你好'}]}
+
+
+@pytest.fixture
+def start_mock():
+    servers = []
+
+    def start(**kwargs):
+        servers.append(MockLLMServer(**{'tokens': (3, 3), **kwargs}).start())
+        return servers[-1]
+
+    yield start
+    for server in servers:
+        server.stop()
+
+
+def test_429_is_retried_after_retry_after(start_mock):
+    mock = start_mock(error_429=0.5, retry_after=0.2, seed=1)  # 该种子下前两次 429，第三次 200
+    client = AIClient(max_retries=3, backoff=0.01)
+    start = time.perf_counter()
+    r = client.post(mock.url, PAYLOAD, {})
+    assert r.status_code == 200 and time.perf_counter() - start >= 2 * 0.2
+    assert mock.stats() == {429: 2, 200: 1}
+    assert client.stats()['retries'] == 2 and client.stats()['failures'] == 0
+
+
+def test_retry_after_pauses_other_requests(start_mock):
+    mock = start_mock(error_429=1.0, retry_after=0.3)
+    client = AIClient(max_retries=0)
+    assert client.post(mock.url, PAYLOAD, {}).status_code == 429
+    mock.error_429 = 0.0
+    start = time.perf_counter()
+    assert client.post(mock.url, PAYLOAD, {}).status_code == 200
+    assert time.perf_counter() - start >= 0.25
+
+
+def test_5xx_backs_off_then_gives_up(start_mock):
+    mock = start_mock(error_5xx=1.0)
+    client = AIClient(max_retries=2, backoff=0.05)
+    start = time.perf_counter()
+    r = client.post(mock.url, PAYLOAD, {})
+    assert r.status_code in (500, 502, 503)
+    assert time.perf_counter() - start >= 0.05 + 0.1  # 0.05 * 2**0 + 0.05 * 2**1
+    assert sum(mock.stats().values()) == 3
+    assert client.stats() == {**client.stats(), 'requests': 3, 'retries': 2, 'failures': 1}
+
+
+def test_4xx_is_not_retried(start_mock):
+    mock = start_mock()
+    client = AIClient(max_retries=3, backoff=0.01)
+    r = client.post(mock.url.replace('/chat/completions', '/models'), PAYLOAD, {})
+    assert r.status_code == 404
+    assert client.stats()['requests'] == 1 and client.stats()['retries'] == 0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def test_refused_connection_is_retried():
+    client = AIClient(max_retries=2, backoff=0.01)
+    with pytest.raises(requests.ConnectionError):
+        client.post('http://127.0.0.1:%d/v1/chat/completions' % free_port(), PAYLOAD, {})
+    assert client.stats()['requests'] == 3 and client.stats()['failures'] == 1
+
+
+def test_connection_dropped_after_sending_is_not_retried():
+    """请求已经发出后连接被断开：接口可能已经处理（计费），不能重发"""
+    listener = socket.socket()
+    listener.bind(('127.0.0.1', 0))
+    listener.listen()
+    accepted = []
+
+    def serve():
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            accepted.append(1)
+            conn.recv(65536)
+            conn.close()
+
+    threading.Thread(target=serve, daemon=True).start()
+    try:
+        client = AIClient(max_retries=3, backoff=0.01)
+        with pytest.raises(requests.ConnectionError):
+            client.post('http://127.0.0.1:%d/v1/chat/completions' % listener.getsockname()[1], PAYLOAD, {})
+        assert len(accepted) == 1 and client.stats()['requests'] == 1
+    finally:
+        listener.close()
+
+
+def test_token_bucket_limits_rate(start_mock):
+    mock = start_mock()
+    client = AIClient(rate=20, burst=2)
+    start = time.perf_counter()
+    for _ in range(6):
+        client.post(mock.url, PAYLOAD, {}).close()
+    assert time.perf_counter() - start >= (6 - 2) / 20 * 0.9
+    assert mock.stats() == {200: 6}
+
+
+def test_dropped_stream_is_not_retried(start_mock):
+    """流中途断开：返回已收到的部分并标记为未完整结束，不重发请求；一个片段都没收到时原样抛出"""
+    mock = start_mock(drop=1.0, tokens=(10, 10), seed=1)
+    client = AIClient(max_retries=3, backoff=0.01)
+    parts = fetch_chat(client, mock.url, PAYLOAD, {})
+    assert parts['finish_reason'] is None and 0 < len(parts['content']) < 10
+    assert mock.stats() == {'drop': 1} and client.stats()['requests'] == 1
+
+    mock = start_mock(drop=1.0, tokens=(1, 1))
+    with pytest.raises(requests.exceptions.ChunkedEncodingError):
+        fetch_chat(client, mock.url, PAYLOAD, {})
+    assert mock.stats() == {'drop': 1}
@@ -0,0 +1,150 @@
+"""AI 请求调度：合并相同请求、给晚加入的订阅者补发片段、最后一个订阅者取消才中断、工作线程数有上限"""
+import threading
+import time
+
+import pytest
+
+from tiku_core import AIRequestCancelled, AIScheduler
+
+
+class BlockingFetch:
+    """fetch 的假实现：先发出一个片段，然后阻塞到 release()，或无人订阅时中断"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = self.running = self.peak = 0
+        self.started = threading.Event()
+        self.go = threading.Event()
+        self.aborted = threading.Event()
+
+    def release(self):
+        self.go.set()
+
+    def __call__(self, emit, cancelled):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        try:
+            emit('content', '第一段')
+            self.started.set()
+            while not self.go.wait(0.01):
+                if cancelled():
+                    self.aborted.set()
+                    raise AIRequestCancelled("已取消")
+            emit('content', '第二段')
+            return '完成'
+        finally:
+            with self.lock:
+                self.running -= 1
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = AIScheduler(max_workers=2)
+    yield scheduler
+    scheduler.shutdown()
+
+
+def test_same_key_is_coalesced(scheduler):
+    fetch = BlockingFetch()
+    first = scheduler.submit('k', fetch)
+    assert fetch.started.wait(5)
+    second = scheduler.submit('k', fetch)
+    assert second.future is first.future
+    fetch.release()
+    assert first.future.result(5) == second.future.result(5) == '完成'
+    assert fetch.calls == 1
+    assert scheduler.stats() == {'started': 1, 'coalesced': 1, 'aborted': 0, 'inflight': 0}
+    # 请求结束后同一 key 重新发起
+    again = BlockingFetch()
+    again.release()
+    assert scheduler.submit('k', again).future.result(5) == '完成' and again.calls == 1
+
+
+def test_late_subscriber_gets_earlier_deltas(scheduler):
+    fetch = BlockingFetch()
+    early, late = [], []
+    scheduler.submit('k', fetch, on_delta=lambda kind, text: early.append(text))
+    assert fetch.started.wait(5)
+    sub = scheduler.submit('k', fetch, on_delta=lambda kind, text: late.append(text))
+    assert late == ['第一段']
+    fetch.release()
+    sub.future.result(5)
+    assert early == late == ['第一段', '第二段']
+
+
+def test_only_last_unsubscribe_cancels(scheduler):
+    fetch = BlockingFetch()
+    first = scheduler.submit('k', fetch)
+    assert fetch.started.wait(5)
+    second = scheduler.submit('k', fetch)
+    done = []
+    first.add_done_callback(lambda f: done.append('first'))
+    second.add_done_callback(lambda f: done.append('second'))
+    first.cancel()
+    first.cancel()  # 重复取消不影响其他订阅者
+    assert not fetch.aborted.wait(0.1)
+    fetch.release()
+    assert second.future.result(5) == '完成'
+    assert done == ['second']
+
+    fetch = BlockingFetch()
+    subs = [scheduler.submit('k2', fetch) for _ in range(2)]
+    assert fetch.started.wait(5)
+    subs[0].cancel()
+    assert not fetch.aborted.wait(0.1)
+    subs[1].cancel()
+    assert fetch.aborted.wait(5)
+    with pytest.raises(AIRequestCancelled):
+        subs[1].future.result(5)
+    assert scheduler.stats()['aborted'] == 1
+
+
+def test_cancel_queued_job_never_runs():
+    scheduler = AIScheduler(max_workers=1)
+    try:
+        running, queued = BlockingFetch(), BlockingFetch()
+        first = scheduler.submit('running', running)
+        assert running.started.wait(5)
+        second = scheduler.submit('queued', queued)
+        second.cancel()
+        assert second.future.cancelled()
+        running.release()
+        assert first.future.result(5) == '完成'
+        # 单个工作线程按顺序取任务，后面的任务完成说明撤销的任务已被跳过
+        after = BlockingFetch()
+        after.release()
+        assert scheduler.submit('after', after).future.result(5) == '完成'
+        assert queued.calls == 0
+        assert scheduler.stats()['aborted'] == 0
+    finally:
+        scheduler.shutdown()
+
+
+def test_worker_count_is_bounded(scheduler):
+    fetch = BlockingFetch()
+    subs = [scheduler.submit(i, fetch) for i in range(6)]
+    deadline = time.monotonic() + 5
+    while fetch.running < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert not fetch.aborted.wait(0.1) and fetch.running == 2
+    assert len(scheduler.workers) == 2
+    fetch.release()
+    assert [sub.future.result(5) for sub in subs] == ['完成'] * 6
+    assert fetch.calls == 6 and fetch.peak == 2
+    assert len(scheduler.workers) == 2
+
+
+def test_shutdown_cancels_everything():
+    scheduler = AIScheduler(max_workers=1)
+    running, queued = BlockingFetch(), BlockingFetch()
+    first = scheduler.submit('running', running)
+    assert running.started.wait(5)
+    second = scheduler.submit('queued', queued)
+    scheduler.shutdown()
+    assert running.aborted.wait(5)
+    assert second.future.cancelled() and queued.calls == 0
+    assert isinstance(first.future.exception(5), AIRequestCancelled)
+    with pytest.raises(RuntimeError):
+        scheduler.submit('late', queued)
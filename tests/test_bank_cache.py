@@ -0,0 +1,41 @@
+"""题库编译缓存：解析期间 CSV 被改写、只有修改时间变化"""
+import os
+
+from tiku_core import BankCache, load_bank
+
+
+def read(path):
+    with open(path, encoding='utf-8') as f:
+        return f.read()
+
+
+def test_csv_rewritten_while_parsing_invalidates_cache(tmp_path):
+    path = str(tmp_path / 'bank.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('v1')
+
+    def parse(p):
+        data = read(p)
+        with open(p, 'w', encoding='utf-8') as f:
+            f.write('v2')
+        return data
+
+    assert load_bank(path, parse) == 'v1'
+    assert BankCache(path).load() is None
+    assert load_bank(path, read) == 'v2'
+    assert BankCache(path).load() == 'v2'
+
+
+def test_touched_csv_refreshes_header(tmp_path, monkeypatch):
+    path = str(tmp_path / 'bank.csv')
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('v1')
+    load_bank(path, read)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    calls = []
+    digest = BankCache.digest
+    monkeypatch.setattr(BankCache, 'digest', lambda self: calls.append(1) or digest(self))
+    assert BankCache(path).load() == 'v1'
+    assert BankCache(path).load() == 'v1'
+    assert len(calls) == 1
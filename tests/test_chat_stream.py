@@ -0,0 +1,30 @@
+"""SSE 解析：流是否完整结束、最后一个事件缺少结尾空行"""
+import json
+
+from tiku_core import iter_chat_stream
+
+
+def chunk(content=None, finish=None):
+    delta = {'content': content} if content else {}
+    return 'data: ' + json.dumps({'choices': [{'delta': delta, 'finish_reason': finish}]}, ensure_ascii=False)
+
+
+def test_complete_stream_ends_with_finish():
+    lines = [chunk('你好'), '', chunk('喵', 'stop'), '', 'data: [DONE]', '']
+    assert list(iter_chat_stream(lines)) == [('content', '你好'), ('content', '喵'), ('finish', 'stop')]
+
+
+def test_done_without_finish_reason():
+    lines = [chunk('你好'), '', 'data: [DONE]', '']
+    assert list(iter_chat_stream(lines))[-1] == ('finish', 'stop')
+
+
+def test_truncated_stream_has_no_finish():
+    lines = [chunk('你好'), '', chunk('喵'), '']
+    assert list(iter_chat_stream(lines)) == [('content', '你好'), ('content', '喵')]
+
+
+def test_last_event_without_blank_line_is_kept():
+    lines = [chunk('你好'), '', chunk('喵', 'stop')]
+    assert list(iter_chat_stream(lines)) == [('content', '你好'), ('content', '喵'), ('finish', 'stop')]
+    assert list(iter_chat_stream([b'data: [DONE]'])) == [('finish', 'stop')]
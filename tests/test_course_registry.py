@@ -0,0 +1,99 @@
+"""课程注册表：按需加载且只加载一次、按最近最少使用淘汰并关闭题库、发现课程目录"""
+import json
+import os
+import threading
+import time
+
+from conftest import write_bank
+from tiku_core import Course, CourseRegistry, QuestionLibrary
+
+
+class FakeLibrary:
+    def __init__(self, size):
+        self.size = size
+        self.closed = False
+
+    def memory_estimate(self):
+        return self.size
+
+    def close(self):
+        self.closed = True
+
+
+def make_registry(sizes, max_bytes):
+    courses = {cid: Course(cid, cid, {}, None) for cid in sizes}
+    calls = []
+
+    def loader(course, progress):
+        calls.append(course.id)
+        return FakeLibrary(sizes[course.id])
+
+    return CourseRegistry(courses, loader, max_bytes), calls
+
+
+def test_lru_evicts_and_closes():
+    registry, calls = make_registry({'a': 40, 'b': 40, 'c': 40}, max_bytes=100)
+    a, b = registry.get('a'), registry.get('b')
+    assert registry.peek('a') is a  # a 变为最近使用
+    c = registry.get('c')
+    assert [cid for cid, _ in registry.loaded()] == ['c', 'a']
+    assert b.closed and not a.closed and not c.closed
+    assert registry.peek('b') is None
+    assert registry.get('b') is not b and calls == ['a', 'b', 'c', 'b']
+    assert a.closed and registry.stats() == {'installed': 3, 'loaded': 2, 'bytes': 80, 'evictions': 2}
+
+
+def test_just_used_course_is_kept_even_if_too_big():
+    registry, _ = make_registry({'a': 10, 'big': 500}, max_bytes=100)
+    a = registry.get('a')
+    big = registry.get('big')
+    assert a.closed and not big.closed
+    assert [cid for cid, _ in registry.loaded()] == ['big']
+
+
+def test_concurrent_get_loads_once():
+    courses = {'a': Course('a', 'a', {}, None)}
+    calls = []
+
+    def loader(course, progress):
+        calls.append(course.id)
+        time.sleep(0.05)
+        return FakeLibrary(1)
+
+    registry = CourseRegistry(courses, loader)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.get('a'))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert calls == ['a'] and len({id(r) for r in results}) == 1
+
+
+def test_closing_sqlite_library_releases_connections(tmp_path):
+    paths = write_bank(tmp_path)
+    library = QuestionLibrary.load(paths, backend='sqlite', db_path=str(tmp_path / '题库.db'))
+    store = getattr(library.search_index, 'store', None)
+    if store is None:
+        return  # SQLite 不支持 FTS5 trigram，已退回内存模式
+    worker = threading.Thread(target=lambda: library.search_index.search('货币'))
+    worker.start()
+    worker.join()
+    library.search_index.search('货币')
+    assert len(store.connections) == 2
+    library.close()
+    assert store.connections == []
+    assert library.search_index.search('久期') == ['什么是久期？']  # 关闭后仍可按需重新打开
+
+
+def test_discover(tmp_path):
+    os.makedirs(tmp_path / 'fin')
+    write_bank(tmp_path / 'fin')
+    os.makedirs(tmp_path / 'law')
+    with open(tmp_path / 'law' / 'course.json', 'w', encoding='utf-8') as f:
+        json.dump({'name': '法学', 'files': {'main': 'main.csv'}}, f, ensure_ascii=False)
+    os.makedirs(tmp_path / 'empty')
+    registry = CourseRegistry.discover(str(tmp_path), None)
+    assert list(registry.courses) == ['fin', 'law']
+    assert registry.courses['law'].name == '法学'
+    assert registry.courses['law'].csv_paths['main'] == os.path.join(str(tmp_path / 'law'), 'main.csv')
@@ -0,0 +1,45 @@
+"""重复题合并：只合并规范化后完全相同的题干，近似重复只进入报告"""
+from tiku_core import NgramIndex, QuestionBank, QuestionLibrary, TYPED_BANK_COLUMNS
+
+
+def make_library(quiz_dict, **typed):
+    categorized = {key: QuestionBank(QuestionBank.build_columns(typed[key]) if key in typed else {})
+                   for key in TYPED_BANK_COLUMNS}
+    return QuestionLibrary(dict(quiz_dict), categorized, NgramIndex(list(quiz_dict)))
+
+
+def candidate_stems(report):
+    return [sorted(m['stem'] for m in group) for group in report['candidates']]
+
+
+def test_punctuation_and_width_only_differences_are_merged():
+    library = make_library({'下列说法，正确的是？': 'A', '下列说法 正确的是?': 'B', '其他题目': 'C'})
+    report = library.deduplicate()
+    assert library.questions == ['下列说法，正确的是？', '其他题目']
+    assert library.quiz_dict['下列说法，正确的是？'] == 'A；B'
+    assert library.merged_into == {'下列说法 正确的是?': '下列说法，正确的是？'}
+    assert report['summary']['merged'] == 1
+
+
+def test_negation_only_difference_is_not_merged():
+    yes = '下列关于商业银行资本充足率的说法，正确的是'
+    no = '下列关于商业银行资本充足率的说法，不正确的是'
+    library = make_library({yes: 'A', no: 'C'})
+    report = library.deduplicate()
+    assert library.quiz_dict == {yes: 'A', no: 'C'}
+    assert library.merged_into == {}
+    assert report['summary']['merged'] == 0
+    assert len(set(library.clusters['main'])) == 2
+    assert [yes, no] in candidate_stems(report) or [no, yes] in candidate_stems(report)
+
+
+def test_number_only_difference_is_not_merged():
+    six = '某债券面值100元，票面利率8%，期限5年，每年付息一次，当市场利率为6%时，该债券的发行价格为多少元'
+    eight = '某债券面值100元，票面利率8%，期限5年，每年付息一次，当市场利率为8%时，该债券的发行价格为多少元'
+    library = make_library({six: '108.42'}, fill={'stem': [six, eight], 'answer': ['108.42', '100']})
+    report = library.deduplicate()
+    assert library.quiz_dict == {six: '108.42'}
+    assert list(library.categorized['fill'].stems) == [six, eight]
+    assert library.categorized['fill'].answer(1) == '100'
+    assert report['summary']['merged'] == 0
+    assert any(eight in group for group in candidate_stems(report))
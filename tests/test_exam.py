@@ -0,0 +1,99 @@
+"""组卷：按配额分层抽题、同一重复簇只出一道、避开最近出过的题、相同种子得到相同试卷"""
+from collections import Counter
+
+from conftest import write_bank
+from tiku_core import ExamHistory, QuestionLibrary
+
+QUOTA = {'choice.single': 6, 'choice.multi': 3, 'fill': 3, 'judge': 3}
+
+
+def make_bank(tmp_path, n=40):
+    choice = [['单选第%d题' % i, '甲', '乙', '丙', '丁', 'A', '单选题'] for i in range(n)]
+    choice += [['多选第%d题' % i, '甲', '乙', '丙', '丁', 'AB', '多选题'] for i in range(n // 2)]
+    fill = [['填空第%d题' % i, str(i)] for i in range(n)]
+    judge = [['判断第%d题' % i, '对'] for i in range(n)]
+    return write_bank(tmp_path, choice=choice, fill=fill, judge=judge)
+
+
+def strata(library, paper):
+    names = []
+    for bank, pos in paper['questions']:
+        if bank == 'choice':
+            bank += '.multi' if '多选' in library.categorized['choice'].qtype(pos) else '.single'
+        names.append(bank)
+    return names
+
+
+def test_quota_and_order(tmp_path):
+    library = QuestionLibrary.load(make_bank(tmp_path))
+    paper = library.exam_generator().generate(QUOTA, seed=3)
+    names = strata(library, paper)
+    assert names == [name for name, n in QUOTA.items() for _ in range(n)]
+    assert len(set(paper['questions'])) == len(paper['questions']) and paper['short'] == {}
+    assert library.exam_generator().generate(QUOTA, seed=3) == paper
+    assert library.exam_generator().generate(QUOTA, seed=4)['questions'] != paper['questions']
+
+
+def test_short_quota_is_reported(tmp_path):
+    library = QuestionLibrary.load(make_bank(tmp_path, n=4))
+    paper = library.exam_generator().generate({'choice.multi': 5, 'judge': 4}, seed=1)
+    assert paper['short'] == {'choice.multi': 3}
+    assert Counter(strata(library, paper)) == {'choice.multi': 2, 'judge': 4}
+
+
+def test_duplicate_cluster_is_drawn_once(tmp_path):
+    # 规范化后题干相同、答案不同的两道判断题都保留，但属于同一个簇
+    judge = [['通货膨胀时实际利率一定为负', '错'], ['通货膨胀时，实际利率一定为负。', '对'], ['再贴现是融资', '对']]
+    library = QuestionLibrary.load(write_bank(tmp_path, judge=judge))
+    assert len(library.categorized['judge']) == 3
+    for seed in range(20):
+        paper = library.exam_generator().generate({'judge': 3}, seed=seed)
+        assert len(paper['questions']) == 2 and paper['short'] == {'judge': 1}
+        assert {0, 1} - {pos for _, pos in paper['questions']}
+
+
+def test_history_is_avoided_until_exhausted(tmp_path):
+    library = QuestionLibrary.load(make_bank(tmp_path, n=12))
+    history = ExamHistory(window=5)
+    generator = library.exam_generator()
+    seen = set()
+    for seed in range(4):  # 每张 3 道，12 道题前 4 张不重复
+        paper = generator.generate({'fill': 3}, seed=seed, history=history)
+        questions = set(paper['questions'])
+        assert not questions & seen
+        seen |= questions
+        history.add(library, paper['questions'])
+    paper = generator.generate({'fill': 3}, seed=9, history=history)
+    assert len(set(paper['questions'])) == 3 and paper['short'] == {}  # 都出过了，用出过的题补足
+
+
+def test_history_avoided_in_large_pool(tmp_path):
+    library = QuestionLibrary.load(make_bank(tmp_path, n=200))
+    history = ExamHistory(window=3)
+    generator = library.exam_generator()
+    recent = []
+    for seed in range(10):
+        paper = generator.generate(QUOTA, seed=seed, history=history)
+        assert not set(paper['questions']) & {q for p in recent[-3:] for q in p}
+        recent.append(paper['questions'])
+        history.add(library, paper['questions'])
+
+
+def test_history_survives_reload_and_serialization(tmp_path):
+    paths = make_bank(tmp_path, n=6)
+    library = QuestionLibrary.load(paths)
+    history = ExamHistory(window=2)
+    paper = library.exam_generator().generate({'judge': 3}, seed=1)
+    history.add(library, paper['questions'])
+    stems = {library.categorized['judge'].stem(pos) for _, pos in paper['questions']}
+
+    # 重启：历史按题干保存；题库顺序变化后仍能找到对应的题
+    judge = [['判断第%d题' % i, '对'] for i in reversed(range(6))]
+    reloaded = QuestionLibrary.load(write_bank(tmp_path, judge=judge))
+    restored = ExamHistory(history.to_list(), window=2)
+    paper = reloaded.exam_generator().generate({'judge': 3}, seed=5, history=restored)
+    assert not {reloaded.categorized['judge'].stem(pos) for _, pos in paper['questions']} & stems
+
+    disabled = ExamHistory(window=0)
+    disabled.add(library, paper['questions'])
+    assert disabled.to_list() == []
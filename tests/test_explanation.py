@@ -0,0 +1,42 @@
+"""请求解析：完整结束的写入缓存；流被截断时带上“解析未完整返回”提示、记下 truncated、不缓存"""
+import pytest
+
+from mock_llm import MockLLMServer
+
+from tiku_core import AICache, AIClient, TRUNCATED_NOTICE, TimingLog, explain_cache_key, request_explanation
+
+Q, A = '什么是基础货币？', '流通中的现金加上商业银行的准备金'
+
+
+@pytest.fixture
+def setup(tmp_path, mock_llm):
+    config = {'model': 'm', 'api_url': mock_llm.url, 'api_key': 'test', 'stream': True}
+    cache = AICache(str(tmp_path / 'ai_cache.db'))
+    return config, cache, TimingLog(enabled=True)
+
+
+def test_complete_answer_is_cached(setup):
+    config, cache, timings = setup
+    deltas = []
+    reasoning, content = request_explanation(AIClient(), cache, config, timings, Q, A,
+                                             on_delta=lambda kind, text: deltas.append(text))
+    assert content == ''.join(deltas) and not content.endswith(TRUNCATED_NOTICE)
+    assert cache.get(explain_cache_key(config, Q, A)) == (reasoning, content)
+    assert 'truncated' not in timings.recent()[-1]
+
+
+def test_truncated_answer_is_marked_and_not_cached(setup):
+    config, cache, timings = setup
+    mock = MockLLMServer(tokens=(10, 10), drop=1.0, seed=1).start()  # 该种子下收到几个片段后断开
+    try:
+        config['api_url'] = mock.url
+        deltas = []
+        _, content = request_explanation(AIClient(), cache, config, timings, Q, A,
+                                         on_delta=lambda kind, text: deltas.append(text))
+    finally:
+        mock.stop()
+    assert content.endswith(TRUNCATED_NOTICE) and deltas[-1] == TRUNCATED_NOTICE
+    assert content == ''.join(deltas) and len(content) > len(TRUNCATED_NOTICE)
+    assert cache.get(explain_cache_key(config, Q, A)) is None
+    assert timings.recent()[-1]['truncated'] is True
+    assert mock.stats() == {'drop': 1}
@@ -0,0 +1,78 @@
+"""判分规则：选择题选项集合、填空题逐空、判断题同义词、数值答案"""
+from tiku_core import (NgramIndex, QuestionBank, QuestionLibrary, TYPED_BANK_COLUMNS, answer_key, grade_csv,
+                       grade_key)
+
+
+def grade(exam_type, user_answer, correct_answer):
+    return grade_key(exam_type, user_answer, answer_key(exam_type, correct_answer))
+
+
+def test_choice_compares_option_sets():
+    assert grade('choice', 'BA', 'AB')
+    assert grade('choice', 'a, b', 'AB')
+    assert grade('choice', 'ＡＢ', 'AB')
+    assert not grade('choice', 'A', 'AB')
+    assert not grade('choice', 'ABC', 'AB')
+    assert not grade('choice', '', 'AB')
+
+
+def test_fill_blanks_in_swapped_order():
+    assert grade('fill', '货币政策|财政政策', '货币政策|财政政策')
+    assert grade('fill', '财政政策|货币政策', '货币政策|财政政策')
+    assert not grade('fill', '财政|货币', '货币政策|财政政策')
+    assert grade('fill', '财政|货币', '财政政策|货币政策')
+    assert not grade('fill', '|', '货币政策|财政政策')
+
+
+def test_fill_needs_eighty_percent_of_blanks():
+    correct = 'a|b|c|d|e'
+    assert grade('fill', 'a|b|c|d|x', correct)
+    assert not grade('fill', 'a|b|c|x|x', correct)
+
+
+def test_judge_synonyms():
+    for user in ('对', '正确', '√', 'T', 'true', '对。'):
+        assert grade('judge', user, '对'), user
+    for user in ('错', '错误', '×', 'F', 'False'):
+        assert grade('judge', user, '错'), user
+    assert not grade('judge', '对', '错')
+    assert not grade('judge', '', '对')
+
+
+def test_numeric_answers_keep_decimal_point_sign_and_percent():
+    assert grade('fill', '3.5%', '3.5%')
+    assert grade('fill', '３．５％', '3.5%')
+    assert grade('fill', ' 3.5 % ', '3.5%')
+    assert not grade('fill', '35', '3.5%')
+    assert answer_key('fill', '－3.5％|1,000') == ('-3.5%', '1,000')
+    assert not grade('fill', '97.33', '9733')
+    assert not grade('main', '35', '3.5%')
+    assert grade('main', '3.5%', '年利率为3.5%')
+
+
+def test_grade_batch():
+    library = QuestionLibrary({'主题库题目': '有效市场假说'}, {
+        'choice': QuestionBank(QuestionBank.build_columns({
+            'stem': ['选择题'], 'A': ['a'], 'B': ['b'], 'C': ['c'], 'D': ['d'], 'answer': ['AC'], 'type': ['多选题']})),
+        'fill': QuestionBank(QuestionBank.build_columns({'stem': ['填空题'], 'answer': ['3.5%|增加']})),
+        'judge': QuestionBank(QuestionBank.build_columns({'stem': ['判断题'], 'answer': ['错']})),
+    }, NgramIndex(['主题库题目']))
+    assert set(library.categorized) == set(TYPED_BANK_COLUMNS)
+    library.prepare_grading()
+    results = library.grade_batch([('choice', '选择题', 'CA'), ('choice', 0, 'A'),
+                                   ('fill', '填空题', '增加|3.5%'), ('fill', 0, '35|增加'),
+                                   ('judge', '判断题', '×'), ('main', '主题库题目', '有效市场'),
+                                   ('main', '没有这道题', '有效市场'), ('fill', '没有这道题', '')])
+    assert results == [True, False, True, False, True, True, None, None]
+
+
+def test_merged_main_stem_is_graded_against_kept_question(tmp_path):
+    library = QuestionLibrary({'什么是久期？': '加权平均期限', '什么是久期 ?': '现金流现值加权的平均到期时间'},
+                              {key: QuestionBank({}) for key in TYPED_BANK_COLUMNS}, NgramIndex([]))
+    library.deduplicate()
+    assert library.merged_into == {'什么是久期 ?': '什么是久期？'}
+    assert library.grade_batch([('main', '什么是久期 ?', '加权平均期限')]) == [True]
+    submissions = tmp_path / 'answers.csv'
+    submissions.write_text('考生,题型,题目,作答\n甲,主题库,什么是久期 ?,加权平均期限\n', encoding='utf-8-sig')
+    summary = grade_csv(library, str(submissions))
+    assert summary['correct'] == 1 and summary['missing'] == 0
@@ -0,0 +1,75 @@
+"""题库索引缓存：热启动恢复的题库与重新计算的一致，CSV 或去重开关变化时失效"""
+import os
+
+from conftest import MAIN, write_bank
+from tiku_core import LibraryCache, NgramIndex, PackedPostings, QuestionLibrary
+
+
+def duplicated_main():
+    main = dict(MAIN)
+    main['什么是基础货币'] = '现金和准备金'  # 规范化后与 '什么是基础货币？' 相同，去重时合并
+    return main
+
+
+def state_of(library):
+    return (library.quiz_dict, library.questions, library.merged_into, library.clusters, library.cluster_counts,
+            library.next_cluster, library.dedup_report, library.answer_keys, library.stem_keys,
+            {key: bank.columns for key, bank in library.categorized.items()})
+
+
+def test_warm_load_matches_cold_load(tmp_path):
+    paths = write_bank(tmp_path, main=duplicated_main())
+    cold = QuestionLibrary.load(paths)
+    assert cold.merged_into and os.path.exists(paths['main'] + '.index')
+    warm = QuestionLibrary.load(paths)
+    assert isinstance(warm.search_index.bigrams, PackedPostings)
+    assert state_of(warm) == state_of(cold)
+    assert warm.sources['main'] == cold.sources['main']
+    for kw in ['基础货币', '货币政策', '久期', '利率', '准']:
+        assert warm.search(kw) == cold.search(kw)
+        assert warm.similar(kw) == cold.similar(kw)
+        assert warm.lookup(kw) == cold.lookup(kw)
+    assert warm.memory_estimate() == cold.memory_estimate()
+
+
+def test_packed_index_reloads_like_plain_index(tmp_path):
+    paths = write_bank(tmp_path)
+    QuestionLibrary.load(paths)
+    warm = QuestionLibrary.load(paths)
+    main = dict(MAIN)
+    main['什么是凸性？'] = '价格-收益率曲线的弯曲程度'
+    write_bank(tmp_path, main=main)
+    new, changes = warm.reload_bank('main', paths['main'])
+    assert changes['inserted'] == 1
+    assert new.search_index.search('凸性') == ['什么是凸性？']
+    plain = NgramIndex(new.search_index.docs)
+    for kw in ['货币', '什么是', '久期', '凸性']:
+        assert new.search_index.search(kw) == plain.search(kw)
+
+
+def test_changed_csv_or_dedup_flag_invalidates(tmp_path):
+    paths = write_bank(tmp_path, main=duplicated_main())
+    QuestionLibrary.load(paths)
+    assert LibraryCache(paths, True).load() is not None
+    assert LibraryCache(paths, False).load() is None
+    write_bank(tmp_path)
+    assert LibraryCache(paths, True).load() is None
+    library = QuestionLibrary.load(paths)
+    assert library.quiz_dict == MAIN and not library.merged_into
+
+
+def test_touched_csv_keeps_cache(tmp_path):
+    paths = write_bank(tmp_path)
+    QuestionLibrary.load(paths)
+    st = os.stat(paths['fill'])
+    os.utime(paths['fill'], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert LibraryCache(paths, True).load() is not None
+
+
+def test_mismatched_counts_are_rejected(tmp_path):
+    paths = write_bank(tmp_path)
+    state = QuestionLibrary.load(paths).index_state()
+    state['counts']['main'] += 1
+    library = QuestionLibrary(dict(MAIN), {}, None)
+    assert not library.restore_index_state(state)
+    assert library.search_index is None and library.stem_keys is None
@@ -0,0 +1,21 @@
+"""按题干查题：规范化后完全相同即命中，每道题都能查到自己"""
+import random
+
+from conftest import CHOICE, FILL, MAIN, write_bank
+from tiku_core import QuestionLibrary
+
+
+def test_every_stem_finds_itself(tmp_path):
+    rng = random.Random(3)
+    main = dict(MAIN)
+    for i in range(3000):
+        main['第%d题：%s' % (i, ''.join(rng.choice('货币银行利率汇率债券股票') for _ in range(8)))] = str(i)
+    library = QuestionLibrary.load(write_bank(tmp_path, main=main))
+    for stem, answer in main.items():
+        entry, how = library.lookup(' %s ' % stem)
+        assert how == 'exact' and entry['stem'] == stem and entry['answer'] == answer
+    for row in CHOICE:
+        entry, how = library.lookup(row[0])
+        assert how == 'exact' and entry['stem'] == row[0]
+    entry, how = library.lookup(FILL[1][0])
+    assert how == 'exact' and entry['answer'] == FILL[1][1]
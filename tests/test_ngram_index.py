@@ -0,0 +1,37 @@
+"""NgramIndex 的检索结果与原来的列表扫描、difflib.get_close_matches 完全一致"""
+import random
+from difflib import get_close_matches
+
+from tiku_core import NgramIndex
+
+ALPHABET = '货币银行利率汇率债券股票风险收益的是在，？'
+
+
+def random_docs(rng, count):
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(1, 20))) for _ in range(count)]
+
+
+def test_search_matches_list_scan():
+    rng = random.Random(1)
+    for _ in range(30):
+        docs = random_docs(rng, rng.randint(0, 200))
+        index = NgramIndex(docs)
+        for kw in random_docs(rng, 20) + ['货', '', '利率', '的是']:
+            assert index.search(kw) == [d for d in docs if kw in d]
+
+
+def test_close_matches_matches_difflib():
+    rng = random.Random(2)
+    for _ in range(30):
+        docs = random_docs(rng, rng.randint(0, 200))
+        index = NgramIndex(docs)
+        for kw in random_docs(rng, 10) + [d[::-1] for d in docs[:5]]:
+            for n, cutoff in [(3, 0.2), (1, 0.6), (10, 0.05), (5, 0.0)]:
+                assert index.close_matches(kw, n=n, cutoff=cutoff) == get_close_matches(kw, docs, n=n, cutoff=cutoff)
+
+
+def test_close_matches_with_duplicates_and_ties():
+    docs = ['利率', '利率', '汇率', '率利', '利息率', '']
+    index = NgramIndex(docs)
+    for kw in ['利率', '率', '利率汇率', '息']:
+        assert index.close_matches(kw, n=4, cutoff=0.1) == get_close_matches(kw, docs, n=4, cutoff=0.1)
@@ -0,0 +1,95 @@
+"""题库热更新：主题库和分类题库的增删改、原题库不变、增量索引与全量重建一致"""
+import random
+
+from conftest import CHOICE, MAIN, write_bank
+from tiku_core import NgramIndex, QuestionLibrary
+
+
+def load(paths):
+    return QuestionLibrary.load(paths)
+
+
+def snapshot(library):
+    return (dict(library.quiz_dict), list(library.questions), list(library.search_index.docs),
+            {key: list(bank.stems) for key, bank in library.categorized.items()},
+            {key: list(keys) for key, keys in library.answer_keys.items()},
+            {key: list(c) for key, c in library.clusters.items()})
+
+
+def test_main_insert_update_delete(tmp_path):
+    paths = write_bank(tmp_path)
+    old = load(paths)
+    before = snapshot(old)
+    main = dict(MAIN)
+    del main['什么是基础货币？']
+    main['什么是久期？'] = '麦考利久期'
+    main['什么是凸性？'] = '价格-收益率曲线的弯曲程度'
+    write_bank(tmp_path, main=main)
+
+    new, changes = old.reload_bank('main', paths['main'])
+    assert changes == {'bank': 'main', 'inserted': 1, 'updated': 1, 'deleted': 1}
+    assert new.quiz_dict == main
+    assert sorted(new.questions) == sorted(main)
+    assert new.search_index.search('凸性') == ['什么是凸性？']
+    assert new.search_index.search('基础货币') == []
+    assert new.lookup('什么是凸性')[0]['answer'] == '价格-收益率曲线的弯曲程度'
+    assert new.lookup('什么是基础货币？')[1] != 'exact'
+    assert new.grade('main', None, '麦考利久期', stem='什么是久期？')
+    assert len(new.clusters['main']) == len(new.questions)
+    assert snapshot(old) == before
+    assert old.grade('main', None, '现金流现值加权', stem='什么是久期？')
+
+
+def test_choice_insert_update_delete(tmp_path):
+    paths = write_bank(tmp_path)
+    old = load(paths)
+    before = snapshot(old)
+    choice = [list(row) for row in CHOICE]
+    removed = choice.pop(0)[0]
+    choice[0][5] = 'ABCD'  # 下列属于货币政策工具的有
+    added = ['利率平价理论认为远期汇率升水等于', '两国利差', '通胀差', '增长差', '以上都不对', 'A', '单选题']
+    choice.append(added)
+    write_bank(tmp_path, choice=choice)
+
+    new, changes = old.reload_bank('choice', paths['choice'])
+    assert changes == {'bank': 'choice', 'inserted': 1, 'updated': 1, 'deleted': 1}
+    bank = new.categorized['choice']
+    assert sorted(bank.stems) == sorted(row[0] for row in choice)
+    assert removed not in bank.stems
+    pos = new.position('choice', choice[0][0])
+    assert new.grade('choice', pos, 'ABCD') and not new.grade('choice', pos, 'ABC')
+    pos = new.position('choice', added[0])
+    assert bank.options(pos)[0] == ('A', '两国利差') and new.grade('choice', pos, 'A')
+    assert new.lookup(added[0])[0]['stem'] == added[0]
+    assert new.lookup(removed)[1] != 'exact'
+    assert len(new.answer_keys['choice']) == len(bank) == len(new.clusters['choice'])
+    assert new.categorized['fill'] is old.categorized['fill']
+    assert snapshot(old) == before
+    assert old.grade('choice', old.position('choice', choice[0][0]), 'ABC')
+
+
+def test_unchanged_reload_returns_same_library(tmp_path):
+    paths = write_bank(tmp_path)
+    old = load(paths)
+    new, changes = old.reload_bank('judge', paths['judge'])
+    assert new is old and changes['inserted'] == changes['updated'] == changes['deleted'] == 0
+
+
+def random_doc(rng):
+    return ''.join(rng.choice('货币银行利率汇率债券股票风险收益') for _ in range(rng.randint(1, 12)))
+
+
+def test_with_changes_matches_full_rebuild():
+    rng = random.Random(7)
+    for _ in range(50):
+        docs = [random_doc(rng) for _ in range(rng.randint(0, 40))]
+        index = NgramIndex(docs)
+        removed = rng.sample(range(len(docs)), rng.randint(0, len(docs)))
+        added = [random_doc(rng) for _ in range(rng.randint(0, 10))]
+        changed = index.with_changes(removed, added)
+        rebuilt = NgramIndex(changed.docs)
+        assert sorted(changed.docs) == sorted([d for i, d in enumerate(docs) if i not in set(removed)] + added)
+        assert changed.bigrams == rebuilt.bigrams
+        for kw in ['货币', '利率', '汇率债', '险收益', '银', random_doc(rng)]:
+            assert changed.search(kw) == rebuilt.search(kw)
+        assert index.docs == docs and index.bigrams == NgramIndex(docs).bigrams
@@ -0,0 +1,93 @@
+"""错题本：Leitner 盒子的升降、到期顺序，答题记录重启后重放、截掉半行、压缩成快照"""
+import random
+
+from tiku_core import AnswerJournal, ReviewScheduler
+
+DAY = 86400
+KEY = ('choice', '费雪效应描述的是名义利率与哪一项的关系')
+
+
+def test_leitner_promotion_and_demotion():
+    s = ReviewScheduler()
+    s.record(KEY, True, 0)
+    assert len(s) == 0  # 从未答错的题不记录
+    s.record(KEY, False, 100)
+    assert s.items[KEY][:3] == [0, 100, 1] and s.next_due(100) == KEY
+    t = 100
+    for box in range(1, 4):
+        t += 10
+        s.record(KEY, True, t)
+        assert s.items[KEY][:2] == [box, t + ReviewScheduler.INTERVALS[box] * DAY]
+        assert s.next_due(t) is None and s.next_due(t + ReviewScheduler.INTERVALS[box] * DAY) == KEY
+    s.record(KEY, False, t + 1)
+    assert s.items[KEY][:3] == [0, t + 1, 2]  # 答错回到第 0 盒，答错次数累加
+    for box in range(1, len(ReviewScheduler.INTERVALS)):
+        s.record(KEY, True, t + box)
+        assert s.items[KEY][0] == box
+    s.record(KEY, True, t + 100)
+    assert KEY not in s.items and s.next_due(10 ** 12) is None
+
+
+def test_due_order_and_heap_stays_small():
+    s = ReviewScheduler()
+    for i in range(10):
+        s.record(('judge', str(i)), False, 100 - i)
+    s.record(('judge', '0'), True, 200)  # 第 0 题升入第 1 盒，明天才到期
+    assert s.due(now=150, n=3) == [('judge', '9'), ('judge', '8'), ('judge', '7')]
+    assert s.due(now=150, n=3) == s.due(now=150, n=3)  # 不改变状态
+    assert ('judge', '0') not in s.due(now=150, n=20) and s.due_count(150) == 9
+    for t in range(1000):
+        s.record(('judge', '1'), t % 2 == 0, 300 + t)
+    assert len(s.heap) <= 2 * len(s.items) + 64
+
+
+def random_answers(rng, n):
+    keys = [('fill', '第%d题' % i) for i in range(30)]
+    return [(*rng.choice(keys), rng.random() < 0.6, 1000 + i * 37.12345) for i in range(n)]
+
+
+def state(journal):
+    return {key: item[:3] for key, item in journal.scheduler.items.items()}
+
+
+def test_journal_replay_after_restart(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = AnswerJournal(path).open()
+    for bank, stem, ok, t in random_answers(random.Random(1), 300):
+        journal.record(bank, stem, ok, t)
+    before = state(journal)
+    journal.close()
+    reopened = AnswerJournal(path).open()
+    assert state(reopened) == before and reopened.lines == 300
+    reopened.close()
+
+
+def test_journal_truncates_partial_line(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = AnswerJournal(path).open()
+    journal.record('judge', '甲', False, 10)
+    journal.close()
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"t": 11, "b": "judge", "q": "乙"')  # 写到一半崩溃
+    journal = AnswerJournal(path).open()
+    assert set(journal.scheduler.items) == {('judge', '甲')}
+    journal.record('judge', '丙', False, 12)
+    journal.close()
+    assert set(AnswerJournal(path).open().scheduler.items) == {('judge', '甲'), ('judge', '丙')}
+
+
+def test_journal_compaction_keeps_state(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = AnswerJournal(path, compact_ratio=2, min_compact=10).open()
+    for bank, stem, ok, t in random_answers(random.Random(2), 500):
+        journal.record(bank, stem, ok, t)
+    before = state(journal)
+    journal.close()
+    compacted = AnswerJournal(path, compact_ratio=2, min_compact=10).open()
+    assert state(compacted) == before
+    with open(path, encoding='utf-8') as f:
+        assert len(f.readlines()) == len(before) == compacted.lines
+    compacted.record('fill', '第0题', False, 10 ** 6)
+    before = state(compacted)
+    compacted.close()
+    assert state(AnswerJournal(path, compact_ratio=2, min_compact=10).open()) == before
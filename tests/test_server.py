@@ -0,0 +1,215 @@
+"""本地 HTTP 服务：路由、请求大小限制、AI 解析（缓存、合并、SSE）。AI 接口为 benchmarks/mock_llm.py"""
+import asyncio
+import http.client
+import json
+import os
+import random
+import socket
+import threading
+import time
+
+import pytest
+
+from conftest import MAIN, write_bank
+from tiku_core import TRUNCATED_NOTICE, read_config
+from tiku_server import MAX_BODY, HttpServer, TikuService, serve
+
+
+class RunningServer:
+    """在后台线程的事件循环中运行服务"""
+
+    def __init__(self, service):
+        self.service = service
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        assert self.ready.wait(10)
+
+    def _run(self):
+        asyncio.set_event_loop(self.loop)
+        self.task = self.loop.create_task(serve(self.service, '127.0.0.1', 0, ready=self._ready))
+        try:
+            self.loop.run_until_complete(self.task)
+        except asyncio.CancelledError:
+            pass
+
+    def _ready(self, addr):
+        self.addr = addr
+        self.ready.set()
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.task.cancel)
+        self.thread.join(5)
+        self.service.ai_scheduler.shutdown()
+
+    def request(self, method, path, body=None, headers=None):
+        conn = http.client.HTTPConnection(*self.addr, timeout=10)
+        try:
+            conn.request(method, path, None if body is None else json.dumps(body, ensure_ascii=False).encode(),
+                         headers or {})
+            r = conn.getresponse()
+            return r.status, r.getheader('Content-Type'), r.read()
+        finally:
+            conn.close()
+
+    def json(self, method, path, body=None):
+        status, _, data = self.request(method, path, body)
+        return status, json.loads(data)
+
+    def raw(self, data):
+        with socket.create_connection(self.addr, timeout=10) as s:
+            s.sendall(data)
+            chunks = []
+            while True:
+                chunk = s.recv(65536)
+                if not chunk:
+                    return b''.join(chunks)
+                chunks.append(chunk)
+
+
+def sse_events(data):
+    """text/event-stream 响应体中的事件（http.client 已去掉 chunked 分块）"""
+    events = []
+    for block in data.decode('utf-8').split('\n\n'):
+        if block:
+            assert block.startswith('data: ')
+            events.append(json.loads(block[len('data: '):]))
+    return events
+
+
+@pytest.fixture
+def make_server(tmp_path, monkeypatch, mock_llm):
+    monkeypatch.setenv('SILICON_API_KEY', 'test')
+    write_bank(tmp_path)
+    with open(os.path.join(str(tmp_path), 'config.json'), 'w', encoding='utf-8') as f:
+        json.dump({'api_url': mock_llm.url, 'ai_max_retries': 0}, f)
+    servers = []
+
+    def make():
+        service = TikuService(read_config(os.path.join(str(tmp_path), 'config.json')), str(tmp_path))
+        servers.append(RunningServer(service))
+        return servers[-1]
+
+    yield make
+    for server in servers:
+        server.stop()
+
+
+@pytest.fixture
+def server(make_server):
+    return make_server()
+
+
+STEM = '什么是基础货币？'
+
+
+def test_routing(server):
+    status, body = server.json('GET', '/api/health')
+    assert status == 200 and body['status'] == 'ok'
+    assert server.json('GET', '/api/nothing')[0] == 404
+    assert server.json('GET', '/api/exam')[0] == 405
+    assert server.json('POST', '/api/search', {})[0] == 400
+    assert server.raw(b'POST /api/session HTTP/1.1\r\nContent-Length: 5\r\nConnection: close\r\n\r\n[1,2]') \
+        .startswith(b'HTTP/1.1 400 ')
+
+
+def test_exam_and_grade(server):
+    status, body = server.json('POST', '/api/session', {})
+    sid = body['session']
+    status, paper = server.json('POST', '/api/exam', {'session': sid, 'type': 'judge', 'count': 3, 'seed': 1})
+    assert status == 200 and len(paper['questions']) == 3
+    answers = {str(q['no']): '对' for q in paper['questions']}
+    status, graded = server.json('POST', '/api/grade', {'session': sid, 'answers': answers})
+    assert status == 200 and graded['score'] == 1 and graded['answered'] == 3
+    assert server.json('POST', '/api/answer', {'session': sid, 'no': 99, 'answer': '对'})[0] == 400
+
+
+def test_body_and_header_limits(server):
+    head = b'POST /api/session HTTP/1.1\r\nContent-Length: %d\r\n\r\n' % (MAX_BODY + 1)
+    assert server.raw(head).startswith(b'HTTP/1.1 413 ')
+    assert server.raw(b'GET /api/health HTTP/1.1\r\nX-Big: ' + b'a' * 70000 + b'\r\n\r\n').startswith(b'HTTP/1.1 431 ')
+    assert server.raw(b'GET /' + b'a' * 70000 + b' HTTP/1.1\r\n\r\n').startswith(b'HTTP/1.1 431 ')
+    assert server.raw(b'POST /api/session HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n').startswith(b'HTTP/1.1 411 ')
+
+
+def test_explain_is_scheduled_then_cached(server, mock_llm):
+    status, first = server.json('POST', '/api/explain', {'stem': STEM})
+    assert status == 200 and not first['cached']
+    assert first['answer'] == MAIN[STEM] and first['content']
+    status, second = server.json('POST', '/api/explain', {'stem': STEM})
+    assert status == 200 and second['cached'] and second['content'] == first['content']
+    assert mock_llm.stats() == {200: 1}
+
+
+def test_explain_stream_framing(server, mock_llm):
+    status, content_type, data = server.request('POST', '/api/explain', {'stem': STEM, 'stream': True})
+    assert status == 200 and content_type.startswith('text/event-stream')
+    events = sse_events(data)
+    assert events[0] == {'stem': STEM, 'answer': MAIN[STEM], 'cached': False}
+    assert events[-1] == {'done': True, 'truncated': False}
+    text = ''.join(e['text'] for e in events[1:-1] if e['kind'] == 'content')
+    status, cached = server.json('POST', '/api/explain', {'stem': STEM})
+    assert cached['cached'] and cached['content'] == text
+
+
+def test_coalesced_stream_survives_other_client_dropping(server, mock_llm):
+    request = json.dumps({'stem': STEM, 'stream': True}, ensure_ascii=False).encode()
+    head = b'POST /api/explain HTTP/1.1\r\nContent-Length: %d\r\nConnection: close\r\n\r\n' % len(request)
+    dropper = socket.create_connection(server.addr, timeout=10)
+    dropper.sendall(head + request)
+    assert dropper.recv(65536).startswith(b'HTTP/1.1 200 ')
+    result = {}
+    keeper = threading.Thread(target=lambda: result.update(
+        zip(('status', 'type', 'data'), server.request('POST', '/api/explain', {'stem': STEM, 'stream': True}))))
+    keeper.start()
+    time.sleep(0.1)
+    dropper.close()
+    keeper.join(10)
+    events = sse_events(result['data'])
+    assert events[-1] == {'done': True, 'truncated': False}
+    assert len(''.join(e['text'] for e in events[1:-1])) > 0
+    stats = server.service.ai_scheduler.stats()
+    assert stats['started'] == 1 and stats['coalesced'] == 1
+    assert mock_llm.stats() == {200: 1}
+
+
+def test_cancelled_waiter_does_not_cancel_shared_request(server, mock_llm):
+    """非流式等待者被取消时只取消自己的订阅，合并的其他请求照常完成"""
+    http = HttpServer(server.service)
+
+    class Writer:
+        def __init__(self):
+            self.data = b''
+
+        def write(self, data):
+            self.data += data
+
+        async def drain(self):
+            pass
+
+    async def run():
+        first, second = Writer(), Writer()
+        a = asyncio.ensure_future(http._explain(first, {'stem': STEM}, True, True, {'streaming': False}))
+        b = asyncio.ensure_future(http._explain(second, {'stem': STEM}, True, True, {'streaming': False}))
+        await asyncio.sleep(0.1)
+        a.cancel()
+        await b
+        return a, second.data
+
+    cancelled, data = asyncio.run(run())
+    assert cancelled.cancelled()
+    assert data.startswith(b'HTTP/1.1 200 ')
+    assert json.loads(data.split(b'\r\n\r\n', 1)[1])['content']
+    assert server.service.ai_scheduler.stats()['coalesced'] == 1
+
+
+def test_truncated_explanation_is_flagged_and_not_cached(server, mock_llm):
+    mock_llm.tokens, mock_llm.drop, mock_llm.rng = (10, 10), 1.0, random.Random(1)  # 收到几个片段后断开
+    status, body = server.json('POST', '/api/explain', {'stem': STEM})
+    assert status == 200 and body['truncated'] and body['content'].endswith(TRUNCATED_NOTICE)
+    mock_llm.drop = 0.0
+    status, content_type, data = server.request('POST', '/api/explain', {'stem': STEM, 'stream': True})
+    events = sse_events(data)
+    assert not events[0]['cached'] and events[-1] == {'done': True, 'truncated': False}
+    assert mock_llm.stats() == {'drop': 1, 200: 1}
@@ -0,0 +1,95 @@
+"""SQLite 题库后端：FTS5 检索结果、记录内容与内存模式一致，CSV 变化后重新导入"""
+import difflib
+import random
+import sqlite3
+
+import pytest
+
+from conftest import CHOICE, MAIN, write_bank
+from tiku_core import QuestionLibrary, SqliteQuestionStore
+
+
+def fts5_trigram():
+    try:
+        sqlite3.connect(':memory:').execute("CREATE VIRTUAL TABLE t USING fts5(x, tokenize='trigram')")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+pytestmark = pytest.mark.skipif(not fts5_trigram(), reason="SQLite 不支持 FTS5 trigram")
+
+CHARS = '货币银行利率汇率债券股票风险收益"AaBb'
+
+
+def random_main(rng, n):
+    main = dict(MAIN)
+    while len(main) < n:
+        main[''.join(rng.choice(CHARS) for _ in range(rng.randint(1, 16)))] = str(len(main))
+    return main
+
+
+def load_both(tmp_path, main):
+    paths = write_bank(tmp_path, main=main)
+    db_path = str(tmp_path / '题库.db')
+    memory = QuestionLibrary.load(paths, dedup=False)
+    sqlite = QuestionLibrary.load(paths, backend='sqlite', db_path=db_path)
+    assert isinstance(sqlite.search_index.store, SqliteQuestionStore)
+    return paths, db_path, memory, sqlite
+
+
+def test_records_match_memory_backend(tmp_path):
+    _, _, memory, sqlite = load_both(tmp_path, MAIN)
+    assert dict(sqlite.quiz_dict) == memory.quiz_dict
+    assert list(sqlite.questions) == memory.questions
+    for key, bank in memory.categorized.items():
+        store = sqlite.categorized[key]
+        assert len(store) == len(bank)
+        for i in range(len(bank)):
+            assert (store.stem(i), store.answer(i), store.options(i), store.qtype(i)) == \
+                (bank.stem(i), bank.answer(i), bank.options(i), bank.qtype(i))
+    assert sqlite.entry('choice', 1) == memory.entry('choice', 1)
+    assert sqlite.grade('choice', 1, 'ABC') and not sqlite.grade('choice', 1, 'AB')
+
+
+def test_substring_search_matches_memory_backend(tmp_path):
+    rng = random.Random(5)
+    _, _, memory, sqlite = load_both(tmp_path, random_main(rng, 400))
+    stems = memory.questions
+    keywords = ['货币', '"', 'a', 'A', '利率汇', 'zz', '什么是']
+    for _ in range(200):
+        stem = rng.choice(stems)
+        start = rng.randrange(len(stem))
+        keywords.append(stem[start:start + rng.randint(1, 6)])
+    for kw in keywords:
+        expected = [i for i, stem in enumerate(stems) if kw in stem]
+        assert sqlite.search_index.search_ids(kw) == expected == memory.search_index.search_ids(kw), kw
+        assert sqlite.search_index.search(kw) == memory.search_index.search(kw)
+
+
+def test_close_matches_find_difflib_best_for_typos(tmp_path):
+    """SQLite 模式只对与关键词共有 trigram 的题干打分，不保证与 difflib 完全一致；
+    打错一两个字的查询应与 difflib 给出同样的最佳结果，分数规则相同"""
+    rng = random.Random(6)
+    _, _, memory, sqlite = load_both(tmp_path, random_main(rng, 400))
+    stems = [stem for stem in memory.questions if len(stem) >= 8]
+    for _ in range(50):
+        stem = rng.choice(stems)
+        i = rng.randrange(len(stem))
+        kw = stem[:i] + '□' + stem[i + 1:]
+        best = difflib.get_close_matches(kw, memory.questions, n=1, cutoff=0.2)
+        got = sqlite.search_index.close_matches(kw, n=3, cutoff=0.2)
+        assert got[0] == best[0] or difflib.SequenceMatcher(None, got[0], kw).ratio() == \
+            difflib.SequenceMatcher(None, best[0], kw).ratio(), kw
+        assert got == difflib.get_close_matches(kw, got, n=3, cutoff=0.2)
+
+
+def test_changed_csv_rebuilds_database(tmp_path):
+    paths, db_path, _, _ = load_both(tmp_path, MAIN)
+    assert SqliteQuestionStore(db_path).open(paths)
+    choice = [list(row) for row in CHOICE] + [['新增的选择题', '甲', '乙', '丙', '丁', 'B', '单选题']]
+    write_bank(tmp_path, choice=choice)
+    assert not SqliteQuestionStore(db_path).open(paths)
+    library = QuestionLibrary.load(paths, backend='sqlite', db_path=db_path)
+    assert len(library.categorized['choice']) == len(choice)
+    assert library.search_index.search('久期') == ['什么是久期？']
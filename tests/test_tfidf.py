@@ -0,0 +1,76 @@
+"""TF-IDF 相似度检索：前 k 个结果与逐篇计算余弦相似度的结果一致，有无 SciPy 结果相同"""
+import math
+import random
+from collections import Counter
+
+import pytest
+
+from tiku_core import TfidfIndex
+
+pytest.importorskip('numpy')
+
+
+def grams(text):
+    counts = Counter(text)
+    counts.update(a + b for a, b in zip(text, text[1:]))
+    return counts
+
+
+def brute_force(docs, kw):
+    """按 TfidfIndex 的定义逐篇计算余弦相似度"""
+    n = len(docs)
+    df = Counter(g for doc in docs for g in grams(doc))
+
+    def vector(text, query=False):
+        v = {}
+        for g, tf in grams(text).items():
+            idf = math.log((1 + n) / (1 + df[g])) + 1 if df[g] else math.log(1 + n) + 1
+            v[g] = (1 + math.log(tf)) * idf
+        norm = math.sqrt(sum(w * w for w in v.values()))
+        return {g: w / norm for g, w in v.items() if not query or df[g]}
+
+    q = vector(kw, query=True)
+    return [sum(w * vector(doc).get(g, 0.0) for g, w in q.items()) if doc else 0.0 for doc in docs]
+
+
+def random_docs(rng, n):
+    return [''.join(rng.choice('货币银行利率汇率债券股票风险收益的是') for _ in range(rng.randint(1, 20)))
+            for _ in range(n)]
+
+
+@pytest.mark.parametrize('scipy', [True, False])
+def test_top_k_matches_brute_force(scipy):
+    rng = random.Random(11)
+    docs = random_docs(rng, 300) + ['', '货币']
+    index = TfidfIndex(docs)
+    if not scipy:
+        index.matrix = None
+    for _ in range(30):
+        kw = rng.choice(docs)[:rng.randint(1, 8)] + rng.choice(['', '利', 'X'])
+        scores = brute_force(docs, kw)
+        for k in (1, 5, 20):
+            hits = index.query(kw, k=k)
+            expected = sorted((s for s in scores if s > 0), reverse=True)[:k]
+            assert [s for s, _ in hits] == pytest.approx(expected, abs=1e-5), kw
+            for score, doc in hits:
+                assert score == pytest.approx(scores[doc], abs=1e-5)
+
+
+def test_min_score_and_edge_cases():
+    docs = ['货币供给', '货币需求', '利率']
+    index = TfidfIndex(docs)
+    assert index.query('', k=3) == [] and index.query('货币', k=0) == []
+    assert index.query('外汇', k=3) == []  # 查询中的词项都不在题库中
+    hits = index.query('货币供给', k=10)
+    assert hits[0][1] == 0 and hits[0][0] == pytest.approx(1.0, abs=1e-5)
+    assert {doc for _, doc in hits} == {0, 1}
+    assert all(score > 0.5 for score, _ in index.query('货币供给', k=10, min_score=0.5))
+    assert TfidfIndex([]).query('货币', k=3) == []
+
+
+def test_state_round_trip():
+    docs = random_docs(random.Random(12), 100)
+    index = TfidfIndex(docs)
+    restored = TfidfIndex.from_state(index.state())
+    for kw in ['货币', '银行利率', '风险收益的']:
+        assert restored.query(kw, k=10) == index.query(kw, k=10)
@@ -0,0 +1,2699 @@
+"""题库核心逻辑：加载、检索、抽题、判分和 AI 请求，不依赖 tkinter，可在无界面环境中使用和测试"""
+import os
+import sys
+import random
+import re
+import threading
+import time
+import hashlib
+import heapq
+import itertools
+import marshal
+import mmap
+import queue
+import sqlite3
+import string
+import struct
+import unicodedata
+from array import array
+from concurrent.futures import Future
+from bisect import bisect_left, bisect_right
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping, Sequence
+from email.utils import parsedate_to_datetime
+import json
+
+# ================= 配置 =================
+DEFAULT_CONFIG = {"api_url": "https://api.siliconflow.cn/v1/chat/completions",
+                  "model": "Qwen/Qwen2.5-7B-Instruct", "enable_reasoning": False, "stream": True,
+                  "ai_cache_max_mb": 20, "ai_cache_max_days": 30,
+                  "ai_connect_timeout": 10, "ai_read_timeout": 60, "ai_max_retries": 3, "ai_rate_per_sec": 2,
+                  "ai_prefetch": False, "ai_prefetch_workers": 2, "ai_prefetch_budget": 15,
+                  "ai_max_concurrency": 4, "storage_backend": "memory",
+                  "fuzzy_top_k": 10, "fuzzy_min_score": 0.05, "dedup_enabled": True,
+                  "course_name": "金融学", "courses_dir": "courses", "course_memory_mb": 512, "last_course": "default",
+                  "hot_reload": True, "hot_reload_interval": 2,
+                  "exam_quota": {"choice.single": 6, "choice.multi": 3, "fill": 3, "judge": 3},
+                  "exam_history_window": 5,
+                  "server_host": "127.0.0.1", "server_port": 8750, "server_session_ttl": 7200,
+                  "server_max_sessions": 2000, "server_workers": 8,
+                  "diagnostics_enabled": False, "diagnostics_log": False, "diagnostics_buffer": 500}
+
+
+# 数值配置项的下限：不是数字时用默认值，小于下限时取下限（例如 ai_rate_per_sec 为 0 会让限流除以零）
+CONFIG_MINIMUMS = {"ai_cache_max_mb": 1, "ai_cache_max_days": 1, "ai_connect_timeout": 1, "ai_read_timeout": 1,
+                   "ai_max_retries": 0, "ai_rate_per_sec": 0.1, "ai_prefetch_workers": 1, "ai_prefetch_budget": 0,
+                   "ai_max_concurrency": 1, "fuzzy_top_k": 1, "fuzzy_min_score": 0, "course_memory_mb": 1,
+                   "hot_reload_interval": 0.5, "exam_history_window": 0, "server_port": 0, "server_session_ttl": 60,
+                   "server_max_sessions": 1, "server_workers": 1, "diagnostics_buffer": 1}
+CONFIG_INTEGERS = {"ai_max_retries", "ai_prefetch_workers", "ai_prefetch_budget", "ai_max_concurrency", "fuzzy_top_k",
+                   "exam_history_window", "server_port", "server_max_sessions", "server_workers", "diagnostics_buffer"}
+
+
+def read_config(path):
+    """读取 config.json 并补上缺省项；文件不存在或损坏时使用默认配置，数值项按 CONFIG_MINIMUMS 校正。
+    API 密钥只从环境变量 SILICON_API_KEY 读取"""
+    config = dict(DEFAULT_CONFIG)
+    try:
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                config.update(json.load(f))
+    except:
+        pass
+    for key, minimum in CONFIG_MINIMUMS.items():
+        value = config[key]
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            value = DEFAULT_CONFIG[key]
+        config[key] = max(minimum, int(value) if key in CONFIG_INTEGERS else value)
+    config['api_key'] = os.environ.get('SILICON_API_KEY', '')
+    return config
+
+
+class BankCache:
+    """题库编译缓存：每个 CSV 旁边写一个 .cache 文件（JSON 头 + marshal 数据）。
+    大小和修改时间一致时直接 mmap 读取，不需要导入 pandas；修改时间变了但内容哈希一致时仍然有效"""
+    MAGIC = b'TIKUCACHE'
+    VERSION = 2  # 2: 分类题库改为列式存储
+
+    def __init__(self, csv_path):
+        self.csv_path = csv_path
+        self.path = csv_path + '.cache'
+
+    def signature(self):
+        st = os.stat(self.csv_path)
+        return {'version': self.VERSION, 'python': list(sys.version_info[:2]), 'marshal': marshal.version,
+                'size': st.st_size, 'mtime_ns': st.st_mtime_ns}
+
+    def digest(self):
+        h = hashlib.sha1()
+        with open(self.csv_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        return h.hexdigest()
+
+    def unchanged(self, header, sig):
+        """header 为写缓存时记下的签名；只有修改时间不同时比较内容哈希，哈希一致时返回新算出的哈希，否则返回 True/False"""
+        if header.get('size') != sig['size']:
+            return False
+        if header.get('mtime_ns') == sig['mtime_ns']:
+            return True
+        sha1 = self.digest()
+        return sha1 if header.get('sha1') == sha1 else False
+
+    def load(self):
+        """缓存有效时返回数据，缺失、损坏或已过期时返回 None。只有修改时间变了、内容哈希一致时
+        用新的修改时间重写缓存，之后启动不必再算哈希"""
+        found = {}
+
+        def valid(header):
+            sig = self.signature()
+            if any(header.get(k) != sig[k] for k in ('version', 'python', 'marshal')):
+                return False
+            found['sig'], found['sha1'] = sig, self.unchanged(header, sig)
+            return bool(found['sha1'])
+
+        data = _read_cache(self.path, self.MAGIC, valid)
+        if data is not None and found['sha1'] is not True:
+            self.save(data, found['sig'], found['sha1'])
+        return data
+
+    def save(self, data, sig=None, sha1=None):
+        """写入缓存；sig 和 sha1 应在解析 CSV 之前取得，解析期间 CSV 被改写时缓存随之失效，不会把旧数据记在新签名下。
+        目录不可写等情况静默跳过，下次启动仍走 CSV 解析"""
+        try:
+            if sig is None:
+                sig, sha1 = self.signature(), self.digest()
+        except OSError:
+            return
+        _write_cache(self.path, self.MAGIC, {**sig, 'sha1': sha1}, data)
+
+
+def _read_cache(path, magic, valid):
+    """读取"magic + JSON 头 + marshal 数据"格式的缓存文件。valid(头) 为假时不解 marshal 数据，返回 None；
+    文件缺失或损坏时同样返回 None"""
+    try:
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            if mm[:len(magic)] != magic:
+                return None
+            start = len(magic) + 4
+            (header_len,) = struct.unpack('<I', mm[len(magic):start])
+            header = json.loads(mm[start:start + header_len].decode('utf-8'))
+            if not valid(header):
+                return None
+            with memoryview(mm)[start + header_len:] as payload:
+                return marshal.loads(payload)
+    except (OSError, ValueError, EOFError, TypeError, struct.error):
+        return None
+
+
+def _write_cache(path, magic, header, data):
+    """原子地写入缓存文件（先写临时文件再改名）；目录不可写等情况静默跳过"""
+    tmp = path + '.tmp'
+    try:
+        header = json.dumps(header).encode('utf-8')
+        with open(tmp, 'wb') as f:
+            f.write(magic + struct.pack('<I', len(header)) + header)
+            marshal.dump(data, f)
+        os.replace(tmp, path)
+    except (OSError, ValueError):
+        try:
+            os.remove(tmp)
+        except OSError:
+            pass
+
+
+class LibraryCache:
+    """题库索引缓存：在主题库 CSV 旁边写一个 .index 文件（格式同 BankCache），保存加载时由题目算出的数据——
+    去重结果、子串检索索引、相似度索引、判分键和查题表，热启动时不必重新计算。
+    四个 CSV 的大小和修改时间都与写入时一致（或修改时间变了但内容哈希一致）且去重开关相同才有效"""
+    MAGIC = b'TIKUINDEX'
+    VERSION = 1
+
+    def __init__(self, csv_paths, dedup):
+        self.banks = {key: BankCache(path) for key, path in csv_paths.items()}
+        self.path = csv_paths['main'] + '.index'
+        self.dedup = bool(dedup)
+
+    def _common(self):
+        return {'version': self.VERSION, 'python': list(sys.version_info[:2]), 'marshal': marshal.version,
+                'dedup': self.dedup}
+
+    def signature(self):
+        """写入用的签名，含各 CSV 的内容哈希；应在解析 CSV 之前取得。有 CSV 不存在时抛出 OSError"""
+        banks = {}
+        for key, cache in self.banks.items():
+            sig = cache.signature()
+            banks[key] = {'size': sig['size'], 'mtime_ns': sig['mtime_ns'], 'sha1': cache.digest()}
+        return {**self._common(), 'banks': banks}
+
+    def load(self):
+        """缓存有效时返回数据，否则返回 None。只有修改时间变了时不重写缓存（文件较大），每次启动多算一次哈希"""
+        def valid(header):
+            common = self._common()
+            if any(header.get(k) != v for k, v in common.items()) or set(header.get('banks', ())) != set(self.banks):
+                return False
+            return all(cache.unchanged(header['banks'][key], cache.signature()) for key, cache in self.banks.items())
+
+        return _read_cache(self.path, self.MAGIC, valid)
+
+    def save(self, data, sig):
+        _write_cache(self.path, self.MAGIC, sig, data)
+
+
+class AICache:
+    """AI 解析的本地缓存：SQLite 单文件，多个解析窗口并发读写安全。
+    条目超过 max_age 秒即过期，总大小超过 max_bytes 时按最近使用时间（LRU）淘汰"""
+
+    def __init__(self, path, max_bytes=20 << 20, max_age=30 * 86400):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.hits = self.misses = 0
+        self.lock = threading.Lock()
+        self.conn = None
+
+    @staticmethod
+    def make_key(model, question, answer, prompt_version, reasoning):
+        raw = json.dumps([model, question, answer, prompt_version, bool(reasoning)], ensure_ascii=False)
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        if self.conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS explanations (key TEXT PRIMARY KEY, reasoning TEXT, "
+                         "content TEXT, size INTEGER, created REAL, last_used REAL)")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_explanations_last_used ON explanations (last_used)")
+            conn.commit()
+            self.conn = conn
+        return self.conn
+
+    def has(self, key):
+        """只检查是否有未过期的缓存，不刷新使用时间也不计入命中统计"""
+        try:
+            with self.lock:
+                row = self._connect().execute("SELECT created FROM explanations WHERE key = ?", (key,)).fetchone()
+        except sqlite3.Error:
+            return False
+        return bool(row) and time.time() - row[0] <= self.max_age
+
+    def get(self, key):
+        """命中时返回 (reasoning, content)，同时刷新最近使用时间；未命中或过期返回 None"""
+        now = time.time()
+        try:
+            with self.lock:
+                conn = self._connect()
+                row = conn.execute("SELECT reasoning, content, created FROM explanations WHERE key = ?",
+                                   (key,)).fetchone()
+                if row and now - row[2] <= self.max_age:
+                    with conn:
+                        conn.execute("UPDATE explanations SET last_used = ? WHERE key = ?", (now, key))
+                    self.hits += 1
+                    return row[0], row[1]
+                self.misses += 1
+        except sqlite3.Error:
+            pass
+        return None
+
+    def put(self, key, reasoning, content):
+        now = time.time()
+        size = len(reasoning.encode('utf-8')) + len(content.encode('utf-8'))
+        try:
+            with self.lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("INSERT OR REPLACE INTO explanations VALUES (?, ?, ?, ?, ?, ?)",
+                                 (key, reasoning, content, size, now, now))
+                    self._evict(conn, now)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM explanations WHERE created < ?", (now - self.max_age,))
+        total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM explanations").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        stale = []
+        for key, size in conn.execute("SELECT key, size FROM explanations ORDER BY last_used"):
+            if total <= self.max_bytes:
+                break
+            stale.append((key,))
+            total -= size
+        conn.executemany("DELETE FROM explanations WHERE key = ?", stale)
+
+    def stats(self):
+        entries, total = 0, 0
+        try:
+            with self.lock:
+                entries, total = self._connect().execute(
+                    "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM explanations").fetchone()
+        except sqlite3.Error:
+            pass
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': total}
+
+    def clear(self):
+        try:
+            with self.lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute("DELETE FROM explanations")
+        except sqlite3.Error:
+            pass
+
+
+class AIRequestError(Exception):
+    """AI 接口返回了错误状态或空内容，异常信息可直接展示给用户"""
+
+
+class AIRequestCancelled(AIRequestError):
+    """所有订阅者都已取消，请求被中途放弃"""
+
+
+class AISubscription:
+    """AIScheduler.submit 的返回值：对共享请求的一次订阅，cancel() 只取消自己"""
+
+    def __init__(self, scheduler, job, on_delta):
+        self.scheduler = scheduler
+        self.job = job
+        self.on_delta = on_delta
+        self.cancelled = False
+
+    @property
+    def future(self):
+        return self.job.future
+
+    def add_done_callback(self, fn):
+        """请求结束后回调 fn(future)；订阅已取消时不再回调"""
+        self.job.future.add_done_callback(lambda f: None if self.cancelled else fn(f))
+
+    def cancel(self):
+        self.scheduler._unsubscribe(self)
+
+
+class _AIJob:
+    def __init__(self, key):
+        self.key = key
+        self.future = None
+        self.deltas = []  # 已收到的片段，晚加入的订阅者据此补发
+        self.subscribers = []
+        self.lock = threading.Lock()
+
+
+class AIScheduler:
+    """AI 请求调度：相同 key 的在途请求合并为一个共享 Future；订阅者全部取消后，排队中的请求直接撤销，
+    进行中的请求在下一个片段处中断；所有请求在至多 max_workers 个 daemon 线程里执行，点击再多线程数也不会增长，
+    卡在连接或读取中的请求也不会拖住进程退出"""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.queue = queue.SimpleQueue()
+        self.workers = []
+        self.closed = False
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.started = self.coalesced = self.aborted = 0
+
+    def submit(self, key, fetch, on_delta=None):
+        """fetch(emit, cancelled) 在工作线程中执行：emit(kind, text) 转发片段给所有订阅者，
+        cancelled() 在无人订阅时返回 True。返回 AISubscription"""
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("AIScheduler 已关闭")
+            job = self.jobs.get(key)
+            if job is None or not job.subscribers:
+                job = self.jobs[key] = _AIJob(key)
+                job.future = Future()
+                self.queue.put((job, fetch))
+                if len(self.workers) < self.max_workers:
+                    worker = threading.Thread(target=self._worker, daemon=True)
+                    worker.start()
+                    self.workers.append(worker)
+                self.started += 1
+            else:
+                self.coalesced += 1
+            sub = AISubscription(self, job, on_delta)
+            with job.lock:
+                job.subscribers.append(sub)
+                if on_delta:
+                    for kind, text in job.deltas:
+                        on_delta(kind, text)
+        return sub
+
+    def _worker(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            job, fetch = item
+            if not job.future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = self._run(job, fetch)
+            except BaseException as exc:
+                job.future.set_exception(exc)
+            else:
+                job.future.set_result(result)
+
+    def _run(self, job, fetch):
+        def emit(kind, text):
+            with job.lock:
+                job.deltas.append((kind, text))
+                for sub in job.subscribers:
+                    if sub.on_delta:
+                        sub.on_delta(kind, text)
+
+        try:
+            return fetch(emit, lambda: not job.subscribers)
+        finally:
+            with self.lock:
+                if self.jobs.get(job.key) is job:
+                    del self.jobs[job.key]
+
+    def shutdown(self):
+        """关闭窗口或服务退出时调用：取消全部订阅（不再回调），排队中的请求撤销，进行中的请求在下一个片段处中断，
+        工作线程随后退出"""
+        with self.lock:
+            self.closed = True
+            jobs, self.jobs = list(self.jobs.values()), {}
+            for _ in self.workers:
+                self.queue.put(None)
+        for job in jobs:
+            with job.lock:
+                for sub in job.subscribers:
+                    sub.cancelled = True
+                job.subscribers.clear()
+            job.future.cancel()
+
+    def _unsubscribe(self, sub):
+        job = sub.job
+        with self.lock:
+            with job.lock:
+                if sub.cancelled:
+                    return
+                sub.cancelled = True
+                job.subscribers.remove(sub)
+                if job.subscribers:
+                    return
+            if self.jobs.get(job.key) is job:
+                del self.jobs[job.key]
+        if not job.future.cancel() and not job.future.done():
+            with self.lock:
+                self.aborted += 1
+
+    def stats(self):
+        with self.lock:
+            return {'started': self.started, 'coalesced': self.coalesced, 'aborted': self.aborted,
+                    'inflight': len(self.jobs)}
+
+
+class AIPrefetcher:
+    """考试期间在后台预取 AI 解析：同时最多 workers 个请求，离当前题越近越先请求，
+    真正发出的请求数不超过 budget；cancel() 后不再发起新请求，并取消自己对在途请求的订阅"""
+
+    def __init__(self, items, fetch, workers=2, budget=15):
+        self.items = items  # [(题干, 参考答案)]，下标与考试题目顺序一致
+        self.fetch = fetch  # fetch(q, a)：已缓存时返回 None，否则发起请求并返回 AISubscription
+        self.workers = workers
+        self.budget = budget
+        self.issued = 0
+        self.pending = set(range(len(items)))
+        self.active = {}
+        self.cancelled = False
+        self.lock = threading.Lock()
+        self._pump()
+
+    def focus(self, index):
+        """当前题目变化时调用：之后总是先取 index、index+1 ...，已经做过的题不再预取"""
+        with self.lock:
+            self.pending = {i for i in self.pending if i >= index}
+        self._pump()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            self.pending.clear()
+            active, self.active = list(self.active.values()), {}
+        for sub in active:
+            sub.cancel()
+
+    def _pump(self):
+        """补足并发数：依次取最靠前的题目，命中缓存的跳过且不占额度"""
+        while True:
+            with self.lock:
+                if (self.cancelled or not self.pending or len(self.active) >= self.workers
+                        or self.issued >= self.budget):
+                    return
+                index = min(self.pending)
+                self.pending.discard(index)
+            try:
+                sub = self.fetch(*self.items[index])
+            except Exception:
+                sub = None
+            if sub is None:
+                continue
+            with self.lock:
+                if self.cancelled:
+                    sub.cancel()
+                    return
+                self.issued += 1
+                self.active[index] = sub
+            sub.add_done_callback(lambda f, i=index: self._done(i))
+
+    def _done(self, index):
+        with self.lock:
+            self.active.pop(index, None)
+        self._pump()
+
+
+class AIClient:
+    """应用共享的 AI 接口客户端：Session 连接池复用 TCP/TLS 连接；429/5xx 和连接没有建立的失败按指数退避重试；
+    令牌桶限流，收到 Retry-After 时所有请求一起暂停；记录延迟与重试次数"""
+    RETRY_STATUS = {429, 500, 502, 503, 504}
+    MAX_RETRY_AFTER = 60
+
+    def __init__(self, max_retries=3, backoff=0.5, rate=2.0, burst=4, timeout=(10, 60), pool_size=8):
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.rate = max(rate, 1e-3)
+        self.burst = max(burst, 1)
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.session = None  # 首次请求时才导入 requests 并创建
+
+        self.lock = threading.Lock()
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self.requests = self.retries = self.failures = 0
+        self.latencies = deque(maxlen=200)  # 最近请求收到响应头的耗时（秒）
+
+    def _session(self):
+        with self.lock:
+            if self.session is None:
+                import requests
+                self.session = requests.Session()
+                adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=self.pool_size)
+                self.session.mount('https://', adapter)
+                self.session.mount('http://', adapter)
+            return self.session
+
+    def _acquire(self):
+        """取一个令牌；令牌不足或处于 Retry-After 冷却期时阻塞等待"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                wait = self.blocked_until - now
+                if wait <= 0:
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        return
+                    wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def _retry_after(self, response):
+        value = response.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(value).timestamp() - time.time()
+            except (TypeError, ValueError):
+                return None
+        return min(max(delay, 0.0), self.MAX_RETRY_AFTER)
+
+    @staticmethod
+    def _not_sent(exc):
+        """连接超时、拒绝连接、域名解析失败时请求一定没有发出，可以重试；
+        连接建立之后的断开、读超时说明请求可能已被接口处理，重试会重复计费"""
+        import requests
+        from urllib3.exceptions import NewConnectionError
+        if isinstance(exc, requests.ConnectTimeout):
+            return True
+        reason = getattr(exc.args[0], 'reason', None) if exc.args else None
+        return isinstance(reason, NewConnectionError)
+
+    def post(self, url, payload, headers, stream=False, timeout=None):
+        """发送 POST 请求，可重试的失败会自动重试；返回最后一次的 Response（流式响应由调用方关闭）。
+        只对 429/5xx 和连接没有建立的错误重试（见 _not_sent），其余错误直接抛出"""
+        import requests
+        session = self._session()
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            start = time.perf_counter()
+            with self.lock:
+                self.requests += 1
+            try:
+                r = session.post(url, json=payload, headers=headers, stream=stream,
+                                      timeout=timeout or self.timeout)
+            except requests.ConnectionError as exc:
+                if attempt == self.max_retries or not self._not_sent(exc):
+                    with self.lock:
+                        self.failures += 1
+                    raise
+                delay = self.backoff * 2 ** attempt
+            else:
+                retry_after = self._retry_after(r) if r.status_code in self.RETRY_STATUS else None
+                if retry_after is not None:
+                    # 不再重试时也记下，其他请求同样要等到冷却结束
+                    with self.lock:
+                        self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+                if r.status_code not in self.RETRY_STATUS or attempt == self.max_retries:
+                    with self.lock:
+                        self.latencies.append(time.perf_counter() - start)
+                        if r.status_code != 200:
+                            self.failures += 1
+                    return r
+                delay = retry_after if retry_after is not None else self.backoff * 2 ** attempt
+                r.close()
+            with self.lock:
+                self.retries += 1
+            time.sleep(delay * (1 + random.random() * 0.1))
+
+    def stats(self):
+        with self.lock:
+            lat = sorted(self.latencies)
+        return {'requests': self.requests, 'retries': self.retries, 'failures': self.failures,
+                'latency_p50': lat[len(lat) // 2] if lat else None,
+                'latency_p95': lat[min(len(lat) - 1, int(len(lat) * 0.95))] if lat else None}
+
+
+def iter_chat_stream(lines):
+    """解析 OpenAI 兼容接口的 SSE 流（stream: true），逐个产出 ('reasoning' 或 'content', 文本片段)；
+    收到 [DONE] 或 finish_reason 时最后产出 ('finish', 结束原因)，没有这一项说明流被提前截断。
+    最后一个事件缺少结尾空行时照常处理"""
+    data, finish = [], None
+    for raw in itertools.chain(lines, ['']):
+        line = raw.decode('utf-8') if isinstance(raw, bytes) else raw
+        if line.startswith('data:'):
+            data.append(line[5:].lstrip())
+            continue
+        if line or not data:
+            continue
+        # 空行表示一个事件结束，多行 data 按规范用换行拼接
+        event, data = '\n'.join(data), []
+        if event == '[DONE]':
+            yield 'finish', finish or 'stop'
+            return
+        try:
+            chunk = json.loads(event)
+        except ValueError:
+            continue
+        for choice in chunk.get('choices') or []:
+            delta = choice.get('delta') or {}
+            if delta.get('reasoning_content'):
+                yield 'reasoning', delta['reasoning_content']
+            if delta.get('content'):
+                yield 'content', delta['content']
+            finish = choice.get('finish_reason') or finish
+    if finish:
+        yield 'finish', finish
+
+
+def fetch_chat(client, url, payload, headers, stream=True, span=None, on_delta=None, cancelled=None):
+    """通过 AIClient 发送一次对话请求，返回收集到的片段 {'reasoning': [...], 'content': [...], 'finish_reason'}。
+    流没有正常结束（缺少结束标记，或已收到片段后连接断开）时返回已收到的部分，finish_reason 为 None，
+    并在 span 中记下 truncated。
+    span 为 TimingLog.span 返回的对象，记录状态码、排队（限流/重试）、首字节（含建连）和首个片段的耗时；
+    on_delta(kind, text) 在收到每个片段时回调；cancelled() 返回 True 时抛出 AIRequestCancelled；
+    接口报错时抛出 AIRequestError，网络异常原样抛出"""
+    parts = {'reasoning': [], 'content': [], 'finish_reason': None}
+    span = span or _NULL_SPAN
+    start = time.perf_counter()
+
+    def got_response(r):
+        first_byte = r.elapsed.total_seconds()
+        span.set(status=r.status_code, wait_ms=round((time.perf_counter() - start - first_byte) * 1000, 3),
+                 first_byte_ms=round(first_byte * 1000, 3))
+
+    def got_delta(kind, text):
+        if not parts['reasoning'] and not parts['content']:
+            span.set(first_token_ms=round((time.perf_counter() - start) * 1000, 3))
+        parts[kind].append(text)
+        if on_delta:
+            on_delta(kind, text)
+
+    if stream:
+        import requests
+        with client.post(url, {**payload, "stream": True}, headers, stream=True) as r:
+            got_response(r)
+            if r.status_code != 200:
+                raise AIRequestError(f"API 返回错误 (状态码:{r.status_code})\n请检查API配置是否正确")
+            try:
+                for kind, text in iter_chat_stream(r.iter_lines(chunk_size=64)):
+                    if cancelled is not None and cancelled():
+                        raise AIRequestCancelled("请求已取消")
+                    if kind == 'finish':
+                        parts['finish_reason'] = text
+                    else:
+                        got_delta(kind, text)
+            except requests.RequestException:
+                if not parts['content']:
+                    raise
+        if parts['finish_reason'] is None:
+            span.set(truncated=True)
+    else:
+        r = client.post(url, payload, headers)
+        got_response(r)
+        if r.status_code != 200:
+            raise AIRequestError(f"API 返回错误 (状态码:{r.status_code})\n请检查API配置是否正确")
+        choice = r.json()['choices'][0]
+        message = choice['message']
+        parts['finish_reason'] = choice.get('finish_reason') or 'stop'
+        for kind, key in [('reasoning', 'reasoning_content'), ('content', 'content')]:
+            if message.get(key):
+                got_delta(kind, message[key])
+    return parts
+
+
+EXPLAIN_PROMPT_VERSION = 1  # 修改解析提示词时递增，旧的缓存解析随之失效
+TRUNCATED_NOTICE = "\n\n（解析未完整返回：连接中途断开，可稍后重新打开解析）"
+
+
+def explain_cache_key(config, q, a):
+    """一条解析在 AICache 中的键：模型、题目、参考答案、提示词版本和是否开启思考都相同才共用"""
+    return AICache.make_key(config['model'], q, a, EXPLAIN_PROMPT_VERSION, config.get('enable_reasoning', False))
+
+
+def build_explain_request(config, q, a):
+    """解析请求的 (payload, headers)"""
+    prompt = f"""题目：{q}
+参考答案：{a}
+你是只猫娘，给出详细且好懂的解析，并指出考点。纯文本，不要markdown格式，星号也不要，对于选择题最好的回答方式是针对每一个选项回答为什么正确或者错误。说话要带上"喵"或者颜文字，适量即可"""
+
+    payload = {
+        "model": config['model'],
+        "messages": [
+            {"role": "system", "content": """你是一只可爱的猫娘，说话要带上"喵"的后缀。"""},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.3
+    }
+
+    if config.get('enable_reasoning', False):
+        payload["enable_thinking"] = True
+
+    headers = {
+        "Authorization": f"Bearer {config['api_key']}",
+        "Content-Type": "application/json"
+    }
+    return payload, headers
+
+
+def request_explanation(client, cache, config, timings, q, a, on_delta=None, cancelled=None):
+    """请求一条解析，返回 (reasoning, content)；只有完整结束的回答才写入 cache。流被提前截断时不缓存，
+    在 content 末尾加上 TRUNCATED_NOTICE（也经 on_delta 发出），界面上能看出解析不完整。
+    on_delta(kind, text) 在收到每个片段时回调；cancelled() 返回 True 时抛出 AIRequestCancelled 中断请求；
+    接口报错时抛出 AIRequestError，网络异常原样抛出"""
+    payload, headers = build_explain_request(config, q, a)
+    stream = config.get('stream', True)
+    with timings.span('ai_request', stream=stream) as sp:
+        parts = fetch_chat(client, config['api_url'], payload, headers, stream,
+                           span=sp, on_delta=on_delta, cancelled=cancelled)
+
+    if cancelled is not None and cancelled():
+        raise AIRequestCancelled("请求已取消")
+    reasoning, content = ''.join(parts['reasoning']), ''.join(parts['content'])
+    if not content:
+        raise AIRequestError("模型没有返回任何内容，请稍后重试")
+    if parts['finish_reason'] is None:
+        if on_delta:
+            on_delta('content', TRUNCATED_NOTICE)
+        return reasoning, content + TRUNCATED_NOTICE
+    cache.put(explain_cache_key(config, q, a), reasoning, content)
+    return reasoning, content
+
+
+def _native(value):
+    """把 pandas/numpy 标量转成 Python 原生类型，便于 marshal 序列化"""
+    return value.item() if hasattr(value, 'item') else value
+
+
+def _clean_text(value):
+    """CSV 单元格转成去掉首尾空白的字符串，NaN、空串和 'nan' 视为缺失返回 None"""
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    text = str(_native(value)).strip()
+    return text if text and text != 'nan' else None
+
+
+class QuestionBank(Sequence):
+    """分类题库的列式存储：每个字段一个列表，缺失的选项在加载时统一为 None，题型字符串驻留共享。
+    界面按下标读取字段（stem/answer/qtype/options）；bank[i] 仍返回与 to_dict('records') 相同结构的 dict"""
+    __slots__ = ('columns', 'stems', 'answers', 'types', 'option_columns')
+    OPTION_LABELS = ('A', 'B', 'C', 'D')
+
+    def __init__(self, columns):
+        self.columns = columns  # 字段名 -> 列表，可直接 marshal 写入 BankCache
+        self.stems = columns.get('stem', [])
+        self.answers = columns.get('answer', [])
+        self.types = columns.get('type')
+        self.option_columns = [(label, columns[label]) for label in self.OPTION_LABELS if label in columns]
+
+    @classmethod
+    def build_columns(cls, raw):
+        """raw 为 CSV 原始列（字段名 -> 值序列），在这里一次性完成清洗"""
+        columns = {'stem': [_clean_text(v) or '' for v in raw['stem']],
+                   'answer': [_clean_text(v) or '' for v in raw['answer']]}
+        for label in cls.OPTION_LABELS:
+            if label in raw:
+                columns[label] = [_clean_text(v) for v in raw[label]]
+        if 'type' in raw:
+            columns['type'] = [sys.intern(_clean_text(v) or '单选题') for v in raw['type']]
+        return columns
+
+    def __len__(self):
+        return len(self.stems)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        rec = {'stem': self.stems[i]}
+        rec.update((label, col[i]) for label, col in self.option_columns)
+        rec['answer'] = self.answers[i]
+        if self.types is not None:
+            rec['type'] = self.types[i]
+        return rec
+
+    def stem(self, i):
+        return self.stems[i]
+
+    def answer(self, i):
+        return self.answers[i]
+
+    def qtype(self, i):
+        return self.types[i] if self.types is not None else None
+
+    def options(self, i):
+        """[(标号, 选项文字)]，只含非空选项"""
+        return [(label, col[i]) for label, col in self.option_columns if col[i] is not None]
+
+
+class PackedPostings(Mapping):
+    """只读的二元组倒排表：二元组排好序，各倒排表首尾相接存在一个整数数组里，按二分查找取出一段。
+    从索引缓存读入时不必为几十万个二元组逐个建列表"""
+
+    def __init__(self, keys, offsets, postings):
+        self.keys, self.offsets, self.postings = keys, offsets, postings
+
+    def __getitem__(self, g):
+        i = bisect_left(self.keys, g)
+        if i == len(self.keys) or self.keys[i] != g:
+            raise KeyError(g)
+        return self.postings[self.offsets[i]:self.offsets[i + 1]]
+
+    def __iter__(self):
+        return iter(self.keys)
+
+    def __len__(self):
+        return len(self.keys)
+
+    def to_dict(self):
+        """转成普通的 二元组 -> 倒排表 字典，倒排表为数组切片"""
+        offsets = self.offsets
+        return {g: self.postings[offsets[i]:offsets[i + 1]] for i, g in enumerate(self.keys)}
+
+
+class NgramIndex:
+    """字符 n-gram 倒排索引：二元组倒排求交做子串检索，单字倒排按长度分段为模糊匹配剪枝。
+    单字倒排只在第一次模糊匹配时建立"""
+
+    def __init__(self, docs):
+        self.docs = list(docs)
+        self.bigrams = {}
+        for i, doc in enumerate(self.docs):
+            if isinstance(doc, str):
+                for g in self._grams(doc):
+                    self.bigrams.setdefault(g, []).append(i)
+        self.order = self.spans = self.unigrams = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _grams(doc):
+        return set(map(str.__add__, doc, doc[1:]))
+
+    def pack(self):
+        """可 marshal 的二元组倒排表：(排好序的二元组, 各倒排表的起点, 全部倒排表)，见 unpack"""
+        if isinstance(self.bigrams, PackedPostings):
+            b = self.bigrams
+            return b.keys, b.offsets.tobytes(), b.postings.tobytes()
+        keys = sorted(self.bigrams)
+        offsets, postings = array('q', [0]), array('i')
+        for g in keys:
+            postings.extend(self.bigrams[g])
+            offsets.append(len(postings))
+        return keys, offsets.tobytes(), postings.tobytes()
+
+    @classmethod
+    def unpack(cls, docs, keys, offsets, postings):
+        """由 pack 的结果恢复索引，二元组倒排表为只读的 PackedPostings"""
+        index = cls([])
+        index.docs = list(docs)
+        index.bigrams = PackedPostings(keys, array('q', offsets), array('i', postings))
+        return index
+
+    def posting_count(self):
+        if isinstance(self.bigrams, PackedPostings):
+            return len(self.bigrams.postings)
+        return sum(map(len, self.bigrams.values()))
+
+    def _build_length_index(self):
+        with self._lock:
+            if self.order is not None:
+                return
+            # 按长度排序后的名次作为单字倒排表的 id，同一长度的文档在倒排表里是连续的一段
+            order = sorted((i for i, d in enumerate(self.docs) if isinstance(d, str)), key=lambda i: len(self.docs[i]))
+            spans, unigrams = {}, {}
+            for rank, i in enumerate(order):
+                doc = self.docs[i]
+                start, _ = spans.get(len(doc), (rank, rank))
+                spans[len(doc)] = (start, rank + 1)
+                for ch in set(doc):
+                    unigrams.setdefault(ch, []).append(rank)
+            self.spans, self.unigrams, self.order = spans, unigrams, order
+
+    def with_changes(self, removed, added):
+        """返回删除下标 removed、加入文档 added 之后的新索引，原索引不变。
+        新文档优先填入删除留下的空位，多余的空位用末尾的文档填补，因此只有变动的文档需要改倒排表；
+        倒排表按需复制，未涉及的与原索引共用"""
+        index = NgramIndex.__new__(NgramIndex)
+        bigrams = self.bigrams.to_dict() if isinstance(self.bigrams, PackedPostings) else self.bigrams
+        index.docs, index.bigrams = list(self.docs), dict(bigrams)
+        index.order = index.spans = index.unigrams = None
+        index._lock = threading.Lock()
+        copied = set()
+
+        def posting(g):
+            if g not in copied:
+                copied.add(g)
+                index.bigrams[g] = list(index.bigrams.get(g, ()))
+            return index.bigrams[g]
+
+        def drop(i):
+            doc = index.docs[i]
+            if isinstance(doc, str):
+                for g in self._grams(doc):
+                    p = posting(g)
+                    del p[bisect_left(p, i)]
+
+        def put(i, doc):
+            index.docs[i] = doc
+            if isinstance(doc, str):
+                for g in self._grams(doc):
+                    p = posting(g)
+                    p.insert(bisect_left(p, i), i)
+
+        holes = sorted(set(removed), reverse=True)
+        for i in holes:
+            drop(i)
+        for doc in added:
+            if holes:
+                put(holes.pop(), doc)
+            else:
+                index.docs.append(None)
+                put(len(index.docs) - 1, doc)
+        holes.reverse()
+        while holes:
+            last = len(index.docs) - 1
+            if last == holes[-1]:
+                holes.pop()
+            else:
+                doc = index.docs[last]
+                drop(last)
+                put(holes.pop(0), doc)
+            index.docs.pop()
+        for g in copied:
+            if not index.bigrams[g]:
+                del index.bigrams[g]
+        return index
+
+    def search(self, kw):
+        """返回包含 kw 的全部文档，顺序与 [d for d in docs if kw in d] 相同"""
+        return [self.docs[i] for i in self.search_ids(kw)]
+
+    def search_ids(self, kw):
+        """返回包含 kw 的文档下标（升序）"""
+        if len(kw) < 2:
+            return [i for i, d in enumerate(self.docs) if isinstance(d, str) and kw in d]
+
+        postings = sorted((self.bigrams.get(g, []) for g in set(map(str.__add__, kw, kw[1:]))), key=len)
+        cand = set(postings[0])
+        for posting in postings[1:]:
+            # 候选已经很少时，直接逐个校验比继续求交集更快
+            if not cand or len(cand) * 8 < len(posting):
+                break
+            cand.intersection_update(posting)
+        return [i for i in sorted(cand) if kw in self.docs[i]]
+
+    def close_matches(self, kw, n=3, cutoff=0.2, cancelled=None):
+        """结果与 difflib.get_close_matches(kw, docs, n, cutoff) 一致，但只对剪枝后的候选计算 ratio。
+        cancelled 为可选的回调，返回 True 时放弃本次检索并返回空列表"""
+        from difflib import SequenceMatcher, get_close_matches
+        if not kw or n <= 0 or cutoff <= 0:
+            return get_close_matches(kw, self.docs, n=n, cutoff=cutoff)
+        if self.order is None:
+            self._build_length_index()
+
+        # ratio = 2M/(la+lb)，M 不超过 min(la, lb)，也不超过两者共有的字符数。
+        # 按长度上界从高到低逐段扫描，上界低于当前第 n 名（或 cutoff）的候选不必计算 ratio
+        lb = len(kw)
+        weights = [(self.unigrams[ch], k) for ch, k in Counter(kw).items() if ch in self.unigrams]
+        lengths = sorted(self.spans, key=lambda la: 2.0 * min(la, lb) / (la + lb), reverse=True)
+
+        s = SequenceMatcher()
+        s.set_seq2(kw)
+        top = []
+        for la in lengths:
+            if cancelled is not None and cancelled():
+                return []
+            floor = top[0][0] if len(top) >= n else cutoff
+            if 2.0 * min(la, lb) / (la + lb) < floor:
+                break
+            start, end = self.spans[la]
+            shared = Counter()
+            for posting, k in weights:
+                segment = posting[bisect_left(posting, start):bisect_left(posting, end)]
+                for _ in range(k):
+                    shared.update(segment)
+            need = floor * (la + lb) / 2.0 - 1e-9
+            for m, rank in sorted(((m, r) for r, m in shared.items() if min(m, la, lb) >= need), reverse=True):
+                if 2.0 * min(m, la, lb) / (la + lb) < floor:
+                    break
+                x = self.docs[self.order[rank]]
+                s.set_seq1(x)
+                if s.quick_ratio() < floor:
+                    continue
+                score = s.ratio()
+                if score < cutoff:
+                    continue
+                if len(top) < n:
+                    heapq.heappush(top, (score, x))
+                elif (score, x) > top[0]:
+                    heapq.heapreplace(top, (score, x))
+                else:
+                    continue
+                floor = top[0][0] if len(top) >= n else cutoff
+        return [x for _, x in sorted(top, reverse=True)]
+
+
+class SqliteQuestionStore:
+    """SQLite 题库后端：四个 CSV 导入规范化的表，FTS5（trigram 分词）索引题干和答案。
+    题目按需从数据库读取，启动时不再把整个题库载入内存；每个线程使用自己的只读连接"""
+    BANK_KEYS = ('main', 'choice', 'fill', 'judge')
+    SCHEMA_VERSION = 2  # 2: 导入时已清洗的 QuestionBank 数据
+    OPTION_LABELS = ('A', 'B', 'C', 'D')
+
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+        self.spans = {}  # bank -> (first_id, count)，每个题库的 id 连续
+        self.connections = []  # 各线程打开的连接，close 时一并关闭
+        self.lock = threading.Lock()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = sqlite3.connect(self.path, check_same_thread=False)
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def close(self):
+        """关闭所有线程的连接（课程被淘汰时调用）；之后再查询会重新打开"""
+        with self.lock:
+            connections, self.connections = self.connections, []
+            self.local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    @staticmethod
+    def _source_state(csv_path):
+        try:
+            return BankCache(csv_path).signature()
+        except OSError:
+            return None
+
+    def open(self, csv_paths):
+        """数据库与 CSV 一致时返回 True 并读取各题库的 id 范围，否则返回 False（需要 rebuild）"""
+        if not os.path.exists(self.path):
+            return False
+        try:
+            conn = self.connection()
+            if conn.execute("PRAGMA user_version").fetchone()[0] != self.SCHEMA_VERSION:
+                return False
+            rows = {r[0]: r[1:] for r in conn.execute(
+                "SELECT name, first_id, count, size, mtime_ns, sha1 FROM banks")}
+        except sqlite3.Error:
+            return False
+        for key in self.BANK_KEYS:
+            state, row = self._source_state(csv_paths[key]), rows.get(key)
+            if row is None or (state is None) != (row[2] is None):
+                return False
+            if state is not None and (state['size'] != row[2] or (
+                    state['mtime_ns'] != row[3] and BankCache(csv_paths[key]).digest() != row[4])):
+                return False
+        self.spans = {key: (rows[key][0], rows[key][1]) for key in self.BANK_KEYS}
+        return True
+
+    def rebuild(self, csv_paths, banks):
+        """用解析好的题库数据（与 load_all_data 内存模式的结构相同）重建数据库，写临时文件后原子替换"""
+        tmp = self.path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        conn = sqlite3.connect(tmp)
+        try:
+            conn.executescript("""
+                CREATE TABLE banks (name TEXT PRIMARY KEY, first_id INTEGER, count INTEGER,
+                                    size INTEGER, mtime_ns INTEGER, sha1 TEXT);
+                CREATE TABLE questions (id INTEGER PRIMARY KEY, bank TEXT NOT NULL, stem TEXT,
+                                        answer TEXT, qtype TEXT);
+                CREATE INDEX idx_questions_stem ON questions (bank, stem);
+                CREATE TABLE options (question_id INTEGER, label TEXT, text TEXT,
+                                      PRIMARY KEY (question_id, label)) WITHOUT ROWID;
+                CREATE VIRTUAL TABLE questions_fts USING fts5(
+                    stem, answer, content='questions', content_rowid='id', tokenize='trigram case_sensitive 1');
+            """)
+            next_id = 1
+            for key in self.BANK_KEYS:
+                if key == 'main':
+                    rows = [(stem, answer, None) for stem, answer in banks.get(key, {}).items()]
+                else:
+                    data = banks.get(key) or QuestionBank({})
+                    rows = [(data.stem(i), data.answer(i), data.qtype(i)) for i in range(len(data))]
+                    conn.executemany("INSERT INTO options VALUES (?, ?, ?)",
+                                     ((next_id + i, label, text) for i in range(len(data))
+                                      for label, text in data.options(i)))
+                conn.executemany("INSERT INTO questions (id, bank, stem, answer, qtype) VALUES (?, ?, ?, ?, ?)",
+                                 ((next_id + i, key, _sql_value(stem), _sql_value(answer), qtype)
+                                  for i, (stem, answer, qtype) in enumerate(rows)))
+                state = self._source_state(csv_paths[key])
+                conn.execute("INSERT INTO banks VALUES (?, ?, ?, ?, ?, ?)",
+                             (key, next_id, len(rows), state and state['size'], state and state['mtime_ns'],
+                              state and BankCache(csv_paths[key]).digest()))
+                next_id += len(rows)
+            conn.execute("INSERT INTO questions_fts (questions_fts) VALUES ('rebuild')")
+            conn.execute(f"PRAGMA user_version = {self.SCHEMA_VERSION}")
+            conn.commit()
+        finally:
+            conn.close()
+        self.close()
+        os.replace(tmp, self.path)
+        return self.open(csv_paths)
+
+    def record(self, bank, pos):
+        """按题库内序号读取一条记录，结构与 QuestionBank[i] 相同"""
+        first, count = self.spans[bank]
+        if not -count <= pos < count:
+            raise IndexError(pos)
+        qid = first + pos % count
+        conn = self.connection()
+        stem, answer, qtype = conn.execute("SELECT stem, answer, qtype FROM questions WHERE id = ?",
+                                           (qid,)).fetchone()
+        rec = {'stem': stem}
+        if bank == 'choice':
+            options = dict(conn.execute("SELECT label, text FROM options WHERE question_id = ?", (qid,)))
+            rec.update({label: options.get(label) for label in self.OPTION_LABELS})
+            rec.update(answer=answer, type=qtype)
+        else:
+            rec['answer'] = answer
+        return rec
+
+
+def _sql_value(value):
+    """NaN 等缺失值统一存成 NULL"""
+    return None if isinstance(value, float) and value != value else value
+
+
+class StoreRecords(Sequence):
+    """SqliteQuestionStore 中某个分类题库的只读序列视图，按下标懒加载，接口与 QuestionBank 相同"""
+
+    def __init__(self, store, bank):
+        self.store, self.bank = store, bank
+
+    def __len__(self):
+        return self.store.spans[self.bank][1]
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        return self.store.record(self.bank, pos)
+
+    def stem(self, i):
+        return self[i]['stem']
+
+    def answer(self, i):
+        return self[i]['answer']
+
+    def qtype(self, i):
+        return self[i].get('type')
+
+    def options(self, i):
+        rec = self[i]
+        return [(label, rec[label]) for label in QuestionBank.OPTION_LABELS if rec.get(label) is not None]
+
+
+class StoreStems(StoreRecords):
+    """主题库题干序列，对应内存模式的 self.questions"""
+
+    def __getitem__(self, pos):
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        first, count = self.store.spans[self.bank]
+        if not -count <= pos < count:
+            raise IndexError(pos)
+        return self.store.connection().execute("SELECT stem FROM questions WHERE id = ?",
+                                               (first + pos % count,)).fetchone()[0]
+
+
+class StoreAnswers(Mapping):
+    """主题库“题干 -> 答案”映射，对应内存模式的 self.quiz_dict"""
+
+    def __init__(self, store, bank='main'):
+        self.store, self.bank = store, bank
+
+    def __getitem__(self, stem):
+        row = self.store.connection().execute("SELECT answer FROM questions WHERE bank = ? AND stem = ?",
+                                              (self.bank, stem)).fetchone()
+        if row is None:
+            raise KeyError(stem)
+        return row[0]
+
+    def __iter__(self):
+        for (stem,) in self.store.connection().execute("SELECT stem FROM questions WHERE bank = ? ORDER BY id",
+                                                       (self.bank,)):
+            yield stem
+
+    def __len__(self):
+        return self.store.spans[self.bank][1]
+
+
+class StoreSearchIndex:
+    """与 NgramIndex 接口相同的检索器，查询走 FTS5 trigram 索引而不是 Python 扫描"""
+    FUZZY_CANDIDATES = 200
+
+    def __init__(self, store, bank='main'):
+        self.store, self.bank = store, bank
+
+    @staticmethod
+    def _phrase(text):
+        return '"' + text.replace('"', '""') + '"'
+
+    def _matches(self, kw):
+        first, count = self.store.spans[self.bank]
+        conn = self.store.connection()
+        if len(kw) >= 3:
+            rows = conn.execute("SELECT rowid, stem FROM questions_fts WHERE questions_fts MATCH ? "
+                                "AND rowid BETWEEN ? AND ? ORDER BY rowid",
+                                ('stem : ' + self._phrase(kw), first, first + count - 1))
+        else:
+            # trigram 索引只能加速 3 个字及以上的查询，短关键词交给 SQLite 顺序扫描
+            rows = conn.execute("SELECT id, stem FROM questions WHERE bank = ? AND instr(stem, ?) > 0 ORDER BY id",
+                                (self.bank, kw))
+        return [(qid - first, stem) for qid, stem in rows if kw in stem]
+
+    def search(self, kw):
+        return [stem for _, stem in self._matches(kw)]
+
+    def search_ids(self, kw):
+        if not kw:
+            return range(len(StoreStems(self.store, self.bank)))
+        return [pos for pos, _ in self._matches(kw)]
+
+    def close_matches(self, kw, n=3, cutoff=0.2, cancelled=None):
+        """先用 FTS 取出与关键词共有 trigram（短关键词为共有字符）最多的候选，再按 difflib 规则打分"""
+        if not kw:
+            return []
+        first, count = self.store.spans[self.bank]
+        conn = self.store.connection()
+        if len(kw) >= 3:
+            query = ' OR '.join(self._phrase(kw[i:i + 3]) for i in range(len(kw) - 2))
+            rows = conn.execute("SELECT stem FROM questions_fts WHERE questions_fts MATCH ? "
+                                "AND rowid BETWEEN ? AND ? ORDER BY rank LIMIT ?",
+                                ('stem : (' + query + ')', first, first + count - 1, self.FUZZY_CANDIDATES))
+        else:
+            rows = conn.execute("SELECT stem FROM questions WHERE bank = ? AND (" +
+                                ' OR '.join(['instr(stem, ?) > 0'] * len(kw)) +
+                                ") ORDER BY abs(length(stem) - ?) LIMIT ?",
+                                (self.bank, *kw, len(kw), self.FUZZY_CANDIDATES))
+        from difflib import get_close_matches
+        candidates = [stem for (stem,) in rows]
+        if cancelled is not None and cancelled():
+            return []
+        return get_close_matches(kw, candidates, n=n, cutoff=cutoff)
+
+
+class TfidfIndex:
+    """字符一元、二元组 TF-IDF 相似度检索。文档向量按 L2 归一化后存成按词项压缩的稀疏矩阵（CSC），
+    一次查询只做一次稀疏矩阵乘向量得到全部文档的余弦相似度，再用 argpartition 取前 k 个。
+    装有 SciPy 时用 scipy.sparse 相乘，否则用 NumPy bincount 完成同样的计算；需要 NumPy"""
+
+    def __init__(self, docs):
+        import numpy as np
+        n = self.size = len(docs)
+        lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=n)
+        codes = np.frombuffer(''.join(docs).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        owner = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        same = owner[1:] == owner[:-1]
+        keys = np.concatenate([codes, self._bigram_keys(codes[:-1][same], codes[1:][same])])
+        owners = np.concatenate([owner, owner[:-1][same]])
+
+        # 词表为排好序的 key；(词项, 文档) 去重计数得到词频，词项为主序，正好是 CSC 的存储顺序
+        self.vocab, terms = np.unique(keys, return_inverse=True)
+        pairs, tf = np.unique(terms.astype(np.int64) * max(n, 1) + owners, return_counts=True)
+        terms, rows = np.divmod(pairs, max(n, 1))
+        df = np.bincount(terms, minlength=len(self.vocab))
+        self.idf = np.log((1.0 + n) / (1.0 + df)) + 1.0
+        self.unseen_idf = np.log(1.0 + n) + 1.0  # 查询中出现但题库里没有的词项
+        data = (1.0 + np.log(tf)) * self.idf[terms]
+        data /= np.sqrt(np.bincount(rows, weights=data * data, minlength=n))[rows]
+        self.indptr = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+        self.indices = rows.astype(np.int32)
+        self.data = data.astype(np.float32)
+        self._build_matrix()
+
+    # 各数组的类型，state/from_state 按此写入和恢复
+    ARRAYS = {'vocab': 'uint64', 'idf': 'float64', 'indptr': 'int64', 'indices': 'int32', 'data': 'float32'}
+
+    def _build_matrix(self):
+        try:
+            from scipy.sparse import csc_matrix
+            self.matrix = csc_matrix((self.data, self.indices, self.indptr), shape=(self.size, len(self.vocab)))
+        except ImportError:
+            self.matrix = None
+
+    def state(self):
+        """可 marshal 的索引数据（数组存为字节串），见 from_state"""
+        return {'size': self.size, 'unseen_idf': float(self.unseen_idf),
+                **{name: getattr(self, name).tobytes() for name in self.ARRAYS}}
+
+    @classmethod
+    def from_state(cls, state):
+        """由 state 的结果恢复索引，不重新统计词频；需要 NumPy"""
+        import numpy as np
+        index = cls.__new__(cls)
+        index.size, index.unseen_idf = state['size'], state['unseen_idf']
+        for name, dtype in cls.ARRAYS.items():
+            setattr(index, name, np.frombuffer(state[name], dtype=dtype))
+        index._build_matrix()
+        return index
+
+    @staticmethod
+    def _bigram_keys(first, second):
+        # 码点不超过 21 位，一元组 key 即码点，二元组 key 不小于 2**21，两者不会冲突
+        return ((first + 1) << 21) | second
+
+    def nbytes(self):
+        return self.vocab.nbytes + self.idf.nbytes + self.indptr.nbytes + self.indices.nbytes + self.data.nbytes
+
+    def query(self, kw, k=10, min_score=0.0):
+        """返回 [(相似度, 文档下标)]，按相似度从高到低，最多 k 条且相似度大于 min_score"""
+        import numpy as np
+        if not kw or not self.size or k <= 0:
+            return []
+        grams = Counter(map(ord, kw))
+        grams.update(((ord(a) + 1) << 21) | ord(b) for a, b in zip(kw, kw[1:]))
+        keys = np.fromiter(grams.keys(), dtype=np.uint64, count=len(grams))
+        counts = np.fromiter(grams.values(), dtype=np.float64, count=len(grams))
+
+        pos = np.minimum(np.searchsorted(self.vocab, keys), len(self.vocab) - 1)
+        found = self.vocab[pos] == keys
+        idf = np.where(found, self.idf[pos], self.unseen_idf)
+        weights = (1.0 + np.log(counts)) * idf
+        weights /= np.sqrt((weights * weights).sum())
+        cols, weights = pos[found], weights[found]
+        if not len(cols):
+            return []
+
+        if self.matrix is not None:
+            scores = self.matrix[:, cols] @ weights.astype(np.float32)
+        else:
+            starts, ends = self.indptr[cols], self.indptr[cols + 1]
+            rows = np.concatenate([self.indices[s:e] for s, e in zip(starts, ends)])
+            vals = np.concatenate([self.data[s:e] * w for s, e, w in zip(starts, ends, weights)])
+            scores = np.bincount(rows, weights=vals, minlength=self.size)
+        k = min(k, self.size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(float(scores[i]), int(i)) for i in top if scores[i] > min_score]
+
+
+# ================= 重复题检测 =================
+_STRIP_CHARS = re.compile('[%s]+' % re.escape(string.punctuation + string.whitespace +
+                                              "，。、；：？！“”‘’（）《》〈〉【】［］｛｝…—–·「」『』〔〕～　"))
+
+
+def normalize_text(text):
+    """判重用的规范化：全角转半角（NFKC）、去掉空白和标点、转小写"""
+    return _STRIP_CHARS.sub('', unicodedata.normalize('NFKC', str(text))).lower()
+
+
+def merge_answers(answers):
+    """同一道题的多个答案，规范化后相同的只留第一个，用"；"连接"""
+    seen, merged = set(), []
+    for answer in answers:
+        key = normalize_text(answer)
+        if key not in seen:
+            seen.add(key)
+            merged.append(str(answer))
+    return '；'.join(merged) if len(merged) > 1 else answers[0]
+
+
+def find_near_duplicates(texts, threshold=0.8, num_perm=32, bands=8, seed=1):
+    """对已规范化的文本聚类，返回每条文本所属簇的代表下标（簇内最小下标）。
+    完全相同的文本直接合并；其余文本按字符 3-gram 计算 MinHash 签名，LSH 分桶找候选对，
+    签名估计的 Jaccard 相似度不低于 threshold 的合并。整体近似线性时间，需要 NumPy，没有时只合并完全相同的文本"""
+    rep = list(range(len(texts)))
+    first = {}
+    for i, text in enumerate(texts):
+        if text:
+            rep[i] = first.setdefault(text, i)
+    uniq = list(first.values())
+    try:
+        import numpy as np
+    except ImportError:
+        return rep
+    if len(uniq) < 2:
+        return rep
+
+    # 所有文本的 3-gram 一次性向量化生成；两端加哨兵字符，保证短文本也至少有一个 3-gram
+    docs = ['\x02' + texts[i] + '\x03' for i in uniq]
+    lengths = np.fromiter((len(d) for d in docs), dtype=np.int64, count=len(docs))
+    codes = np.frombuffer(''.join(docs).encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+    owner = np.repeat(np.arange(len(docs), dtype=np.int64), lengths)
+    valid = owner[2:] == owner[:-2]
+    shingles = ((codes[:-2] << np.uint64(42)) | (codes[1:-1] << np.uint64(21)) | codes[2:])[valid]
+    starts = np.searchsorted(owner[:-2][valid], np.arange(len(docs)))
+
+    # multiply-shift 哈希族，每个哈希函数取各文本 3-gram 哈希的最小值
+    rng = np.random.default_rng(seed)
+    mult = rng.integers(1, 2 ** 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    add = rng.integers(0, 2 ** 63, size=num_perm, dtype=np.uint64)
+    sig = np.empty((num_perm, len(docs)), dtype=np.uint32)
+    for k in range(num_perm):
+        hashed = ((shingles * mult[k] + add[k]) >> np.uint64(32)).astype(np.uint32)
+        sig[k] = np.minimum.reduceat(hashed, starts)
+
+    parent = list(range(len(docs)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    # 每个 band 的签名合成一个桶 key，排序后同桶的相邻文本作为候选对，批量校验签名一致的比例
+    rows = num_perm // bands
+    pairs = []
+    for b in range(bands):
+        key = sig[b * rows].astype(np.uint64)
+        for r in range(b * rows + 1, (b + 1) * rows):
+            key = key * np.uint64(1000003) + sig[r]
+        order = np.argsort(key, kind='stable')
+        same = np.flatnonzero(key[order][1:] == key[order][:-1])
+        pairs.append(np.stack([order[same], order[same + 1]], axis=1))
+    pairs = np.unique(np.concatenate(pairs), axis=0)
+    pairs = pairs[(sig[:, pairs[:, 0]] == sig[:, pairs[:, 1]]).mean(axis=0) >= threshold]
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    # uniq 按下标递增，簇根取最小的 uniq 序号即对应最小的原始下标
+    for i, u in enumerate(uniq):
+        root = uniq[find(i)]
+        if root != u:
+            rep[u] = root
+    return [rep[r] for r in rep]
+
+
+# ================= 题库加载 =================
+TYPED_BANK_COLUMNS = {
+    'choice': ['stem', 'A', 'B', 'C', 'D', 'answer', 'type'],
+    'fill': ['stem', 'answer'],
+    'judge': ['stem', 'answer']
+}
+
+
+def load_bank(csv_path, parse):
+    """优先读取编译缓存，缓存缺失或 CSV 有变化时才解析 CSV 并重写缓存"""
+    cache = BankCache(csv_path)
+    data = cache.load()
+    if data is None:
+        sig, sha1 = cache.signature(), cache.digest()
+        data = parse(csv_path)
+        cache.save(data, sig, sha1)
+    return data
+
+
+def parse_main_csv(path):
+    import pandas as pd
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    return {_native(q): _native(a) for q, a in zip(df['题目'], df['题目的文字答案'])}
+
+
+def parse_typed_csv(path, cols):
+    import pandas as pd
+    df = pd.read_csv(path, encoding='utf-8-sig', header=None, names=cols)
+    return QuestionBank.build_columns({col: df[col].tolist() for col in cols})
+
+
+class QuestionLibrary:
+    """一套题库：主题库（题干 -> 答案）及其检索索引，加上选择、填空、判断三个分类题库"""
+
+    def __init__(self, quiz_dict, categorized, search_index, questions=None):
+        self.quiz_dict = quiz_dict
+        self.questions = list(quiz_dict) if questions is None else questions
+        self.search_index = search_index
+        self.categorized = categorized
+        self.similarity = None  # TfidfIndex，文档依次为主题库和各分类题库的题干
+        self.similarity_spans = []  # [(起始文档下标, 题库)]
+        self.clusters = {}  # 题库 -> 每条记录所属的重复簇编号，去重后才有
+        self.cluster_counts = {}  # 题库 -> 不同的簇数
+        self.next_cluster = 0  # 热更新新增的题目从这里分配簇编号
+        self.dedup_report = None
+        self.dedup_plan = {}  # 题库 -> (保留的原始下标, 主题库保留下标 -> 合并后的答案)，加载时去重改动过的题库才有
+        self.sources = {}  # 题库 -> 去重前从 CSV 读到的原始数据，只有去重改动过的题库才有
+        self.merged_into = {}  # 主题库中被合并掉的题干 -> 保留的题干
+        self.answer_keys = {}  # 分类题库 -> 每道题的判分键（answer_key），加载时算好
+        self._main_keys = {}  # 主题库题干 -> 判分键，第一次判分时才算
+        self._positions = {}  # 题库 -> {题干: 下标}，批量判分按题干查题时才建
+        self._generator = None  # 第一次组卷时建立的 ExamGenerator
+        self.stem_keys = None  # 题库 -> {规范化题干: 主题库题干或分类题库下标}，见 build_stem_keys
+
+    def build_similarity(self):
+        """为主题库和三个分类题库的全部题干建立 TF-IDF 索引；没有 NumPy 时不建，模糊检索退回 difflib"""
+        docs, spans = [], []
+        for bank, stems in [('main', self.questions)] + [(k, b.stems) for k, b in self.categorized.items()]:
+            spans.append((len(docs), bank))
+            docs.extend(str(stem) for stem in stems)
+        try:
+            self.similarity, self.similarity_spans = TfidfIndex(docs), spans
+        except ImportError:
+            pass
+
+    def deduplicate(self, threshold=0.8):
+        """主题库和分类题库的全部题干一起判重，规范化（normalize_text）后完全相同的才算同一道题。
+        同一题库内的重复题只保留簇内第一条：主题库合并各条不同的答案；分类题库只合并答案和选项都相同的，
+        答案不一致的都保留，作为冲突写入报告。跨题库的重复不删除，只共享簇编号，检索结果和抽题据此去重。
+        规范化后不同、但近似重复检测（见 find_near_duplicates）相似度不低于 threshold 的题不合并，
+        只作为候选写入报告——"正确"与"不正确"、只有数值不同的题干相似度同样很高。
+        返回报告 {'summary': {...}, 'clusters': [...], 'candidates': [...]}，只列出有多条成员的簇"""
+        banks = [('main', self.questions, None)] + [(k, b.stems, b) for k, b in self.categorized.items()]
+        texts, offsets, where = [], {}, []
+        for key, stems, bank in banks:
+            offsets[key] = len(texts)
+            texts.extend(normalize_text(stem) for stem in stems)
+            where.extend((key, stem, self.quiz_dict.get(stem, '') if bank is None else bank.answer(pos))
+                         for pos, stem in enumerate(stems))
+        first = {}
+        cluster_of = [first.setdefault(text, i) if text else i for i, text in enumerate(texts)]
+        sizes = Counter(cluster_of)
+        candidates = []
+        near = {}
+        for i, rep in enumerate(find_near_duplicates(texts, threshold)):
+            if cluster_of[i] == i:
+                near.setdefault(rep, []).append(i)
+        for group in near.values():
+            if len(group) > 1:
+                candidates.append([{'bank': where[i][0], 'stem': where[i][1], 'answer': where[i][2]} for i in group])
+
+        members = {}  # 簇编号 -> [成员]，只记录有多条成员的簇
+        for key, stems, bank in banks:
+            keep, canonical = [], {}  # canonical: 簇 -> [(规范化答案和选项, 保留下标)]
+            answers = {}  # 主题库：保留下标 -> 已合并的答案
+            for pos, stem in enumerate(stems):
+                cid = cluster_of[offsets[key] + pos]
+                answer = self.quiz_dict.get(stem, '') if bank is None else bank.answer(pos)
+                if sizes[cid] == 1:
+                    keep.append(pos)
+                    continue
+                member = {'bank': key, 'stem': stem, 'answer': answer, 'action': 'kept'}
+                members.setdefault(cid, []).append(member)
+                if bank is None:
+                    sig = None
+                else:
+                    sig = (normalize_text(answer), tuple(normalize_text(t) for _, t in bank.options(pos)))
+                kept = canonical.setdefault(cid, [])
+                target = next((i for s, i in kept if s == sig), None)
+                if target is None:
+                    kept.append((sig, pos))
+                    keep.append(pos)
+                    answers[pos] = [answer]
+                    continue
+                member['action'] = 'merged'
+                if bank is None:
+                    answers[target].append(answer)
+                    self.merged_into[stem] = stems[target]
+            self.clusters[key] = [cluster_of[offsets[key] + pos] for pos in keep]
+            self.cluster_counts[key] = len(set(self.clusters[key]))
+            if len(keep) < len(stems):
+                merged_answers = {pos: merge_answers(a) for pos, a in answers.items() if len(a) > 1}
+                self._apply_dedup(key, keep, merged_answers if bank is None else {})
+
+        clusters, merged, conflicts = [], 0, 0
+        for group in members.values():
+            if len(group) < 2:
+                continue
+            kept = {}
+            for member in group:
+                kept.setdefault(member['bank'], []).append(member)
+            conflict = any(len([m for m in ms if m['action'] == 'kept']) > 1 for bank, ms in kept.items())
+            merged += sum(m['action'] == 'merged' for m in group)
+            conflicts += conflict
+            clusters.append({'canonical': group[0]['stem'], 'conflict': conflict, 'members': group})
+        self.next_cluster = len(texts)
+        self.dedup_report = {'summary': {'questions': len(texts), 'clusters': len(clusters),
+                                         'merged': merged, 'conflicts': conflicts, 'candidates': len(candidates),
+                                         'threshold': threshold},
+                             'clusters': clusters, 'candidates': candidates}
+        return self.dedup_report
+
+    def _apply_dedup(self, key, keep, answers):
+        """题库 key 只保留原始下标在 keep 中的记录，answers 为主题库保留下标 -> 合并后的答案"""
+        self.dedup_plan[key] = (keep, answers)
+        if key == 'main':
+            stems = self.questions
+            self.sources[key] = self.quiz_dict
+            self.questions = [stems[pos] for pos in keep]
+            self.quiz_dict = {stems[pos]: answers[pos] if pos in answers else self.quiz_dict[stems[pos]]
+                              for pos in keep}
+            if self.search_index is not None:
+                self.search_index = NgramIndex(self.questions)
+        else:
+            bank = self.sources[key] = self.categorized[key]
+            self.categorized[key] = QuestionBank({name: [col[pos] for pos in keep] for name, col in bank.columns.items()})
+
+    def index_state(self):
+        """加载时算出的数据（去重结果和各索引），可 marshal，写入 LibraryCache；见 restore_index_state"""
+        counts = {'main': len(self.sources.get('main', self.quiz_dict))}
+        counts.update((key, len(self.sources.get(key, bank))) for key, bank in self.categorized.items())
+        dedup = None
+        if self.dedup_report is not None:
+            dedup = {'plan': self.dedup_plan, 'clusters': self.clusters, 'cluster_counts': self.cluster_counts,
+                     'next_cluster': self.next_cluster, 'report': self.dedup_report, 'merged_into': self.merged_into}
+        return {'counts': counts, 'dedup': dedup, 'search': self.search_index.pack(),
+                'similarity': None if self.similarity is None else self.similarity.state(),
+                'similarity_spans': self.similarity_spans, 'stem_keys': self.stem_keys,
+                'answer_keys': self.answer_keys}
+
+    def restore_index_state(self, state):
+        """在刚读入 CSV、尚未去重和建索引的题库上恢复 index_state 的结果。
+        各题库的记录数与写入时不一致（读缓存和读 CSV 之间文件被改写）时不做任何修改，返回 False"""
+        counts = {'main': len(self.quiz_dict)}
+        counts.update((key, len(bank)) for key, bank in self.categorized.items())
+        if state['counts'] != counts:
+            return False
+        dedup = state['dedup']
+        if dedup is not None:
+            for key, (keep, answers) in dedup['plan'].items():
+                self._apply_dedup(key, keep, answers)
+            self.clusters, self.cluster_counts = dedup['clusters'], dedup['cluster_counts']
+            self.next_cluster, self.dedup_report = dedup['next_cluster'], dedup['report']
+            self.merged_into = dedup['merged_into']
+        self.search_index = NgramIndex.unpack(self.questions, *state['search'])
+        self.stem_keys, self.answer_keys = state['stem_keys'], state['answer_keys']
+        if state['similarity'] is None:
+            self.build_similarity()  # 写缓存时没有 NumPy，现在可能有了
+        else:
+            try:
+                self.similarity = TfidfIndex.from_state(state['similarity'])
+                self.similarity_spans = [tuple(span) for span in state['similarity_spans']]
+            except ImportError:
+                pass
+        return True
+
+    def reload_bank(self, key, csv_path):
+        """重新读取一个题库的 CSV，与上次读到的内容比较，把增删改应用到一个新的 QuestionLibrary 上返回，
+        同时返回变更统计 {'bank', 'inserted', 'updated', 'deleted'}。当前对象不被修改，
+        正在进行的考试和打开的界面继续使用旧数据；未变化的题库与当前对象共用，主题库的检索索引增量更新，
+        相似度索引重建。去重时合并掉的题仍然不出现，新增的题不再与已有的题比较去重"""
+        library = QuestionLibrary(self.quiz_dict, dict(self.categorized), self.search_index, self.questions)
+        library.clusters, library.cluster_counts = dict(self.clusters), dict(self.cluster_counts)
+        library.next_cluster, library.dedup_report = self.next_cluster, self.dedup_report
+        library.sources, library.merged_into = dict(self.sources), self.merged_into
+        library.answer_keys = dict(self.answer_keys)
+        library.stem_keys = None if self.stem_keys is None else dict(self.stem_keys)
+        if key == 'main':
+            library._positions = self._positions
+        else:
+            library._main_keys, library._positions = self._main_keys, {k: v for k, v in self._positions.items() if k != key}
+        if key == 'main':
+            changes = library._reload_main(load_bank(csv_path, parse_main_csv))
+        else:
+            changes = library._reload_typed(key, self._load_typed(csv_path, TYPED_BANK_COLUMNS[key]))
+        changes['bank'] = key
+        if not (changes['inserted'] or changes['updated'] or changes['deleted']):
+            return self, changes
+        if key in self.answer_keys:
+            library.prepare_grading([key])
+        if library.stem_keys is not None and key != 'main':
+            library.build_stem_keys([key])
+        if self.similarity is not None:
+            library.build_similarity()
+        return library, changes
+
+    def _new_clusters(self, count):
+        start = self.next_cluster
+        self.next_cluster += count
+        return range(start, start + count)
+
+    def _reload_main(self, new):
+        old = self.sources.get('main', self.quiz_dict)
+        deleted = [stem for stem in old if stem not in new]
+        inserted = [stem for stem in new if stem not in old]
+        updated = [stem for stem in new if stem in old and old[stem] != new[stem]]
+        changes = {'inserted': len(inserted), 'updated': len(updated), 'deleted': len(deleted)}
+        if not (inserted or updated or deleted):
+            return changes
+
+        # 去重合并掉的题不在当前题库中，删改时跳过
+        quiz_dict = dict(self.quiz_dict) if 'main' in self.sources else new
+        removed = [stem for stem in deleted if stem in self.quiz_dict]
+        if 'main' in self.sources:
+            self.sources['main'] = new
+            for stem in removed:
+                del quiz_dict[stem]
+            for stem in inserted:
+                quiz_dict[stem] = new[stem]
+            # 保留题或被合并题的答案有变化时，按 CSV 现有内容重新合并答案
+            affected = {self.merged_into.get(stem, stem) for stem in updated + deleted}
+            self.merged_into = {stem: target for stem, target in self.merged_into.items() if stem in new}
+            groups = {}
+            for stem, target in self.merged_into.items():
+                if target in affected:
+                    groups.setdefault(target, []).append(new[stem])
+            for stem in affected:
+                if stem in quiz_dict:
+                    quiz_dict[stem] = merge_answers([new[stem]] + groups.get(stem, []))
+        self.quiz_dict = quiz_dict
+        if not (removed or inserted):
+            return changes
+        if self.stem_keys is not None:
+            self.stem_keys['main'] = keys = dict(self.stem_keys['main'])
+            for stem in removed:
+                norm = normalize_text(stem)
+                if keys.get(norm) == stem:
+                    del keys[norm]
+            for stem in inserted:
+                keys.setdefault(normalize_text(stem), stem)
+        positions = {stem: i for i, stem in enumerate(self.questions)}
+        self.search_index = self.search_index.with_changes([positions[stem] for stem in removed], inserted)
+        if 'main' in self.clusters:
+            known = dict(zip(self.questions, self.clusters['main']))
+            fresh = iter(self._new_clusters(len(inserted)))
+            self.clusters['main'] = [known[stem] if stem in known else next(fresh) for stem in self.search_index.docs]
+            self.cluster_counts['main'] = len(set(self.clusters['main']))
+        self.questions = list(self.search_index.docs)
+        return changes
+
+    def _reload_typed(self, key, new):
+        def rows(bank):
+            return [(bank.stem(i), bank.answer(i), tuple(bank.options(i)), bank.qtype(i)) for i in range(len(bank))]
+
+        old_bank = self.sources.get(key, self.categorized[key])
+        old_rows, new_rows = rows(old_bank), rows(new)
+        if old_rows == new_rows:
+            return {'inserted': 0, 'updated': 0, 'deleted': 0}
+        added, gone = Counter(new_rows) - Counter(old_rows), Counter(old_rows) - Counter(new_rows)
+        # 题干不变、答案或选项变化的记为修改
+        updated = len({row[0] for row in added} & {row[0] for row in gone})
+        changes = {'inserted': sum(added.values()) - updated, 'updated': updated, 'deleted': sum(gone.values()) - updated}
+
+        # 分类题库本来就是按列整体读入的，新题库即为新读入的数据，去掉去重时合并掉的记录
+        if key not in self.sources and key not in self.clusters:
+            self.categorized[key] = new
+            return changes
+        live = self.categorized[key]
+        live_rows = rows(live)
+        merged = Counter(old_rows) - Counter(live_rows)
+        known = dict(zip(live_rows, self.clusters.get(key, ())))
+        keep, clusters = [], []
+        for pos, row in enumerate(new_rows):
+            if merged[row]:
+                merged[row] -= 1
+                continue
+            keep.append(pos)
+            clusters.append(known.get(row))
+        fresh = iter(self._new_clusters(clusters.count(None)))
+        if key in self.sources:
+            self.sources[key] = new
+            new = QuestionBank({name: [col[pos] for pos in keep] for name, col in new.columns.items()})
+        self.categorized[key] = new
+        if key in self.clusters:
+            self.clusters[key] = [next(fresh) if cid is None else cid for cid in clusters]
+            self.cluster_counts[key] = len(set(self.clusters[key]))
+        return changes
+
+    def prepare_grading(self, banks=None):
+        """为分类题库预先算好每道题的判分键，之后判分不再处理参考答案"""
+        for key in banks or self.categorized:
+            bank = self.categorized[key]
+            self.answer_keys[key] = [answer_key(key, answer) for answer in bank.answers]
+
+    def grade(self, bank, pos, user_answer, stem=None):
+        """判一道题是否答对（规则见 grade_key）；主题库可以只给题干"""
+        if bank == 'main':
+            stem = self.questions[pos] if stem is None else stem
+            key = self._main_keys.get(stem)
+            if key is None:
+                key = self._main_keys[stem] = answer_key('main', self.quiz_dict.get(stem, ''))
+            return grade_key('main', user_answer, key)
+        keys = self.answer_keys.get(bank)
+        key = keys[pos] if keys is not None else answer_key(bank, self.categorized[bank].answer(pos))
+        return grade_key(bank, user_answer, key)
+
+    def position(self, bank, stem):
+        """按题干查题在题库中的下标，主题库返回题干本身（去重时被合并掉的题干返回保留的题干）；找不到时返回 None"""
+        if bank == 'main':
+            stem = self.merged_into.get(stem, stem)
+            return stem if stem in self.quiz_dict else None
+        positions = self._positions.get(bank)
+        if positions is None:
+            records = self.categorized[bank]
+            positions = self._positions[bank] = {}
+            for i in range(len(records)):
+                positions.setdefault(records.stem(i), i)
+        return positions.get(stem)
+
+    def grade_batch(self, submissions):
+        """批量判分：submissions 为 (题库, 下标或题干, 作答) 的序列，例如一整张答卷；
+        返回与之对应的结果列表，找不到题目的为 None"""
+        results = []
+        for bank, question, user_answer in submissions:
+            if bank == 'main':
+                stem = self.position('main', question) if isinstance(question, str) else self.questions[question]
+                results.append(None if stem is None else self.grade('main', None, user_answer, stem=stem))
+                continue
+            pos = self.position(bank, question) if isinstance(question, str) else question
+            results.append(None if pos is None else self.grade(bank, pos, user_answer))
+        return results
+
+    def build_stem_keys(self, banks=None):
+        """为按题干查题（lookup）建哈希表：每个题库一张，键为 normalize_text 后的题干，
+        值为主题库题干或分类题库下标；规范化后相同的题干保留第一条"""
+        if self.stem_keys is None:
+            self.stem_keys = {}
+        for bank in banks or ['main', *self.categorized]:
+            stems = self.questions if bank == 'main' else self.categorized[bank].stems
+            keys = {}
+            for pos, stem in enumerate(stems):
+                keys.setdefault(normalize_text(stem), stem if bank == 'main' else pos)
+            self.stem_keys[bank] = keys
+
+    def lookup(self, text, min_score=0.5):
+        """按一段题干文字查题（主题库优先，其次各分类题库），返回 (entry, 方式)，找不到时返回 (None, None)。
+        方式为 exact（规范化后与题干相同）、partial（是某道题干的一部分）或 similar（TF-IDF 相似度不低于 min_score）"""
+        norm = normalize_text(text)
+        if not norm:
+            return None, None
+        if self.stem_keys is not None:
+            for bank, keys in self.stem_keys.items():
+                hit = keys.get(norm)
+                if hit is not None:
+                    return (self.entry('main', stem=hit) if bank == 'main' else self.entry(bank, hit)), 'exact'
+        elif text in self.quiz_dict:
+            return self.entry('main', stem=text), 'exact'
+        # 选中的只是题干的一部分：先在主题库检索索引中找包含它的题干，取最短的一条（选中部分占比最大）
+        stems = self.search_index.search(text)
+        if stems:
+            return self.entry('main', stem=min(stems, key=len)), 'partial'
+        # 再用相似度索引（覆盖分类题库）取候选，规范化后包含选中文字的优先
+        hits = self.similar(text, k=10)
+        for hit in hits:
+            if norm in normalize_text(hit['stem']):
+                return hit, 'partial'
+        if hits and hits[0]['score'] >= min_score:
+            return hits[0], 'similar'
+        return None, None
+
+    def memory_estimate(self):
+        """粗略估算题库常驻内存的字节数：抽样题目估计文字大小，加上检索和相似度索引；SQLite 模式返回 0"""
+        if not isinstance(self.search_index, NgramIndex):
+            return 0
+
+        def column_bytes(values):
+            if not len(values):
+                return 0
+            step = max(1, len(values) // 256)
+            sample = values[::step]
+            return sum(sys.getsizeof(v) for v in sample) * len(values) // len(sample) + 8 * len(values)
+
+        size = column_bytes(self.questions) * 2 + column_bytes(list(self.quiz_dict.values())) + 100 * len(self.quiz_dict)
+        for bank in self.categorized.values():
+            size += sum(column_bytes(col) for col in getattr(bank, 'columns', {}).values())
+        index = self.search_index
+        size += index.posting_count() * 8 + len(index.bigrams) * 200
+        if index.unigrams is not None:
+            size += sum(map(len, index.unigrams.values())) * 8 + len(index.order) * 8
+        if self.similarity is not None:
+            size += self.similarity.nbytes()
+        if self.stem_keys is not None:
+            size += sum(map(len, self.stem_keys.values())) * 100
+        return size
+
+    def close(self):
+        """释放题库占用的外部资源：SQLite 模式关闭数据库连接，内存模式无事可做"""
+        if isinstance(self.search_index, StoreSearchIndex):
+            self.search_index.store.close()
+
+    @classmethod
+    def empty(cls):
+        return cls({}, {key: QuestionBank({}) for key in TYPED_BANK_COLUMNS}, NgramIndex([]), [])
+
+    @classmethod
+    def load(cls, csv_paths, backend='memory', db_path=None, progress=None, dedup=True):
+        """csv_paths 为 main/choice/fill/judge -> CSV 路径；backend 为 'sqlite' 时使用 db_path 数据库。
+        progress(已完成步数, 总步数, 说明) 可选，在调用 load 的线程中回调；
+        dedup 为 True 时内存模式在建相似度索引前去掉重复题（SQLite 模式不去重）。
+        内存模式把去重结果和各索引写入 LibraryCache，CSV 没有变化时下次启动直接读入"""
+        report = progress or (lambda done, total, text: None)
+        if backend == 'sqlite':
+            try:
+                report(0, 1, "正在打开题库数据库…")
+                library = cls._load_sqlite(csv_paths, db_path)
+                report(1, 1, "题库数据库已打开")
+                return library
+            except sqlite3.Error:
+                pass  # 例如 SQLite 不支持 FTS5 trigram，退回内存模式
+
+        total = 4 + len(TYPED_BANK_COLUMNS)
+        index_cache = LibraryCache(csv_paths, dedup)
+        state, sig = index_cache.load(), None
+        if state is None:
+            try:
+                sig = index_cache.signature()
+            except OSError:
+                pass  # 有 CSV 不存在，不写索引缓存
+        # 主题库
+        report(0, total, "正在加载主题库…")
+        try:
+            quiz_dict = load_bank(csv_paths['main'], parse_main_csv)
+        except:
+            quiz_dict = {}
+
+        # 分类题库
+        categorized = {}
+        for step, (key, cols) in enumerate(TYPED_BANK_COLUMNS.items(), 1):
+            report(step, total, "正在加载分类题库…")
+            categorized[key] = cls._load_typed(csv_paths[key], cols)
+        # 先去重再建索引，索引只需建一次
+        library = cls(quiz_dict, categorized, None)
+        if state is not None and library.restore_index_state(state):
+            report(total, total, "加载完成")
+            return library
+        if dedup:
+            report(total - 3, total, "正在检测重复题…")
+            library.deduplicate()
+        report(total - 2, total, "正在建立检索索引…")
+        library.search_index = NgramIndex(library.questions)
+        library.prepare_grading()
+        library.build_stem_keys()
+        report(total - 1, total, "正在建立相似度索引…")
+        library.build_similarity()
+        if sig is not None:
+            index_cache.save(library.index_state(), sig)
+        report(total, total, "加载完成")
+        return library
+
+    @staticmethod
+    def _load_typed(csv_path, cols):
+        try:
+            return QuestionBank(load_bank(csv_path, lambda path: parse_typed_csv(path, cols)))
+        except:
+            return QuestionBank({})
+
+    @classmethod
+    def _load_sqlite(cls, csv_paths, db_path):
+        """SQLite 模式：CSV 有变化时重新导入，之后题目、答案和检索都按需查询数据库"""
+        store = SqliteQuestionStore(db_path)
+        if not store.open(csv_paths):
+            banks = {}
+            try:
+                banks['main'] = load_bank(csv_paths['main'], parse_main_csv)
+            except:
+                banks['main'] = {}
+            for key, cols in TYPED_BANK_COLUMNS.items():
+                banks[key] = cls._load_typed(csv_paths[key], cols)
+            store.rebuild(csv_paths, banks)
+        return cls(StoreAnswers(store, 'main'), {key: StoreRecords(store, key) for key in TYPED_BANK_COLUMNS},
+                   StoreSearchIndex(store, 'main'), StoreStems(store, 'main'))
+
+    def search(self, kw, cancelled=None, limit=200, k=10, min_score=0.0):
+        """先做主题库题干子串匹配，没有结果时按相似度模糊检索（见 similar）。
+        返回 (命中总数, 前 limit 条 entry)；cancelled 返回 True 时提前放弃"""
+        stems = self.search_index.search(kw)
+        if stems or (cancelled and cancelled()):
+            return len(stems), [self.entry('main', stem=stem) for stem in stems[:limit]]
+        hits = self.similar(kw, k, min_score, cancelled)
+        return len(hits), hits
+
+    def similar(self, kw, k=10, min_score=0.0, cancelled=None):
+        """相似度最高的 k 道题，entry 中带 score。有 TF-IDF 索引时覆盖主题库和分类题库（余弦相似度），
+        否则只在主题库中按 difflib ratio 匹配"""
+        if self.similarity is not None:
+            starts = [start for start, _ in self.similarity_spans]
+            hits, seen = [], set()
+            # 跨题库的同一道题只显示相似度最高的一条，多取一些候选补足 k 条
+            for score, doc in self.similarity.query(kw, 2 * k if self.clusters else k, min_score):
+                start, bank = self.similarity_spans[bisect_right(starts, doc) - 1]
+                if self.clusters:
+                    cid = self.clusters[bank][doc - start]
+                    if cid in seen:
+                        continue
+                    seen.add(cid)
+                hits.append(self.entry(bank, doc - start, score=score))
+            return hits[:k]
+        from difflib import SequenceMatcher
+        stems = self.search_index.close_matches(kw, n=k, cutoff=max(min_score, 0.2), cancelled=cancelled)
+        return [self.entry('main', stem=stem, score=SequenceMatcher(None, stem, kw).ratio()) for stem in stems]
+
+    def entry(self, bank, pos=None, stem=None, score=None):
+        """一道题的展示信息 {'bank', 'stem', 'answer', 'options', 'score'}；主题库可以只给题干"""
+        if bank == 'main':
+            stem = self.questions[pos] if stem is None else stem
+            return {'bank': bank, 'stem': stem, 'answer': self.quiz_dict.get(stem, ''), 'options': [], 'score': score}
+        data = self.categorized[bank]
+        return {'bank': bank, 'stem': data.stem(pos), 'answer': data.answer(pos), 'options': data.options(pos),
+                'score': score}
+
+    def exam_generator(self):
+        """本题库的组卷器，第一次使用时建立各题型的下标数组"""
+        if self._generator is None:
+            self._generator = ExamGenerator(self)
+        return self._generator
+
+    def sample_exam(self, exam_type, n=15, rng=random):
+        """随机抽取 n 道分类题，返回题库内的下标；去重后同一重复簇最多抽一道"""
+        return self.exam_generator().draw(exam_type, n, rng)
+
+
+# ================= 组卷 =================
+class Bitset:
+    """定长位图，每道题占一位"""
+    __slots__ = ('bits',)
+
+    def __init__(self, size):
+        self.bits = bytearray((size + 7) >> 3)
+
+    def add(self, i):
+        self.bits[i >> 3] |= 1 << (i & 7)
+
+    def __contains__(self, i):
+        return bool(self.bits[i >> 3] >> (i & 7) & 1)
+
+
+class ExamHistory:
+    """最近 window 张试卷出过的题，组卷时尽量避开。按 (题库, 题干) 记录，题库重载或重启程序后仍然有效；
+    组卷时再换算成当前题库下标的位图"""
+
+    def __init__(self, papers=(), window=5):
+        self.window = window
+        self.papers = deque((tuple(tuple(q) for q in paper) for paper in papers), maxlen=max(0, window))
+        self._library, self._seen = None, {}
+
+    def to_list(self):
+        return [[list(q) for q in paper] for paper in self.papers]
+
+    def add(self, library, questions):
+        """记下一张试卷，questions 为 [(题库, 下标)]"""
+        if self.window <= 0:
+            return
+        self.papers.append(tuple((bank, library.categorized[bank].stem(pos)) for bank, pos in questions))
+        self._library = None
+
+    def seen(self, library):
+        """题库 -> 最近出过的题的下标位图"""
+        if library is not self._library:
+            seen = {}
+            for paper in self.papers:
+                for bank, stem in paper:
+                    if bank not in library.categorized:
+                        continue
+                    pos = library.position(bank, stem)
+                    if pos is not None:
+                        if bank not in seen:
+                            seen[bank] = Bitset(len(library.categorized[bank]))
+                        seen[bank].add(pos)
+            self._library, self._seen = library, seen
+        return self._seen
+
+
+class ExamGenerator:
+    """按题型和子题型（单选 / 多选，取自选择题的“题型”列）预先建好下标数组，按配额分层抽取试卷。
+    层的名称为 choice、choice.single、choice.multi、fill、judge"""
+
+    def __init__(self, library):
+        self.library = library
+        self.strata = {}
+        for key, bank in library.categorized.items():
+            self.strata[key] = range(len(bank))
+            if key == 'choice':
+                types = getattr(bank, 'types', None)
+                types = types if types is not None else [bank.qtype(i) for i in range(len(bank))]
+                multi = [i for i, t in enumerate(types) if t and '多选' in t]
+                marks = set(multi)
+                self.strata['choice.multi'] = multi
+                self.strata['choice.single'] = [i for i in range(len(bank)) if i not in marks]
+
+    def draw(self, stratum, n, rng=random, seen=None, used=None):
+        """从一层中抽 n 道题，返回下标。同一重复簇（以及 used 中已出过的簇）只抽一道，
+        先抽 seen 位图之外的题，不够时再用出过的题补足"""
+        if stratum not in self.strata:
+            raise ValueError(f"未知的题型：{stratum}")
+        pool = self.strata[stratum]
+        clusters = self.library.clusters.get(stratum.split('.')[0])
+        used = set() if used is None else used
+        picked = []
+
+        def accept(i, allow_seen):
+            c = clusters[i] if clusters else i
+            if c in used or (not allow_seen and seen is not None and i in seen):
+                return
+            used.add(c)
+            picked.append(i)
+
+        # 题库远大于题数时随机探测，不必打乱整层；命中太少（出过的题很多）时再退回逐个扫描
+        if len(pool) > 8 * n:
+            for _ in range(32 * n):
+                if len(picked) >= n:
+                    break
+                accept(pool[rng.randrange(len(pool))], False)
+        if len(picked) < n:
+            order = rng.sample(pool, len(pool))
+            for allow_seen in (False, True):
+                for i in order:
+                    if len(picked) >= n:
+                        break
+                    accept(i, allow_seen)
+        return picked
+
+    def generate(self, quota, seed=None, history=None):
+        """按配额 {层: 题数} 组卷，题目按配额给出的顺序排列。相同的 seed、题库和历史得到相同的试卷。
+        返回 {'seed': 种子, 'questions': [(题库, 下标)], 'short': {层: 缺少的题数}}"""
+        if seed is None:
+            seed = random.randrange(1 << 32)
+        rng = random.Random(seed)
+        seen = history.seen(self.library) if history is not None else {}
+        used, questions, short = {}, [], {}
+        for stratum, n in quota.items():
+            bank = stratum.split('.')[0]
+            picked = self.draw(stratum, n, rng, seen.get(bank), used.setdefault(bank, set()))
+            questions.extend((bank, i) for i in picked)
+            if len(picked) < n:
+                short[stratum] = n - len(picked)
+        return {'seed': seed, 'questions': questions, 'short': short}
+
+
+# ================= 错题本 =================
+class ReviewScheduler:
+    """错题的间隔复习（Leitner 盒子）：答错的题进入第 0 盒并立即到期，每答对一次进入下一盒，
+    间隔依次为 INTERVALS 天，最后一盒再答对即移出错题本。从未答错的题不记录。
+    到期时间放在小顶堆中，取下一道到期题为 O(log n)；题的状态变化后旧的堆条目在出堆时丢弃"""
+    INTERVALS = (0, 1, 2, 4, 7, 15, 30)
+
+    def __init__(self):
+        self.items = {}  # (题库, 题干) -> [盒子, 到期时间, 答错次数, 版本]
+        self.heap = []  # (到期时间, 序号, 键, 版本)
+        self._seq = 0
+
+    def __len__(self):
+        return len(self.items)
+
+    def record(self, key, correct, t):
+        """记下一次作答，t 为作答时间（秒）"""
+        item = self.items.get(key)
+        if correct:
+            if item is None:
+                return
+            item[0] += 1
+            if item[0] >= len(self.INTERVALS):
+                del self.items[key]
+                return
+            item[1] = t + self.INTERVALS[item[0]] * 86400
+        elif item is None:
+            item = self.items[key] = [0, t, 1, 0]
+        else:
+            item[0], item[1], item[2] = 0, t, item[2] + 1
+        self.restore(key, item)
+
+    def restore(self, key, item):
+        """放入一道题的状态（重放快照时也用它）"""
+        item[3] += 1
+        self.items[key] = item
+        self._seq += 1
+        heapq.heappush(self.heap, (item[1], self._seq, key, item[3]))
+        if len(self.heap) > 2 * len(self.items) + 64:
+            self.heap = [(v[1], i, k, v[3]) for i, (k, v) in enumerate(self.items.items())]
+            heapq.heapify(self.heap)
+
+    def _valid(self, entry):
+        item = self.items.get(entry[2])
+        return item is not None and item[3] == entry[3]
+
+    def next_due(self, now=None):
+        """下一道到期的题 (题库, 题干)，没有到期的题时返回 None"""
+        now = time.time() if now is None else now
+        heap = self.heap
+        while heap and not self._valid(heap[0]):
+            heapq.heappop(heap)
+        return heap[0][2] if heap and heap[0][0] <= now else None
+
+    def due(self, now=None, n=15):
+        """最早到期的至多 n 道题，按到期时间排序；不改变状态"""
+        now = time.time() if now is None else now
+        picked = []
+        while self.heap and len(picked) < n:
+            entry = heapq.heappop(self.heap)
+            if self._valid(entry):
+                if entry[0] > now:
+                    heapq.heappush(self.heap, entry)
+                    break
+                picked.append(entry)
+        for entry in picked:
+            heapq.heappush(self.heap, entry)
+        return [entry[2] for entry in picked]
+
+    def due_count(self, now=None):
+        now = time.time() if now is None else now
+        return sum(1 for item in self.items.values() if item[1] <= now)
+
+
+class AnswerJournal:
+    """答题记录：每次作答向 JSONL 文件追加一行并立即 flush，不重写整个文件。
+    程序崩溃时最多留下半行，打开时截掉；打开时重放出 ReviewScheduler，
+    记录行数超过错题数的 compact_ratio 倍时压缩成每道错题一行的快照（先写临时文件再替换）"""
+
+    def __init__(self, path, compact_ratio=4, min_compact=1000):
+        self.path = path
+        self.compact_ratio = compact_ratio
+        self.min_compact = min_compact
+        self.scheduler = ReviewScheduler()
+        self.lines = 0  # 文件中的记录行数
+        self.lock = threading.Lock()
+        self._file = None
+
+    def open(self):
+        """重放已有记录并打开文件准备追加；文件不可读写时只在内存中记录"""
+        with self.lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    data = f.read()
+            except OSError:
+                data = b''
+            if data and not data.endswith(b'\n'):
+                data = data[:data.rfind(b'\n') + 1]
+                try:
+                    with open(self.path, 'r+b') as f:
+                        f.truncate(len(data))
+                except OSError:
+                    pass
+            for line in data.splitlines():
+                try:
+                    self._apply(json.loads(line))
+                    self.lines += 1
+                except (ValueError, KeyError, TypeError):
+                    continue
+            if self.lines > max(self.min_compact, self.compact_ratio * len(self.scheduler)):
+                self._compact()
+            try:
+                self._file = open(self.path, 'a', encoding='utf-8')
+            except OSError:
+                self._file = None
+        return self
+
+    def _apply(self, rec):
+        key = (rec['b'], rec['q'])
+        if 's' in rec:
+            box, due, wrong = rec['s']
+            self.scheduler.restore(key, [box, due, wrong, 0])
+        else:
+            self.scheduler.record(key, bool(rec['ok']), rec['t'])
+
+    def _compact(self):
+        tmp = self.path + '.tmp'
+        try:
+            with open(tmp, 'w', encoding='utf-8') as f:
+                for (bank, stem), (box, due, wrong, _) in self.scheduler.items.items():
+                    f.write(json.dumps({'b': bank, 'q': stem, 's': [box, due, wrong]}, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.lines = len(self.scheduler)
+        except OSError:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+
+    def record(self, bank, stem, correct, t=None):
+        """记下一次作答并更新复习计划"""
+        t = round(time.time() if t is None else t, 3)  # 与写入文件的精度一致，重启后重放得到相同的到期时间
+        line = json.dumps({'t': t, 'b': bank, 'q': stem, 'ok': int(bool(correct))}, ensure_ascii=False)
+        with self.lock:
+            self.scheduler.record((bank, stem), correct, t)
+            if self._file is not None:
+                try:
+                    self._file.write(line + '\n')
+                    self._file.flush()
+                    self.lines += 1
+                except OSError:
+                    pass
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+# ================= 题库热更新 =================
+class BankWatcher:
+    """在后台线程中轮询题库 CSV 的修改时间和大小，文件变化后在该线程中回调 on_change(题库, 路径)。
+    文件可能还在写入，连续两次轮询看到相同的新状态才回调"""
+
+    def __init__(self, paths, on_change, interval=2.0):
+        self.paths = dict(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self._state = {key: self._stat(path) for key, path in self.paths.items()}
+        self._pending = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    @staticmethod
+    def _stat(path):
+        try:
+            st = os.stat(path)
+            return st.st_mtime_ns, st.st_size
+        except OSError:
+            return None
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def poll(self):
+        """检查一遍所有文件，返回本次回调过的题库"""
+        changed = []
+        for key, path in self.paths.items():
+            state = self._stat(path)
+            if state == self._state[key]:
+                self._pending.pop(key, None)
+                continue
+            if self._pending.get(key) != state:
+                self._pending[key] = state
+                continue
+            self._state[key] = state
+            del self._pending[key]
+            changed.append(key)
+            try:
+                self.on_change(key, path)
+            except:
+                pass
+        return changed
+
+
+# ================= 多课程 =================
+BANK_FILES = {'main': '题库.csv', 'choice': '题库_选择题.csv', 'fill': '题库_填空题.csv', 'judge': '题库_判断题.csv'}
+
+
+class Course:
+    """一门课程的题库文件。课程目录下可以放 course.json 清单：
+    {"name": "课程名", "files": {"main": "题库.csv", ...}, "db": "题库.db"}，files 中的相对路径相对课程目录，
+    缺省时使用 BANK_FILES 中的文件名"""
+    MANIFEST = 'course.json'
+
+    def __init__(self, course_id, name, csv_paths, db_path):
+        self.id = course_id
+        self.name = name
+        self.csv_paths = csv_paths
+        self.db_path = db_path
+
+    @classmethod
+    def from_folder(cls, folder):
+        """目录中既没有清单也没有任何题库 CSV 时返回 None"""
+        manifest_path = os.path.join(folder, cls.MANIFEST)
+        manifest = None
+        if os.path.isfile(manifest_path):
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    manifest = json.load(f)
+            except:
+                manifest = None
+        files = (manifest or {}).get('files', {})
+        csv_paths = {key: os.path.join(folder, files.get(key, name)) for key, name in BANK_FILES.items()}
+        if manifest is None and not any(os.path.isfile(path) for path in csv_paths.values()):
+            return None
+        course_id = os.path.basename(os.path.normpath(folder))
+        return cls(course_id, (manifest or {}).get('name', course_id), csv_paths,
+                   os.path.join(folder, (manifest or {}).get('db', '题库.db')))
+
+
+class CourseRegistry:
+    """课程注册表。发现课程时只读目录和清单，课程第一次被选中时才加载题库；
+    已加载课程的估算内存（QuestionLibrary.memory_estimate）超过 max_bytes 时，按最近最少使用淘汰并关闭（close），
+    刚使用的课程不淘汰。loader(course, progress) 负责加载一门课程并返回 QuestionLibrary"""
+
+    def __init__(self, courses, loader, max_bytes=512 << 20):
+        self.courses = courses  # 课程 id -> Course，保持发现顺序
+        self.loader = loader
+        self.max_bytes = max_bytes
+        self.evictions = 0
+        self._loaded = OrderedDict()  # 课程 id -> (QuestionLibrary, 估算字节数)，最近使用的在末尾
+        self._loading = {}  # 课程 id -> Lock，同一课程只加载一次
+        self._lock = threading.Lock()
+
+    @classmethod
+    def discover(cls, root, loader, default=None, max_bytes=512 << 20):
+        """root 下每个含题库 CSV 或 course.json 的子目录为一门课程；default 为单课程布局下的课程，排在最前"""
+        courses = {}
+        if default is not None:
+            courses[default.id] = default
+        try:
+            names = sorted(os.listdir(root))
+        except OSError:
+            names = []
+        for name in names:
+            folder = os.path.join(root, name)
+            course = Course.from_folder(folder) if os.path.isdir(folder) else None
+            if course is not None and course.id not in courses:
+                courses[course.id] = course
+        return cls(courses, loader, max_bytes)
+
+    def get(self, course_id, progress=None):
+        """返回课程的题库，未加载时在调用线程中加载"""
+        library = self.peek(course_id)
+        if library is not None:
+            return library
+        with self._lock:
+            gate = self._loading.setdefault(course_id, threading.Lock())
+        with gate:
+            library = self.peek(course_id)
+            if library is None:
+                library = self.loader(self.courses[course_id], progress)
+                self.update(course_id, library)
+        return library
+
+    def peek(self, course_id):
+        """已加载时返回题库并标记为最近使用，否则返回 None，不触发加载"""
+        with self._lock:
+            if course_id not in self._loaded:
+                return None
+            self._loaded.move_to_end(course_id)
+            return self._loaded[course_id][0]
+
+    def update(self, course_id, library):
+        """放入或替换（例如热更新后）一门课程的题库，然后按内存上限淘汰"""
+        size = library.memory_estimate()
+        evicted = []
+        with self._lock:
+            self._loaded[course_id] = (library, size)
+            self._loaded.move_to_end(course_id)
+            while len(self._loaded) > 1 and sum(s for _, s in self._loaded.values()) > self.max_bytes:
+                evicted.append(self._loaded.popitem(last=False)[1][0])
+                self.evictions += 1
+        for old in evicted:
+            old.close()
+
+    def loaded(self):
+        """[(课程 id, QuestionLibrary)]，最近使用的在前"""
+        with self._lock:
+            return [(course_id, library) for course_id, (library, _) in reversed(self._loaded.items())]
+
+    def search(self, kw, cancelled=None, limit=200, k=10, min_score=0.0):
+        """在所有已加载课程中检索，entry 中加 'course'。子串命中的排在前面，模糊结果按相似度合并取前 k 条。
+        返回 (命中总数, 前 limit 条 entry)"""
+        total, exact, fuzzy = 0, [], []
+        for course_id, library in self.loaded():
+            if cancelled and cancelled():
+                break
+            count, hits = library.search(kw, cancelled, limit=limit, k=k, min_score=min_score)
+            for hit in hits:
+                hit['course'] = course_id
+            if hits and hits[0]['score'] is not None:
+                fuzzy.extend(hits)
+            else:
+                total += count
+                exact.extend(hits)
+        if exact:
+            return total, exact[:limit]
+        fuzzy.sort(key=lambda hit: hit['score'], reverse=True)
+        return len(fuzzy[:k]), fuzzy[:k]
+
+    def stats(self):
+        with self._lock:
+            return {'installed': len(self.courses), 'loaded': len(self._loaded),
+                    'bytes': sum(s for _, s in self._loaded.values()), 'evictions': self.evictions}
+
+
+# ================= 判分 =================
+JUDGE_SYNONYMS = {'对': ('对', '正确', '是', '√', '✓', '✔', 't', 'true', 'y', 'yes'),
+                  '错': ('错', '错误', '否', '×', '✗', '✘', 'x', 'f', 'false', 'n', 'no')}
+_JUDGE_CANON = {alias: canon for canon, aliases in JUDGE_SYNONYMS.items() for alias in aliases}
+GRADE_BANK_NAMES = {'choice': 'choice', '选择题': 'choice', 'fill': 'fill', '填空题': 'fill',
+                    'judge': 'judge', '判断题': 'judge', 'main': 'main', '主题库': 'main', '题库': 'main'}
+
+
+_SPACES = re.compile(r'\s+')
+
+
+def fold_answer(text):
+    """文字答案的判分规范化：只做全角转半角、去掉空白、转小写；小数点、正负号和百分号都保留，
+    "3.5%" 与 "35" 不相同"""
+    return _SPACES.sub('', unicodedata.normalize('NFKC', str(text))).lower()
+
+
+def answer_key(exam_type, answer):
+    """把参考答案或作答规范化成判分键：选择题为排好序的选项字母，判断题为“对”或“错”（去掉标点后查同义词），
+    填空题为各空组成的元组，主题库（'main'）为整段文字；填空题和主题库只按 fold_answer 规范化"""
+    if exam_type == 'choice':
+        return ''.join(sorted({ch for ch in normalize_text(answer).upper() if 'A' <= ch <= 'Z'}))
+    if exam_type == 'fill':
+        return tuple(fold_answer(part) for part in unicodedata.normalize('NFKC', str(answer)).split('|'))
+    if exam_type == 'judge':
+        text = normalize_text(answer)
+        return _JUDGE_CANON.get(text, text)
+    return fold_answer(answer)
+
+
+def grade_key(exam_type, user_answer, key):
+    """用参考答案的判分键判一道题，耗时与空数成正比。选择题选项集合须完全一致，判断题须一致；
+    填空题逐空比较，互相包含即算这一空对，顺序填错的空与其余某一空完全相同也算对，至少 80% 的空对即算对；
+    主题库作答出现在参考答案中即算对"""
+    user = answer_key(exam_type, user_answer)
+    if exam_type == 'fill':
+        hit, spare = set(), []
+        for i, part in enumerate(user):
+            if part and i < len(key) and key[i] and (part in key[i] or key[i] in part):
+                hit.add(i)
+            elif part:
+                spare.append(part)
+        rest = Counter(part for i, part in enumerate(key) if i not in hit and part)
+        matched = len(hit)
+        for part in spare:
+            if rest[part] > 0:
+                rest[part] -= 1
+                matched += 1
+        return matched >= len(key) * 0.8
+    if exam_type == 'main':
+        return bool(user) and user in key
+    return bool(user) and user == key
+
+
+def grade_answer(exam_type, user_answer, correct_answer):
+    """判断分类题是否答对，规则见 grade_key；反复判同一题时应预先算好 answer_key"""
+    return grade_key(exam_type, user_answer, answer_key(exam_type, correct_answer))
+
+
+def grade_custom_answer(user_answer, correct_answer):
+    """自定义练习：作答（规范化后）出现在参考答案中即算对"""
+    return grade_key('main', user_answer, answer_key('main', correct_answer))
+
+
+def grade_csv(library, in_path, out_path=None):
+    """批量判分一个提交 CSV（列：考生、题型、题目、作答；考生可省略，题型可写 choice/选择题 等）。
+    out_path 给出时写出加了“参考答案”“结果”两列的 CSV。返回 {'total', 'correct', 'missing', 'students'}，
+    students 为 考生 -> [答对数, 题数]"""
+    import csv
+    with open(in_path, 'r', encoding='utf-8-sig', newline='') as f:
+        rows = list(csv.DictReader(f))
+    submissions = [(GRADE_BANK_NAMES.get((row.get('题型') or '').strip(), 'main'), row.get('题目') or '',
+                    row.get('作答') or '') for row in rows]
+    summary = {'total': len(rows), 'correct': 0, 'missing': 0, 'students': {}}
+    for row, (bank, stem, _), result in zip(rows, submissions, library.grade_batch(submissions)):
+        pos = library.position(bank, stem)
+        if pos is None:
+            row['参考答案'] = ''
+        else:
+            row['参考答案'] = library.quiz_dict[pos] if bank == 'main' else library.categorized[bank].answer(pos)
+        row['结果'] = '未找到' if result is None else ('对' if result else '错')
+        counts = summary['students'].setdefault(row.get('考生') or '', [0, 0])
+        counts[1] += 1
+        if result:
+            counts[0] += 1
+            summary['correct'] += 1
+        elif result is None:
+            summary['missing'] += 1
+    if out_path:
+        fields = list(rows[0]) if rows else ['考生', '题型', '题目', '作答', '参考答案', '结果']
+        with open(out_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(rows)
+    return summary
+
+
+# ================= 耗时记录 =================
+class _TimingSpan:
+    __slots__ = ('log', 'name', 'fields', 'start')
+
+    def __init__(self, log, name, fields):
+        self.log, self.name, self.fields = log, name, fields
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def set(self, **fields):
+        """补充只有执行完才知道的字段，例如结果条数"""
+        self.fields.update(fields)
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.fields['error'] = exc_type.__name__
+        self.log.record(self.name, time.perf_counter() - self.start, **self.fields)
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def set(self, **fields):
+        pass
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class TimingLog:
+    """热点路径耗时记录：最近 capacity 条保存在内存环形缓冲区，设置 path 时同时追加到按大小轮转的 JSONL 文件。
+    未启用时 record 直接返回、span 返回共享的空对象，几乎没有开销"""
+
+    def __init__(self, capacity=500, path=None, max_bytes=1 << 20, backups=3, enabled=False):
+        self.enabled = enabled
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.events = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, **fields):
+        if not self.enabled:
+            return
+        event = {'name': name, 'time': round(time.time(), 3), 'ms': round(seconds * 1000, 3), **fields}
+        with self.lock:
+            self.events.append(event)
+            if self.path:
+                self._write(event)
+
+    def span(self, name, **fields):
+        """with timings.span('load_all_data') as sp: ...；可在块内 sp.set(...) 补充字段"""
+        return _TimingSpan(self, name, fields) if self.enabled else _NULL_SPAN
+
+    def _write(self, event):
+        line = json.dumps(event, ensure_ascii=False) + '\n'
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) + len(line) > self.max_bytes:
+                self._rotate()
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError:
+            pass  # 日志只是辅助信息，写不进去不影响使用
+
+    def _rotate(self):
+        """diagnostics.jsonl -> .1 -> .2 ...，最多保留 backups 个旧文件"""
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def recent(self, n=50):
+        with self.lock:
+            return list(self.events)[-n:]
+
+    def summary(self):
+        """按名称汇总：{name: {count, avg_ms, p50_ms, p95_ms, max_ms, last_ms}}"""
+        with self.lock:
+            events = list(self.events)
+        groups = {}
+        for e in events:
+            groups.setdefault(e['name'], []).append(e['ms'])
+        result = {}
+        for name, values in groups.items():
+            lat = sorted(values)
+            result[name] = {'count': len(lat), 'avg_ms': sum(lat) / len(lat), 'p50_ms': lat[len(lat) // 2],
+                            'p95_ms': lat[min(len(lat) - 1, int(len(lat) * 0.95))], 'max_ms': lat[-1],
+                            'last_ms': values[-1]}
+        return result
+
+    def clear(self):
+        with self.lock:
+            self.events.clear()
@@ -0,0 +1,570 @@
+"""无界面的本地 HTTP 服务：一个进程只加载一次题库，供机房里的多名学生同时检索、组卷、判分和请求 AI 解析。
+
+用法：
+    python tikumain_v3.0.py --serve                   # 监听 config.json 中的 server_host:server_port（默认 127.0.0.1:8750）
+    python tiku_server.py --host 0.0.0.0 --port 8750  # 允许机房内其他机器访问
+
+接口（请求体和响应均为 JSON；会话可放在请求体的 session 字段、查询串或 X-Session 请求头中）：
+    GET  /api/health                                       服务状态和统计
+    GET  /api/courses                                      课程列表
+    POST /api/session  {"course"}                          新建会话，返回 {"session"}
+    GET  /api/search?q=关键词&course=&all=1&limit=50        检索：题干子串优先，没有结果时按相似度模糊检索
+    POST /api/exam     {"session", "type", "quota", "seed"} 组卷，type 为 choice/fill/judge/mixed，返回题目（不含答案）
+    POST /api/answer   {"session", "no", "answer"}         提交一题，返回是否答对和参考答案
+    POST /api/grade    {"session", "answers": {"题号": "作答"}}  整张答卷一次判分
+    POST /api/explain  {"session", "no"} 或 {"stem", "answer"}  AI 解析，"stream": true 时以 SSE 逐段返回；
+                       只有本机客户端可以自带参考答案或解析题库外的题，其他机器只能解析题库中查得到的题；
+                       接口的流中途断开时返回已收到的部分，"truncated" 为 true（结尾带“解析未完整返回”提示，不缓存）
+
+所有连接在一个 asyncio 事件循环中处理；检索和课程加载放到线程池执行，AI 请求走与界面相同的
+AIScheduler（相同题目的在途请求合并）、AIClient（限流和重试）和 AICache。会话只保存在内存中，
+超过 server_session_ttl 秒未使用或总数超过 server_max_sessions 时按最久未使用清除。
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import secrets
+import sys
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, urlsplit
+
+from tiku_core import (AICache, AIClient, AIRequestCancelled, AIRequestError, AIScheduler, Course, CourseRegistry,
+                       ExamHistory, QuestionLibrary, TimingLog, TRUNCATED_NOTICE, explain_cache_key, read_config,
+                       request_explanation)
+
+MAX_BODY = 1 << 20  # 请求体上限
+KEEPALIVE_SECONDS = 30  # 空闲连接保持时间
+TYPE_NAMES = {'choice': '选择题', 'fill': '填空题', 'judge': '判断题'}
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 409: 'Conflict',
+               411: 'Length Required', 413: 'Payload Too Large', 431: 'Request Header Fields Too Large',
+               500: 'Internal Server Error', 502: 'Bad Gateway', 503: 'Service Unavailable'}
+
+
+class ServiceError(Exception):
+    """请求无法处理，status 为返回的 HTTP 状态码，消息直接返回给客户端"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class TikuService:
+    """服务的全部状态：课程注册表、会话和 AI 请求组件。除 search / 课程加载在线程池中执行外，
+    所有方法都在事件循环线程中调用，会话不需要加锁"""
+
+    def __init__(self, config, base_dir):
+        self.config = config
+        csv_paths = {key: os.path.join(base_dir, name) for key, name in
+                     [('main', '题库.csv'), ('choice', '题库_选择题.csv'), ('fill', '题库_填空题.csv'),
+                      ('judge', '题库_判断题.csv')]}
+        default = Course('default', config['course_name'], csv_paths, os.path.join(base_dir, '题库.db'))
+        self.registry = CourseRegistry.discover(os.path.join(base_dir, config['courses_dir']), self._load_course,
+                                                default=default,
+                                                max_bytes=int(config['course_memory_mb'] * (1 << 20)))
+        self.timings = TimingLog(capacity=config['diagnostics_buffer'], enabled=config['diagnostics_enabled'],
+                                 path=os.path.join(base_dir, 'diagnostics.jsonl') if config['diagnostics_log'] else None)
+        self.ai_cache = AICache(os.path.join(base_dir, 'ai_cache.db'),
+                                max_bytes=int(config['ai_cache_max_mb'] * (1 << 20)),
+                                max_age=config['ai_cache_max_days'] * 86400)
+        self.ai_scheduler = AIScheduler(max_workers=config['ai_max_concurrency'])
+        self.ai_client = AIClient(max_retries=config['ai_max_retries'], rate=config['ai_rate_per_sec'],
+                                  timeout=(config['ai_connect_timeout'], config['ai_read_timeout']),
+                                  pool_size=max(8, config['ai_max_concurrency']))
+        self.executor = ThreadPoolExecutor(max_workers=config['server_workers'])
+        self.sessions = OrderedDict()  # 会话 id -> 会话，最近使用的在末尾
+        self.started = time.time()
+        self.requests = 0
+
+    def _load_course(self, course, progress):
+        return QuestionLibrary.load(course.csv_paths, backend=self.config.get('storage_backend'),
+                                    db_path=course.db_path, progress=progress,
+                                    dedup=self.config.get('dedup_enabled', True))
+
+    async def library(self, course_id):
+        """课程的题库；未加载时在线程池中加载，不阻塞其他连接"""
+        if course_id not in self.registry.courses:
+            raise ServiceError(404, f"没有课程：{course_id}")
+        library = self.registry.peek(course_id)
+        if library is None:
+            library = await asyncio.get_running_loop().run_in_executor(self.executor, self.registry.get, course_id)
+        return library
+
+    # ---------------- 会话 ----------------
+    def _new_session(self, course_id):
+        self.expire_sessions()
+        while len(self.sessions) >= self.config['server_max_sessions']:
+            self.sessions.popitem(last=False)
+        sid = secrets.token_urlsafe(12)
+        self.sessions[sid] = {'course': course_id, 'used': time.time(), 'exam': None,
+                              'history': ExamHistory(window=self.config['exam_history_window'])}
+        return sid
+
+    def session(self, sid):
+        session = self.sessions.get(sid) if sid else None
+        if session is None:
+            raise ServiceError(404, "会话不存在或已过期，请重新创建")
+        session['used'] = time.time()
+        self.sessions.move_to_end(sid)
+        return session
+
+    def expire_sessions(self):
+        deadline = time.time() - self.config['server_session_ttl']
+        while self.sessions:
+            sid, session = next(iter(self.sessions.items()))
+            if session['used'] >= deadline:
+                break
+            del self.sessions[sid]
+
+    # ---------------- 接口 ----------------
+    async def health(self, query, body):
+        return {'status': 'ok', 'uptime_s': round(time.time() - self.started, 1), 'requests': self.requests,
+                'sessions': len(self.sessions),
+                'courses': [{'id': cid, 'questions': len(lib.questions)} for cid, lib in self.registry.loaded()],
+                'ai': self.ai_scheduler.stats(), 'ai_client': self.ai_client.stats(), 'ai_cache': self.ai_cache.stats(),
+                'ai_configured': bool(self.config.get('api_key'))}
+
+    async def courses(self, query, body):
+        loaded = {cid for cid, _ in self.registry.loaded()}
+        return {'courses': [{'id': cid, 'name': course.name, 'loaded': cid in loaded}
+                            for cid, course in self.registry.courses.items()]}
+
+    async def create_session(self, query, body):
+        course_id = body.get('course') or 'default'
+        await self.library(course_id)
+        return {'session': self._new_session(course_id), 'course': course_id}
+
+    async def search(self, query, body):
+        kw = (query.get('q') or body.get('q') or '').strip()
+        if not kw:
+            raise ServiceError(400, "缺少检索关键词 q")
+        limit = max(1, min(200, _int(query.get('limit') or body.get('limit'), 50, 'limit')))
+        if query.get('all') in ('1', 'true') or body.get('all'):
+            source = self.registry
+        else:
+            sid = query.get('session') or body.get('session')
+            course_id = query.get('course') or body.get('course') or (
+                self.session(sid)['course'] if sid else 'default')
+            source = await self.library(course_id)
+        start = time.perf_counter()
+        total, hits = await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: source.search(kw, None, limit=limit, k=self.config['fuzzy_top_k'],
+                                                 min_score=self.config['fuzzy_min_score']))
+        self.timings.record('server_search', time.perf_counter() - start, kw_len=len(kw), results=total)
+        return {'total': total, 'hits': [dict(hit, options=[list(o) for o in hit['options']]) for hit in hits]}
+
+    async def exam(self, query, body):
+        """组卷，逻辑与界面的 start_typed_exam / start_mixed_exam 相同：单一题型 15 题，混合试卷按配额"""
+        session = self.session(body.get('session'))
+        library = await self.library(session['course'])
+        exam_type = body.get('type') or 'mixed'
+        if exam_type == 'mixed':
+            quota = body.get('quota') or self.config['exam_quota']
+        elif exam_type in TYPE_NAMES:
+            quota = {exam_type: _int(body.get('count'), 15, 'count')}
+        else:
+            raise ServiceError(400, f"未知的题型：{exam_type}")
+        seed = _int(body.get('seed'), None, 'seed')
+        try:
+            quota = {str(name): int(n) for name, n in quota.items() if int(n) > 0}
+            paper = library.exam_generator().generate(quota, seed=seed, history=session['history'])
+        except (ValueError, TypeError, AttributeError) as e:
+            raise ServiceError(400, f"组卷参数有误：{e}")
+        if not paper['questions']:
+            raise ServiceError(409, "题库为空")
+        session['history'].add(library, paper['questions'])
+        # 本场考试使用组卷时的题库，题库热更新或课程被淘汰后题号和判分仍然对应
+        session['exam'] = {'library': library, 'questions': paper['questions'], 'type': exam_type,
+                           'results': {}, 'score': 0}
+        return {'type': exam_type, 'seed': paper['seed'], 'short': paper['short'],
+                'questions': [self._question_view(library, no, bank, pos)
+                              for no, (bank, pos) in enumerate(paper['questions'])]}
+
+    @staticmethod
+    def _question_view(library, no, bank, pos):
+        records = library.categorized[bank]
+        qtype = records.qtype(pos) if bank == 'choice' else TYPE_NAMES[bank]
+        view = {'no': no, 'bank': bank, 'type': qtype, 'stem': records.stem(pos)}
+        if bank == 'choice':
+            view['options'] = [list(o) for o in records.options(pos)]
+            view['multi'] = '多选' in qtype
+        elif bank == 'fill':
+            view['blanks'] = len(records.answer(pos).split('|'))
+        return view
+
+    def _exam_question(self, session, no):
+        exam = session['exam']
+        if exam is None:
+            raise ServiceError(409, "请先组卷")
+        try:
+            no = int(no)
+            bank, pos = exam['questions'][no]
+        except (TypeError, ValueError, IndexError):
+            raise ServiceError(400, f"题号无效：{no}")
+        return exam, no, bank, pos
+
+    def _result(self, exam, no, bank, pos, correct):
+        """记下一题的判分结果；每题只按第一次提交计分"""
+        repeat = no in exam['results']
+        if not repeat:
+            exam['results'][no] = correct
+            exam['score'] += bool(correct)
+        return {'no': no, 'correct': correct, 'answer': exam['library'].categorized[bank].answer(pos),
+                'repeat': repeat}
+
+    async def answer(self, query, body):
+        """提交一题，判分逻辑与界面的 submit_typed_answer 相同"""
+        session = self.session(body.get('session'))
+        exam, no, bank, pos = self._exam_question(session, body.get('no'))
+        user_answer = str(body.get('answer') or '').strip()
+        if not user_answer:
+            raise ServiceError(400, "答案为空")
+        result = self._result(exam, no, bank, pos, exam['library'].grade(bank, pos, user_answer))
+        return dict(result, score=exam['score'], answered=len(exam['results']), total=len(exam['questions']))
+
+    async def grade(self, query, body):
+        """整张答卷一次判分（QuestionLibrary.grade_batch），未作答的题不计入"""
+        session = self.session(body.get('session'))
+        answers = body.get('answers')
+        if not isinstance(answers, dict):
+            raise ServiceError(400, "answers 应为 {题号: 作答}")
+        items = [self._exam_question(session, no) + (str(text or '').strip(),) for no, text in answers.items()]
+        exam = session['exam']
+        graded = exam['library'].grade_batch([(bank, pos, text) for _, _, bank, pos, text in items])
+        results = [self._result(exam, no, bank, pos, ok) for (_, no, bank, pos, _), ok in zip(items, graded)]
+        return {'results': results, 'score': exam['score'], 'answered': len(exam['results']),
+                'total': len(exam['questions'])}
+
+    async def _explain_target(self, body, local=True):
+        """(题干, 参考答案)：按会话中的题号取，或按题干在课程题库中查（QuestionLibrary.lookup）。
+        local 为 False（其他机器的请求）时忽略请求中的参考答案，查不到的题不解析，服务不会被用来转发任意内容"""
+        if body.get('no') is not None:
+            exam, _, bank, pos = self._exam_question(self.session(body.get('session')), body['no'])
+            records = exam['library'].categorized[bank]
+            return records.stem(pos), records.answer(pos)
+        stem = str(body.get('stem') or '').strip()
+        if len(stem) < 2:
+            raise ServiceError(400, "缺少题号 no 或题干 stem")
+        if local and body.get('answer'):
+            return stem, str(body['answer'])
+        course_id = self.session(body['session'])['course'] if body.get('session') else (body.get('course') or 'default')
+        entry, _ = (await self.library(course_id)).lookup(stem)
+        if entry is None and not local:
+            raise ServiceError(404, "题库中没有这道题")
+        return (stem, "本地库无对应答案") if entry is None else (entry['stem'], entry['answer'])
+
+    def submit_explanation(self, q, a, on_delta=None):
+        """与界面相同：相同题目的在途请求合并，成功后写入 AI 缓存"""
+        return self.ai_scheduler.submit(
+            explain_cache_key(self.config, q, a),
+            lambda emit, cancelled: request_explanation(self.ai_client, self.ai_cache, self.config, self.timings,
+                                                        q, a, on_delta=emit, cancelled=cancelled),
+            on_delta=on_delta)
+
+
+def _int(value, default, name):
+    try:
+        return default if value is None or value == '' else int(value)
+    except (TypeError, ValueError):
+        raise ServiceError(400, f"{name} 应为整数")
+
+
+def _is_loopback(peer):
+    """连接是否来自本机（peername 为 (地址, 端口, ...)，Unix 套接字等没有地址时按本机处理）"""
+    if not peer or not isinstance(peer, tuple):
+        return True
+    try:
+        addr = ipaddress.ip_address(peer[0].split('%')[0])
+    except ValueError:
+        return False
+    return (getattr(addr, 'ipv4_mapped', None) or addr).is_loopback
+
+
+def _settle(target, source):
+    """把工作线程中结束的 concurrent Future 的结果转给事件循环中的 asyncio Future"""
+    if target.done():
+        return
+    if source.cancelled():
+        target.set_exception(AIRequestCancelled("请求已取消"))
+    elif source.exception() is not None:
+        target.set_exception(source.exception())
+    else:
+        target.set_result(source.result())
+
+
+def _error_text(err):
+    if isinstance(err, AIRequestError):
+        return str(err)
+    return f"网络错误: {err}"
+
+
+class HttpServer:
+    """基于 asyncio 流的最小 HTTP/1.1 实现：支持长连接和 Content-Length 请求体，响应为 JSON 或 SSE"""
+
+    def __init__(self, service):
+        self.service = service
+        self.routes = {('GET', '/api/health'): service.health, ('GET', '/api/courses'): service.courses,
+                       ('POST', '/api/session'): service.create_session, ('GET', '/api/search'): service.search,
+                       ('POST', '/api/search'): service.search, ('POST', '/api/exam'): service.exam,
+                       ('POST', '/api/answer'): service.answer, ('POST', '/api/grade'): service.grade}
+        self.connections = 0
+        self.handlers = set()  # 各连接的处理任务，停止服务时一并取消
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        task = asyncio.current_task()
+        self.handlers.add(task)
+        local = _is_loopback(writer.get_extra_info('peername'))
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(self._read_request(reader), KEEPALIVE_SECONDS)
+                except ServiceError as e:
+                    await self._send_json(writer, e.status, {'error': str(e)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, query, headers, body = request
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                if not await self._dispatch(writer, method, path, query, headers, body, keep_alive, local):
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.connections -= 1
+            self.handlers.discard(task)
+            writer.close()
+
+    async def close_connections(self):
+        """取消仍在进行的连接（包括空闲的长连接）并等待它们结束"""
+        handlers = list(self.handlers)
+        for task in handlers:
+            task.cancel()
+        await asyncio.gather(*handlers, return_exceptions=True)
+
+    @staticmethod
+    async def _readline(reader):
+        try:
+            return await reader.readline()
+        except (ValueError, asyncio.LimitOverrunError):
+            # 超过 StreamReader 的行长度上限（64 KiB）
+            raise ServiceError(431, "请求行或请求头过长")
+
+    async def _read_request(self, reader):
+        line = await self._readline(reader)
+        if not line.strip():
+            return None
+        try:
+            method, target, _ = line.decode('latin-1').split()
+        except ValueError:
+            raise ServiceError(400, "请求行无效")
+        headers = {}
+        while True:
+            raw = await self._readline(reader)
+            if raw in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = raw.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+            if len(headers) > 100:
+                raise ServiceError(400, "请求头过多")
+        if 'transfer-encoding' in headers:
+            raise ServiceError(411, "请求体需要 Content-Length")
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise ServiceError(400, "Content-Length 无效")
+        if length > MAX_BODY:
+            raise ServiceError(413, "请求体过大")
+        body = await reader.readexactly(length) if length > 0 else b''
+        url = urlsplit(target)
+        return method.upper(), url.path.rstrip('/') or '/', dict(parse_qsl(url.query)), headers, body
+
+    async def _dispatch(self, writer, method, path, query, headers, raw, keep_alive, local=True):
+        """处理一个请求并写出响应，返回连接能否继续使用。SSE 响应开始之后出错时不能再写 JSON，只能断开连接；
+        客户端断开（ConnectionError）和任务取消原样抛出"""
+        service = self.service
+        service.requests += 1
+        start = time.perf_counter()
+        status = 200
+        state = {'streaming': False}
+        try:
+            try:
+                body = json.loads(raw) if raw else {}
+            except ValueError:
+                raise ServiceError(400, "请求体不是有效的 JSON")
+            if not isinstance(body, dict):
+                raise ServiceError(400, "请求体应为 JSON 对象")
+            if 'x-session' in headers:
+                body.setdefault('session', headers['x-session'])
+            if 'session' in query:
+                body.setdefault('session', query['session'])
+            if path == '/api/explain' and method == 'POST':
+                await self._explain(writer, body, keep_alive, local, state)
+                return keep_alive
+            handler = self.routes.get((method, path))
+            if handler is None:
+                known = any(p == path for _, p in self.routes)
+                raise ServiceError(405 if known else 404, "不支持的请求方法" if known else "接口不存在")
+            result = await handler(query, body)
+        except ServiceError as e:
+            status, result = e.status, {'error': str(e)}
+        except ConnectionError:
+            status = 499
+            raise
+        except Exception as e:
+            status, result = 500, {'error': f"{type(e).__name__}: {e}"}
+        finally:
+            service.timings.record('server_request', time.perf_counter() - start, path=path, status=status)
+        if state['streaming']:
+            return False
+        await self._send_json(writer, status, result, keep_alive)
+        return keep_alive
+
+    async def _explain(self, writer, body, keep_alive, local, state):
+        """AI 解析：先查本地缓存，否则经 AIScheduler 请求；stream 为真时以 SSE 逐段转发"""
+        service = self.service
+        q, a = await service._explain_target(body, local)
+        cached = service.ai_cache.get(explain_cache_key(service.config, q, a))
+        stream = bool(body.get('stream'))
+        if cached is None and not service.config.get('api_key'):
+            raise ServiceError(503, "服务端未配置 API 密钥（环境变量 SILICON_API_KEY）")
+        if not stream:
+            if cached is not None:
+                reasoning, content = cached
+            else:
+                # 等待自己的 Future 而不是共享的 job.future：本请求被取消时只取消自己的订阅
+                loop = asyncio.get_running_loop()
+                result = loop.create_future()
+                sub = service.submit_explanation(q, a)
+                sub.add_done_callback(lambda f: loop.call_soon_threadsafe(_settle, result, f))
+                try:
+                    reasoning, content = await result
+                except asyncio.CancelledError:
+                    sub.cancel()
+                    raise
+                except Exception as e:
+                    raise ServiceError(502, _error_text(e))
+            await self._send_json(writer, 200, {'stem': q, 'answer': a, 'reasoning': reasoning, 'content': content,
+                                                'cached': cached is not None,
+                                                'truncated': content.endswith(TRUNCATED_NOTICE)}, keep_alive)
+            return
+
+        state['streaming'] = True
+        await self._start_stream(writer, keep_alive)
+        await self._send_event(writer, {'stem': q, 'answer': a, 'cached': cached is not None})
+        if cached is not None:
+            for kind, text in zip(('reasoning', 'content'), cached):
+                if text:
+                    await self._send_event(writer, {'kind': kind, 'text': text})
+            await self._send_event(writer, {'done': True})
+            await self._end_stream(writer)
+            return
+
+        # 片段在 AIScheduler 的工作线程中回调，转交给事件循环后按顺序写出
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        sub = service.submit_explanation(q, a, on_delta=lambda kind, text: loop.call_soon_threadsafe(
+            queue.put_nowait, {'kind': kind, 'text': text}))
+        sub.add_done_callback(lambda f: loop.call_soon_threadsafe(queue.put_nowait, None))
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    break
+                await self._send_event(writer, event)
+            err = AIRequestCancelled("请求已取消") if sub.future.cancelled() else sub.future.exception()
+            if err is not None:
+                await self._send_event(writer, {'done': True, 'error': _error_text(err)})
+            else:
+                await self._send_event(writer, {'done': True,
+                                                'truncated': sub.future.result()[1].endswith(TRUNCATED_NOTICE)})
+            await self._end_stream(writer)
+        except BaseException:
+            sub.cancel()  # 客户端断开或写出失败，没有其他人等同一条解析时请求会被中断
+            raise
+
+    @staticmethod
+    async def _send_json(writer, status, obj, keep_alive):
+        data = json.dumps(obj, ensure_ascii=False).encode('utf-8')
+        head = (f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                f"Content-Type: application/json; charset=utf-8\r\nContent-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode('latin-1') + data)
+        await writer.drain()
+
+    @staticmethod
+    async def _start_stream(writer, keep_alive):
+        writer.write(("HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                      "Cache-Control: no-cache\r\nTransfer-Encoding: chunked\r\n"
+                      f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n").encode('latin-1'))
+        await writer.drain()
+
+    @staticmethod
+    async def _send_event(writer, obj):
+        data = b'data: ' + json.dumps(obj, ensure_ascii=False).encode('utf-8') + b'\n\n'
+        writer.write(b'%x\r\n%s\r\n' % (len(data), data))
+        await writer.drain()
+
+    @staticmethod
+    async def _end_stream(writer):
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+
+async def serve(service, host, port, ready=None):
+    """运行服务直到被取消；ready(地址) 在开始监听后回调"""
+    http = HttpServer(service)
+    server = await asyncio.start_server(http.handle, host, port, backlog=1024)
+
+    async def sweep():
+        while True:
+            await asyncio.sleep(60)
+            service.expire_sessions()
+
+    sweeper = asyncio.create_task(sweep())
+    try:
+        if ready:
+            ready(server.sockets[0].getsockname()[:2])
+        async with server:
+            await server.serve_forever()
+    finally:
+        sweeper.cancel()
+        # asyncio 的 Server 关闭时不会断开已建立的连接，不取消的话空闲长连接的任务会悬挂到事件循环关闭
+        await http.close_connections()
+
+
+def main(argv=None, base_dir=None):
+    base_dir = base_dir or os.path.dirname(os.path.abspath(__file__))
+    config = read_config(os.path.join(base_dir, 'config.json'))
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--serve', action='store_true', help=argparse.SUPPRESS)  # 由 tikumain_v3.0.py --serve 转来
+    parser.add_argument('--host', default=config['server_host'])
+    parser.add_argument('--port', type=int, default=config['server_port'])
+    parser.add_argument('--course', default='default', help="启动时预先加载的课程")
+    args = parser.parse_args(argv)
+
+    service = TikuService(config, base_dir)
+    if args.course not in service.registry.courses:
+        parser.error(f"没有课程：{args.course}")
+    start = time.perf_counter()
+    library = service.registry.get(args.course, progress=lambda done, total, text: print(
+        f"[{done}/{total}] {text}", flush=True))
+    print(f"题库已加载：{len(library.questions)} 题，用时 {time.perf_counter() - start:.2f}s", flush=True)
+    if not config.get('api_key'):
+        print("未设置环境变量 SILICON_API_KEY，AI 解析只能返回已缓存的内容", flush=True)
+    try:
+        asyncio.run(serve(service, args.host, args.port,
+                          ready=lambda addr: print(f"服务已启动：http://{addr[0]}:{addr[1]}/api/health（Ctrl+C 退出）",
+                                                   flush=True)))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.ai_scheduler.shutdown()
+        service.executor.shutdown(wait=False, cancel_futures=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
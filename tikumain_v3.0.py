@@ -2,13 +2,115 @@ import os
 import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
-import pandas as pd
-import random
 import threading
-import requests
-from difflib import get_close_matches
+import time
+from collections import deque
 import json
 
+from tiku_core import (AICache, AIClient, AIPrefetcher, AIRequestError, AIScheduler,
+                       AnswerJournal, BankWatcher, Course, CourseRegistry, ExamHistory, QuestionLibrary, TimingLog,
+                       explain_cache_key, read_config, request_explanation)
+
+_STARTED = time.perf_counter()  # 进程启动时刻，用于统计首屏时间
+
+
+class VirtualCheckList(tk.Frame):
+    """虚拟化勾选列表：只为可见行创建控件，滚动时复用；勾选状态保存在 checked 集合中（存条目下标）"""
+    ROW_HEIGHT = 26
+
+    def __init__(self, parent, items, font, on_change=None, **kw):
+        super().__init__(parent, **kw)
+        self.items = items
+        self.font = font
+        self.on_change = on_change
+        self.view = range(len(items))  # 当前显示的条目下标（过滤结果）
+        self.checked = set()
+        self.top = 0
+        self.rows = []  # 行控件池：(Checkbutton, BooleanVar)
+
+        self.body = tk.Frame(self, bg=kw.get('bg', 'white'))
+        self.scroll_y = ttk.Scrollbar(self, orient="vertical", command=self._on_scrollbar)
+        self.body.pack(side="left", fill="both", expand=True)
+        self.scroll_y.pack(side="right", fill="y")
+        self.body.bind("<Configure>", lambda e: self.refresh())
+        self._bind_wheel(self.body)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", lambda e: self.scroll_by(-1 if e.delta > 0 else 1, 'units'))
+        widget.bind("<Button-4>", lambda e: self.scroll_by(-1, 'units'))
+        widget.bind("<Button-5>", lambda e: self.scroll_by(1, 'units'))
+
+    @property
+    def visible_rows(self):
+        return max(1, self.body.winfo_height() // self.ROW_HEIGHT)
+
+    def set_view(self, indices):
+        self.view = indices
+        self.top = 0
+        self.refresh()
+
+    def check_all(self, indices):
+        self.checked.update(indices)
+        self.refresh()
+
+    def clear_checked(self):
+        self.checked.clear()
+        self.refresh()
+
+    def scroll_by(self, amount, what):
+        step = 3 if what == 'units' else self.visible_rows
+        self.scroll_to(self.top + int(amount) * step)
+
+    def scroll_to(self, top):
+        top = max(0, min(top, len(self.view) - self.visible_rows))
+        if top != self.top:
+            self.top = top
+            self.refresh()
+
+    def _on_scrollbar(self, action, *args):
+        if action == 'moveto':
+            self.scroll_to(int(float(args[0]) * len(self.view)))
+        elif action == 'scroll':
+            self.scroll_by(args[0], args[1])
+
+    def _on_toggle(self, row):
+        idx = self.view[self.top + row]
+        if self.rows[row][1].get():
+            self.checked.add(idx)
+        else:
+            self.checked.discard(idx)
+        if self.on_change:
+            self.on_change()
+
+    def refresh(self):
+        """只刷新可见行的文字和勾选状态，行控件不够时才补建"""
+        count = min(self.visible_rows + 1, len(self.view) - self.top)
+        while len(self.rows) < count:
+            row = len(self.rows)
+            var = tk.BooleanVar()
+            cb = tk.Checkbutton(self.body, variable=var, bg="white", font=self.font, anchor="w",
+                                command=lambda r=row: self._on_toggle(r))
+            self._bind_wheel(cb)
+            self.rows.append((cb, var))
+
+        for row, (cb, var) in enumerate(self.rows):
+            if row < count:
+                idx = self.view[self.top + row]
+                q = self.items[idx]
+                cb.config(text=q[:90] + "..." if len(q) > 90 else q)
+                var.set(idx in self.checked)
+                cb.place(x=0, y=row * self.ROW_HEIGHT, relwidth=1, height=self.ROW_HEIGHT)
+            else:
+                cb.place_forget()
+
+        if self.view:
+            total = len(self.view)
+            self.scroll_y.set(self.top / total, min(1.0, (self.top + self.visible_rows) / total))
+        else:
+            self.scroll_y.set(0, 1)
+        if self.on_change:
+            self.on_change()
+
 
 class FinanceApp:
     # 样式配置
@@ -23,6 +125,9 @@ class FinanceApp:
         'small': ("微软雅黑", 10), 'tiny': ("微软雅黑", 9)
     }
     BTN_STYLE = {"font": ("微软雅黑", 12, "bold"), "width": 25, "pady": 12, "relief": "flat", "cursor": "hand2"}
+    SEARCH_DEBOUNCE_MS = 250  # 边输边搜的防抖间隔
+    SEARCH_RENDER_LIMIT = 200  # 检索结果最多渲染的条数，避免大量插入阻塞界面
+    AI_FLUSH_MS = 50  # 流式输出时批量刷新文本框的间隔
 
     def __init__(self, root):
         self.root = root
@@ -32,6 +137,8 @@ class FinanceApp:
 
         # 路径配置
         self.config_path = self.get_resource_path('config.json')
+        self.ai_cache_path = self.get_resource_path('ai_cache.db')
+        self.diagnostics_path = self.get_resource_path('diagnostics.jsonl')
         self.csv_paths = {
             'main': self.get_resource_path('题库.csv'),
             'choice': self.get_resource_path('题库_选择题.csv'),
@@ -39,17 +146,156 @@ class FinanceApp:
             'judge': self.get_resource_path('题库_判断题.csv')
         }
 
-        # 加载数据
+        # 加载数据：配置同步读取，题库在后台线程加载，先画出主菜单
         self.load_config()
-        self.load_all_data()
+        self.timings = TimingLog(capacity=self.config['diagnostics_buffer'], enabled=self.config['diagnostics_enabled'],
+                                 path=self.diagnostics_path if self.config['diagnostics_log'] else None)
+        # 课程：程序目录下的四个 CSV 为默认课程，courses 目录下每个子目录是一门课程，第一次选中时才加载
+        default = Course('default', self.config['course_name'], self.csv_paths, self.get_resource_path('题库.db'))
+        self.registry = CourseRegistry.discover(self.get_resource_path(self.config['courses_dir']), self._load_course,
+                                                default=default,
+                                                max_bytes=int(self.config['course_memory_mb'] * (1 << 20)))
+        self.course_id = self.config['last_course'] if self.config['last_course'] in self.registry.courses else 'default'
+        self.csv_paths = self.registry.courses[self.course_id].csv_paths
+        self._use_library(QuestionLibrary.empty())
+        self.data_ready = False
+        self.load_progress = (0, 1, "正在加载题库…")  # (已完成步数, 总步数, 当前步骤)
+        self.startup_times = {}  # first_window / data_ready，距进程启动的秒数
+        self.load_seconds = 0.0  # 最近一次加载课程题库的耗时
+        self.bank_watcher = None
+        self.reload_bases = {}  # 课程 -> 热更新时比较的基准题库
+        self.reload_note = ""  # 最近一次热更新的说明，显示在主菜单
+        self.ai_cache = AICache(self.ai_cache_path, max_bytes=int(self.config['ai_cache_max_mb'] * (1 << 20)),
+                                max_age=self.config['ai_cache_max_days'] * 86400)
+        self.ai_scheduler = AIScheduler(max_workers=self.config['ai_max_concurrency'])
+        self.ai_client = AIClient(max_retries=self.config['ai_max_retries'], rate=self.config['ai_rate_per_sec'],
+                                  timeout=(self.config['ai_connect_timeout'], self.config['ai_read_timeout']))
 
         # 考试状态
         self.exam_state = {'questions': [], 'index': 0, 'score': 0, 'type': ''}
+        self.exam_histories = {}  # 课程 -> ExamHistory
+        self.journals = {}  # 课程 -> AnswerJournal（答题记录和错题复习计划）
+        self.prefetcher = None
+        self.exam_views = {}  # 题型 -> 复用的答题界面控件
+        self.render_times = deque(maxlen=100)  # [(build|update, 毫秒)]
+
+        # 检索状态：每次发起检索时递增 search_gen，过期的结果据此丢弃
+        self.search_gen = 0
+        self.search_kw = None
+        self.search_after_id = None
 
         # 主容器
         self.main_container = tk.Frame(self.root, bg=self.COLORS['bg'])
         self.main_container.pack(fill="both", expand=True)
         self.show_main_menu()
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.root.after_idle(self._on_first_window)
+        threading.Thread(target=self._load_data_worker, daemon=True).start()
+        self.root.after(100, self._poll_loading)
+
+    def on_close(self):
+        """关闭主窗口：停止预取和题库监视，撤销所有 AI 请求，卡在网络中的请求不再拖住进程退出"""
+        self._stop_prefetch()
+        if self.bank_watcher:
+            self.bank_watcher.stop()
+        self.ai_scheduler.shutdown()
+        self.root.destroy()
+
+    # ================= 分阶段启动 =================
+    def _on_first_window(self):
+        self.startup_times['first_window'] = time.perf_counter() - _STARTED
+        self._update_load_status()
+
+    def _load_data_worker(self):
+        # 在加载线程中建好题库、重放答题记录，切换到新题库交给主线程（_on_data_loaded），界面读到的状态不会只更新一半
+        course_id = self.course_id
+        start = time.perf_counter()
+        library = journal = None
+        try:
+            library = self.load_all_data(course_id)
+            if course_id not in self.journals:
+                journal = AnswerJournal(self._course_file(course_id, 'answer_journal.jsonl')).open()
+        finally:
+            seconds = time.perf_counter() - start
+            self.root.after(0, lambda: self._on_data_loaded(course_id, library, journal, seconds))
+
+    def _on_data_loaded(self, course_id, library, journal, seconds):
+        if library is not None:
+            self._use_library(library)
+        if journal is not None:
+            self.journals.setdefault(course_id, journal)
+        self.load_seconds = seconds
+        self.startup_times.setdefault('data_ready', time.perf_counter() - _STARTED)
+        self.data_ready = True
+        if library is not None:
+            self._start_bank_watcher()
+
+    def _poll_loading(self):
+        """主线程轮询后台加载进度，完成后启用依赖题库的按钮"""
+        if not self.data_ready:
+            self.root.after(100, self._poll_loading)
+        self._update_load_status()
+
+    def _update_load_status(self):
+        if not getattr(self, 'load_label', None) or not self.load_label.winfo_exists():
+            return
+        if not self.data_ready:
+            done, total, text = self.load_progress
+            self.load_bar.config(maximum=total, value=done)
+            self.load_label.config(text=f"{text}（{done}/{total}）")
+            return
+        self.load_bar.pack_forget()
+        times = self.startup_times
+        report = self.library.dedup_report
+        merged = f"（已合并重复 {report['summary']['merged']} 题）" if report and report['summary']['merged'] else ""
+        due = self.answer_journal().scheduler.due_count()
+        self.load_label.config(text=f"题库已就绪：{len(self.questions)} 题{merged} | "
+                                    f"首屏 {times.get('first_window', 0) * 1000:.0f} ms | 题库加载 {self.load_seconds:.2f} s"
+                                    + (f"\n{self.reload_note}" if self.reload_note else "")
+                                    + (f"\n📕 {due} 道错题到期待复习" if due else ""))
+        for btn in self.data_buttons:
+            btn.config(state="normal")
+        if getattr(self, 'course_combo', None) and self.course_combo.winfo_exists():
+            self.course_combo.config(state="readonly")
+
+    def _report_load_progress(self, done, total, text):
+        self.load_progress = (done, total, text)
+
+    # ================= 题库热更新 =================
+    def _start_bank_watcher(self):
+        """内存模式下监视题库 CSV，保存后自动增量更新，不必重启"""
+        if not self.config.get('hot_reload') or self.config.get('storage_backend') == 'sqlite':
+            return
+        course_id = self.course_id
+        self.reload_bases[course_id] = self.library
+        self.bank_watcher = BankWatcher(self.csv_paths, lambda key, path: self._on_bank_file_changed(course_id, key, path),
+                                        interval=self.config['hot_reload_interval']).start()
+
+    def _on_bank_file_changed(self, course_id, key, path):
+        # 在监视线程中执行：读取并比较变化的题库，得到新的题库对象后交给主线程切换；已切走的课程的事件直接丢弃
+        base = self.reload_bases.get(course_id)
+        if course_id != self.course_id or base is None:
+            return
+        try:
+            with self.timings.span('reload_bank', course=course_id, bank=key) as sp:
+                library, changes = base.reload_bank(key, path)
+                sp.set(inserted=changes['inserted'], updated=changes['updated'], deleted=changes['deleted'])
+        except:
+            return
+        if library is not base:
+            self.reload_bases[course_id] = library
+            self.registry.update(course_id, library)
+            self.root.after(0, lambda: self._apply_reloaded_library(course_id, library, changes))
+
+    def _apply_reloaded_library(self, course_id, library, changes):
+        """切换到热更新后的题库；进行中的考试和自选练习仍使用开始时的题目"""
+        if course_id != self.course_id:
+            return  # 更新到达前已经切换了课程
+        self._use_library(library)
+        names = {'main': '主题库', 'choice': '选择题', 'fill': '填空题', 'judge': '判断题'}
+        self.reload_note = (f"{names[changes['bank']]}已更新：新增 {changes['inserted']}，修改 {changes['updated']}，"
+                            f"删除 {changes['deleted']}（{time.strftime('%H:%M:%S')}）")
+        self._update_load_status()
 
     def get_resource_path(self, relative_path):
         base = getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))
@@ -57,17 +303,7 @@ class FinanceApp:
 
     # ================= 数据加载 =================
     def load_config(self):
-        default = {"api_url": "https://api.siliconflow.cn/v1/chat/completions",
-                   "model": "Qwen/Qwen2.5-7B-Instruct", "enable_reasoning": False}
-        try:
-            if os.path.exists(self.config_path):
-                with open(self.config_path, 'r', encoding='utf-8') as f:
-                    self.config = {**default, **json.load(f)}
-            else:
-                self.config = default
-        except:
-            self.config = default
-        self.config['api_key'] = os.environ.get('SILICON_API_KEY', '')
+        self.config = read_config(self.config_path)
 
     def save_config(self):
         try:
@@ -77,32 +313,95 @@ class FinanceApp:
         except Exception as e:
             messagebox.showerror("保存失败", str(e))
 
-    def load_all_data(self):
-        # 主题库
+    def load_all_data(self, course_id):
+        """加载并返回课程的题库，已加载过且未被淘汰的课程直接取用；在加载线程中调用，不修改界面状态"""
+        with self.timings.span('load_all_data', course=course_id, backend=self.config.get('storage_backend')) as sp:
+            library = self.registry.get(course_id, progress=self._report_load_progress)
+            sp.set(questions=len(library.questions))
+        return library
+
+    def _load_course(self, course, progress):
+        # CourseRegistry 的加载函数，在加载线程中调用
+        library = QuestionLibrary.load(course.csv_paths, backend=self.config.get('storage_backend'),
+                                       db_path=course.db_path, progress=progress,
+                                       dedup=self.config.get('dedup_enabled', True))
+        if library.dedup_report is not None:
+            self.save_dedup_report(course, library.dedup_report)
+        return library
+
+    def switch_course(self, course_id):
+        """切换课程：在后台线程中加载（已加载的直接取用），进行中的考试不受影响"""
+        if course_id == self.course_id or not self.data_ready:
+            return
+        if self.bank_watcher:
+            self.bank_watcher.stop()
+            self.bank_watcher = None
+        self.course_id = course_id
+        self.csv_paths = self.registry.courses[course_id].csv_paths
+        self.config['last_course'] = course_id
+        self.save_config()
+        self.reload_note = ""
+        self.data_ready = False
+        self.load_progress = (0, 1, "正在加载题库…")
+        self.show_main_menu()
+        threading.Thread(target=self._load_data_worker, daemon=True).start()
+        self.root.after(100, self._poll_loading)
+
+    def save_dedup_report(self, course, report):
+        """去重报告写到课程题库旁边，便于核对合并了哪些题"""
         try:
-            df = pd.read_csv(self.csv_paths['main'], encoding='utf-8-sig')
-            self.quiz_dict = dict(zip(df['题目'], df['题目的文字答案']))
-            self.questions = list(self.quiz_dict.keys())
+            path = os.path.join(os.path.dirname(course.csv_paths['main']), 'dedup_report.json')
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
         except:
-            self.quiz_dict, self.questions = {}, []
-
-        # 分类题库
-        self.categorized = {}
-        configs = [
-            ('choice', ['stem', 'A', 'B', 'C', 'D', 'answer', 'type']),
-            ('fill', ['stem', 'answer']),
-            ('judge', ['stem', 'answer'])
-        ]
-        for key, cols in configs:
+            pass
+
+    def _course_file(self, course_id, name):
+        """课程的数据文件放在该课程题库旁边"""
+        return os.path.join(os.path.dirname(self.registry.courses[course_id].csv_paths['main']), name)
+
+    def answer_journal(self):
+        """当前课程的答题记录，第一次使用时重放出错题复习计划"""
+        journal = self.journals.get(self.course_id)
+        if journal is None:
+            journal = AnswerJournal(self._course_file(self.course_id, 'answer_journal.jsonl')).open()
+            self.journals[self.course_id] = journal
+        return journal
+
+    def exam_history(self):
+        """当前课程最近出过的试卷，保存在课程题库旁边，第一次组卷时读取"""
+        history = self.exam_histories.get(self.course_id)
+        if history is None:
+            papers = []
             try:
-                df = pd.read_csv(self.csv_paths[key], encoding='utf-8-sig', header=None, names=cols)
-                self.categorized[key] = df.to_dict('records')
+                with open(self._course_file(self.course_id, 'exam_history.json'), 'r', encoding='utf-8') as f:
+                    papers = json.load(f)
             except:
-                self.categorized[key] = []
+                pass
+            history = self.exam_histories[self.course_id] = ExamHistory(papers, self.config['exam_history_window'])
+        return history
+
+    def save_exam_history(self):
+        try:
+            with open(self._course_file(self.course_id, 'exam_history.json'), 'w', encoding='utf-8') as f:
+                json.dump(self.exam_history().to_list(), f, ensure_ascii=False)
+        except:
+            pass
+
+    def _use_library(self, library):
+        """切换当前题库；quiz_dict 等属性只是 library 对应字段的别名"""
+        self.library = library
+        self.quiz_dict, self.questions = library.quiz_dict, library.questions
+        self.search_index, self.categorized = library.search_index, library.categorized
 
     def clear_screen(self):
+        # 答题界面只隐藏不销毁，下次练习直接复用
+        kept = {view['root'] for view in self.exam_views.values()}
         for w in self.main_container.winfo_children():
-            w.destroy()
+            if w in kept:
+                w.pack_forget()
+            else:
+                w.destroy()
 
     # ================= 通用UI组件 =================
     def create_nav_bar(self, text, command, color):
@@ -190,11 +489,37 @@ class FinanceApp:
             status += " | ⚠️ 未配置API密钥"
         tk.Label(frame, text=status, font=self.FONTS['small'], bg=self.COLORS['bg'], fg="#999").pack(pady=(0, 30))
 
-        buttons = [("🔍 题库检索模式", self.show_search_mode, '#40a9ff'),
-                   ("📝 模拟刷题模式", self.show_practice_menu, self.COLORS['success']),
-                   ("⚙️ API设置", self.show_settings, self.COLORS['purple'])]
-        for text, cmd, bg in buttons:
-            tk.Button(frame, text=text, command=cmd, bg=bg, fg="white", **self.BTN_STYLE).pack(pady=10)
+        # 安装了多门课程时显示课程选择，加载期间不能切换
+        self.course_combo = None
+        if len(self.registry.courses) > 1:
+            ids = list(self.registry.courses)
+            row = tk.Frame(frame, bg=self.COLORS['bg'])
+            row.pack(pady=(0, 20))
+            tk.Label(row, text="当前课程：", font=self.FONTS['small'], bg=self.COLORS['bg']).pack(side="left")
+            self.course_combo = ttk.Combobox(row, values=[self.registry.courses[i].name for i in ids], width=20,
+                                             state="readonly" if self.data_ready else "disabled")
+            self.course_combo.current(ids.index(self.course_id))
+            self.course_combo.bind("<<ComboboxSelected>>",
+                                   lambda e: self.switch_course(ids[self.course_combo.current()]))
+            self.course_combo.pack(side="left")
+
+        # 检索和刷题依赖题库，加载完成前保持禁用
+        buttons = [("🔍 题库检索模式", self.show_search_mode, '#40a9ff', True),
+                   ("📝 模拟刷题模式", self.show_practice_menu, self.COLORS['success'], True),
+                   ("⚙️ API设置", self.show_settings, self.COLORS['purple'], False)]
+        self.data_buttons = []
+        for text, cmd, bg, needs_data in buttons:
+            btn = tk.Button(frame, text=text, command=cmd, bg=bg, fg="white", **self.BTN_STYLE)
+            btn.pack(pady=10)
+            if needs_data and not self.data_ready:
+                btn.config(state="disabled")
+                self.data_buttons.append(btn)
+
+        self.load_bar = ttk.Progressbar(frame, length=300, mode="determinate")
+        self.load_bar.pack(pady=(20, 5))
+        self.load_label = tk.Label(frame, font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#999")
+        self.load_label.pack()
+        self._update_load_status()
 
     # ================= 设置界面 =================
     def show_settings(self):
@@ -242,6 +567,12 @@ class FinanceApp:
         self.reasoning_var = tk.BooleanVar(value=self.config.get('enable_reasoning', False))
         tk.Checkbutton(reason_frame, text="启用深度推理（更慢但更准确）", variable=self.reasoning_var,
                        bg=self.COLORS['bg'], font=self.FONTS['small']).pack(side="left")
+        self.stream_var = tk.BooleanVar(value=self.config.get('stream', True))
+        tk.Checkbutton(reason_frame, text="流式输出（边生成边显示）", variable=self.stream_var,
+                       bg=self.COLORS['bg'], font=self.FONTS['small']).pack(side="left", padx=10)
+        self.prefetch_var = tk.BooleanVar(value=self.config.get('ai_prefetch', False))
+        tk.Checkbutton(reason_frame, text="刷题时预取解析（提前消耗额度）", variable=self.prefetch_var,
+                       bg=self.COLORS['bg'], font=self.FONTS['small']).pack(side="left")
 
         # 快捷模型选择
         tk.Label(content, text="常用模型快捷选择：", font=self.FONTS['small'], bg=self.COLORS['bg']).pack(anchor="w",
@@ -271,11 +602,117 @@ class FinanceApp:
                   fg="white", font=self.FONTS['medium'], width=12, pady=8).pack(side="left", padx=10)
         tk.Button(btns, text="🧪 测试连接", command=self.test_api_connection, bg=self.COLORS['primary'],
                   fg="white", font=self.FONTS['medium'], width=12, pady=8).pack(side="left", padx=10)
+        tk.Button(btns, text="📊 性能诊断", command=self.show_diagnostics, bg=self.COLORS['purple'],
+                  fg="white", font=self.FONTS['medium'], width=12, pady=8).pack(side="left", padx=10)
+
+        # AI 解析缓存
+        cache_frame = tk.Frame(content, bg=self.COLORS['bg'])
+        cache_frame.pack(fill="x")
+        self.cache_label = tk.Label(cache_frame, text="", font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#666",
+                                    justify="left")
+        self.cache_label.pack(side="left")
+        tk.Button(cache_frame, text="清空缓存", command=self.clear_ai_cache, relief="flat",
+                  font=self.FONTS['tiny']).pack(side="left", padx=10)
+        self._update_cache_label()
+
+    def _update_cache_label(self):
+        st, cs, ss = self.ai_cache.stats(), self.ai_client.stats(), self.ai_scheduler.stats()
+        latency = f"{cs['latency_p50'] * 1000:.0f} / {cs['latency_p95'] * 1000:.0f} ms" if cs['latency_p50'] is not None else "-"
+        self.cache_label.config(text=f"AI解析缓存：{st['entries']} 条 / {st['bytes'] / 1024:.0f} KB，"
+                                     f"本次命中 {st['hits']} 次，未命中 {st['misses']} 次\n"
+                                     f"AI连接：请求 {cs['requests']} 次，重试 {cs['retries']} 次，失败 {cs['failures']} 次，"
+                                     f"响应延迟 p50/p95 {latency}\n"
+                                     f"AI调度：发起 {ss['started']} 次，合并重复请求 {ss['coalesced']} 次，"
+                                     f"中途取消 {ss['aborted']} 次")
+
+    def clear_ai_cache(self):
+        if messagebox.askyesno("确认", "确定清空所有已缓存的AI解析吗？"):
+            self.ai_cache.clear()
+            self._update_cache_label()
+
+    # ================= 性能诊断 =================
+    def show_diagnostics(self):
+        self.clear_screen()
+        self.create_nav_bar("← 返回设置", self.show_settings, "#f0e6ff")
+
+        content = tk.Frame(self.main_container, bg=self.COLORS['bg'], padx=30, pady=20)
+        content.pack(fill="both", expand=True)
+        tk.Label(content, text="📊 性能诊断", font=self.FONTS['large'], bg=self.COLORS['bg']).pack(pady=(0, 10))
+
+        opts = tk.Frame(content, bg=self.COLORS['bg'])
+        opts.pack(fill="x")
+        self.diag_enabled_var = tk.BooleanVar(value=self.config['diagnostics_enabled'])
+        tk.Checkbutton(opts, text="记录耗时", variable=self.diag_enabled_var, command=self._apply_diagnostics_settings,
+                       bg=self.COLORS['bg'], font=self.FONTS['small']).pack(side="left")
+        self.diag_log_var = tk.BooleanVar(value=self.config['diagnostics_log'])
+        tk.Checkbutton(opts, text="同时写入 diagnostics.jsonl", variable=self.diag_log_var,
+                       command=self._apply_diagnostics_settings, bg=self.COLORS['bg'],
+                       font=self.FONTS['small']).pack(side="left", padx=10)
+        tk.Button(opts, text="清空", command=lambda: [self.timings.clear(), self._refresh_diagnostics()],
+                  relief="flat", font=self.FONTS['tiny']).pack(side="right")
+        tk.Button(opts, text="刷新", command=self._refresh_diagnostics, relief="flat",
+                  font=self.FONTS['tiny']).pack(side="right", padx=5)
+
+        self.diag_info = tk.Label(content, font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#666", justify="left")
+        self.diag_info.pack(anchor="w", pady=10)
+
+        # 按操作汇总
+        columns = [('count', "次数"), ('avg_ms', "平均"), ('p50_ms', "p50"), ('p95_ms', "p95"), ('max_ms', "最大"),
+                   ('last_ms', "最近")]
+        self.diag_tree = ttk.Treeview(content, columns=[c for c, _ in columns], height=7)
+        self.diag_tree.heading('#0', text="操作（毫秒）")
+        self.diag_tree.column('#0', width=200)
+        for col, title in columns:
+            self.diag_tree.heading(col, text=title)
+            self.diag_tree.column(col, width=80, anchor="e")
+        self.diag_tree.pack(fill="x")
+
+        # 最近的记录
+        tk.Label(content, text="最近记录：", font=self.FONTS['small'], bg=self.COLORS['bg']).pack(anchor="w",
+                                                                                              pady=(10, 0))
+        self.diag_recent = tk.Text(content, font=self.FONTS['tiny'], height=12, bg="white", relief="flat")
+        self.diag_recent.pack(fill="both", expand=True)
+        self._refresh_diagnostics()
+
+    def _apply_diagnostics_settings(self):
+        self.config['diagnostics_enabled'] = self.diag_enabled_var.get()
+        self.config['diagnostics_log'] = self.diag_log_var.get()
+        self.timings.enabled = self.config['diagnostics_enabled']
+        self.timings.path = self.diagnostics_path if self.config['diagnostics_log'] else None
+        self.save_config()
+        self._refresh_diagnostics()
+
+    def _refresh_diagnostics(self):
+        if not self.diag_tree.winfo_exists():
+            return
+        times, cs = self.startup_times, self.ai_client.stats()
+        info = f"首屏 {times['first_window'] * 1000:.0f} ms" if 'first_window' in times else "首屏 -"
+        info += f" | 题库就绪 {times['data_ready']:.2f} s" if 'data_ready' in times else " | 题库加载中"
+        info += f" | AI 请求 {cs['requests']} 次，重试 {cs['retries']} 次，失败 {cs['failures']} 次"
+        rs = self.registry.stats()
+        info += (f"\n课程 {rs['loaded']}/{rs['installed']} 门已加载，约 {rs['bytes'] / (1 << 20):.0f} MB，"
+                 f"淘汰 {rs['evictions']} 次")
+        if not self.timings.enabled:
+            info += "\n⚠️ 耗时记录未开启，勾选“记录耗时”后操作一遍再刷新"
+        self.diag_info.config(text=info)
+
+        self.diag_tree.delete(*self.diag_tree.get_children())
+        for name, st in sorted(self.timings.summary().items()):
+            self.diag_tree.insert("", tk.END, text=name, values=[st['count']] + [
+                f"{st[k]:.1f}" for k in ('avg_ms', 'p50_ms', 'p95_ms', 'max_ms', 'last_ms')])
+
+        self.diag_recent.delete(1.0, tk.END)
+        for e in reversed(self.timings.recent(50)):
+            extra = " ".join(f"{k}={v}" for k, v in e.items() if k not in ('name', 'time', 'ms'))
+            stamp = time.strftime('%H:%M:%S', time.localtime(e['time']))
+            self.diag_recent.insert(tk.END, f"{stamp}  {e['name']:<24} {e['ms']:>9.1f} ms  {extra}\n")
 
     def save_settings(self):
         for key in ['api_key', 'api_url', 'model']:
             self.config[key] = self.settings_entries[key].get().strip()
         self.config['enable_reasoning'] = self.reasoning_var.get()
+        self.config['stream'] = self.stream_var.get()
+        self.config['ai_prefetch'] = self.prefetch_var.get()
         if not self.config['api_key']:
             messagebox.showwarning("提示", "API密钥不能为空！")
             return
@@ -295,11 +732,12 @@ class FinanceApp:
 
         def test():
             try:
-                r = requests.post(self.config['api_url'], json={"model": self.config['model'],
-                                                                "messages": [{"role": "user", "content": "你好"}],
-                                                                "max_tokens": 10},
-                                  headers={"Authorization": f"Bearer {self.config['api_key']}",
-                                           "Content-Type": "application/json"}, timeout=10)
+                r = self.ai_client.post(self.config['api_url'], {"model": self.config['model'],
+                                                                 "messages": [{"role": "user", "content": "你好"}],
+                                                                 "max_tokens": 10},
+                                        headers={"Authorization": f"Bearer {self.config['api_key']}",
+                                                 "Content-Type": "application/json"},
+                                        timeout=(self.config['ai_connect_timeout'], 10))
                 msg = ("✅ 连接成功！\n模型响应正常", self.COLORS['success']) if r.status_code == 200 else (
                 f"❌ 连接失败\n状态码: {r.status_code}", self.COLORS['danger'])
             except Exception as e:
@@ -321,8 +759,19 @@ class FinanceApp:
         self.search_entry = ttk.Entry(search_box, font=self.FONTS['medium'])
         self.search_entry.pack(side="left", fill="x", expand=True, ipady=4)
         self.search_entry.bind("<Return>", lambda e: self.exec_search())
+        self.search_entry.bind("<KeyRelease>", self._schedule_search)
+        self.search_entry.focus()
         tk.Button(search_box, text="搜索", command=self.exec_search, bg="#40a9ff", fg="white", width=8).pack(
             side="left", padx=5)
+        self.search_all_var = tk.BooleanVar(value=False)
+        if len(self.registry.courses) > 1:
+            tk.Checkbutton(search_box, text="全部已加载课程", variable=self.search_all_var, bg=self.COLORS['bg'],
+                           command=self._research).pack(side="left")
+
+        self.search_status = tk.Label(content, text="", font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#999")
+        self.search_status.pack(anchor="w")
+        self.search_kw = None
+        self.search_gen += 1
 
         self.search_res = tk.Text(content, font=self.FONTS['normal'], wrap="word", padx=15, pady=15)
         self.search_res.pack(fill="both", expand=True, pady=10)
@@ -331,15 +780,71 @@ class FinanceApp:
         tk.Button(content, text="🤖 AI 解析选中或第一题", command=lambda: self.start_ai_flow(self.search_res),
                   bg=self.COLORS['success'], fg="white", font=self.FONTS['medium'], pady=10).pack(fill="x")
 
+    def _schedule_search(self, event=None):
+        """边输边搜：停止输入 SEARCH_DEBOUNCE_MS 毫秒后才发起检索"""
+        if self.search_entry.get().strip() == self.search_kw:
+            return
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(self.SEARCH_DEBOUNCE_MS, self.exec_search)
+
+    def _research(self):
+        self.search_kw = None
+        self.exec_search()
+
     def exec_search(self):
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+            self.search_after_id = None
+        if not self.search_entry.winfo_exists():
+            return
         kw = self.search_entry.get().strip()
-        self.search_res.delete(1.0, tk.END)
+        self.search_kw = kw
+        self.search_gen += 1
         if not kw:
+            self.search_res.delete(1.0, tk.END)
+            self.search_status.config(text="")
             return
-        res = [q for q in self.questions if kw in q] or get_close_matches(kw, self.questions, n=3, cutoff=0.2)
-        for q in res:
-            self.search_res.insert(tk.END, f"【题目】：{q}\n", "q_tag")
-            self.search_res.insert(tk.END, f"【答案】：{self.quiz_dict[q]}\n{'-' * 50}\n")
+        self.search_status.config(text="检索中...")
+        source = self.registry if self.search_all_var.get() else self.library
+        threading.Thread(target=self._search_worker, args=(self.search_gen, kw, source), daemon=True).start()
+
+    def _search_worker(self, gen, kw, source):
+        """后台线程执行检索，被更新的输入取代时提前放弃；source 为当前题库或课程注册表（跨课程检索）"""
+        def cancelled():
+            return gen != self.search_gen
+
+        start = time.perf_counter()
+        total, hits = source.search(kw, cancelled, limit=self.SEARCH_RENDER_LIMIT,
+                                    k=self.config['fuzzy_top_k'], min_score=self.config['fuzzy_min_score'])
+        if cancelled():
+            return
+        self.timings.record('exec_search', time.perf_counter() - start, kw_len=len(kw), results=total,
+                            courses=len(self.registry.loaded()) if source is self.registry else 1)
+        self.root.after(0, lambda: self._show_search_result(gen, kw, total, hits))
+
+    def _show_search_result(self, gen, kw, total, hits):
+        # 只渲染最新一次检索的结果，且界面可能已经切走
+        if gen != self.search_gen or not self.search_res.winfo_exists():
+            return
+        self.search_res.delete(1.0, tk.END)
+        bank_names = {'main': '题库', 'choice': '选择题', 'fill': '填空题', 'judge': '判断题'}
+        for hit in hits:
+            self.search_res.insert(tk.END, f"【题目】：{hit['stem']}\n", "q_tag")
+            for label, text in hit['options']:
+                self.search_res.insert(tk.END, f"  {label}. {text}\n")
+            parts = [self.registry.courses[hit['course']].name] if 'course' in hit else []
+            if hit['score'] is not None:
+                parts += [bank_names[hit['bank']], f"相似度 {hit['score']:.2f}"]
+            note = f"　（{' · '.join(parts)}）" if parts else ""
+            self.search_res.insert(tk.END, f"【答案】：{hit['answer']}{note}\n{'-' * 50}\n")
+        if hits and hits[0]['score'] is not None:
+            status = f"没有完全包含“{kw}”的题目，以下为最相似的 {total} 条"
+        else:
+            status = f"共找到 {total} 条结果"
+            if total > len(hits):
+                status += f"，仅显示前 {len(hits)} 条，请输入更多关键词"
+        self.search_status.config(text=status if hits else f"未找到与“{kw}”相关的题目")
 
     # ================= 刷题菜单 =================
     def show_practice_menu(self):
@@ -353,8 +858,22 @@ class FinanceApp:
         btn_s = {"font": ("微软雅黑", 11, "bold"), "width": 22, "pady": 10, "relief": "flat"}
         tk.Button(frame, text="🎲 随机挑战 (15题)", command=self.show_type_select,
                   bg=self.COLORS['purple'], fg="white", **btn_s).pack(pady=10)
+        total = sum(self.config['exam_quota'].values())
+        tk.Button(frame, text=f"📝 模拟考试 (混合{total}题)", command=lambda: self.start_mixed_exam(seed_var.get()),
+                  bg=self.COLORS['primary'], fg="white", **btn_s).pack(pady=10)
         tk.Button(frame, text="⚙️ 自定义选题", command=self.show_custom_select,
                   bg=self.COLORS['warning'], fg="white", **btn_s).pack(pady=10)
+        scheduler = self.answer_journal().scheduler
+        tk.Button(frame, text=f"📕 错题复习 ({scheduler.due_count()}/{len(scheduler)}题到期)", command=self.start_review,
+                  bg=self.COLORS['danger'], fg="white", **btn_s).pack(pady=10)
+
+        # 填入试卷种子可以重新抽出同一张试卷（题库和出题历史相同时）
+        seed_row = tk.Frame(frame, bg=self.COLORS['bg'])
+        seed_row.pack(pady=5)
+        tk.Label(seed_row, text="试卷种子（留空随机）：", font=self.FONTS['tiny'], bg=self.COLORS['bg'],
+                 fg="#999").pack(side="left")
+        seed_var = tk.StringVar(value="")
+        ttk.Entry(seed_row, textvariable=seed_var, width=12).pack(side="left")
 
     def show_type_select(self):
         self.clear_screen()
@@ -378,117 +897,287 @@ class FinanceApp:
 
     # ================= 统一考试逻辑 =================
     def start_typed_exam(self, exam_type):
-        questions = self.categorized.get(exam_type, [])
-        if not questions:
+        bank = self.categorized.get(exam_type, [])
+        if not bank:
             messagebox.showwarning("提示", f"{exam_type}题库为空！")
             return
+        self._start_exam(exam_type, {exam_type: 15})
+
+    def start_mixed_exam(self, seed_text=""):
+        """按 exam_quota 配置的各题型题数混合组卷"""
+        seed_text = seed_text.strip()
+        if seed_text and not seed_text.isdigit():
+            messagebox.showwarning("提示", "试卷种子须为非负整数！")
+            return
+        quota = {name: n for name, n in self.config['exam_quota'].items() if n > 0}
+        if not any(self.categorized.get(name.split('.')[0]) for name in quota):
+            messagebox.showwarning("提示", "分类题库为空！")
+            return
+        self._start_exam('mixed', quota, int(seed_text) if seed_text else None)
+
+    def _start_exam(self, exam_type, quota, seed=None):
+        """组卷并进入答题界面；本场考试使用开始时的题库，热更新后题号和判分仍然对应"""
+        history = self.exam_history()
+        try:
+            paper = self.library.exam_generator().generate(quota, seed=seed, history=history)
+        except ValueError as e:
+            messagebox.showerror("组卷失败", f"exam_quota 配置有误：{e}")
+            return
+        if not paper['questions']:
+            messagebox.showwarning("提示", "题库为空！")
+            return
+        history.add(self.library, paper['questions'])
+        self.save_exam_history()
+        self._begin_exam(exam_type, paper['questions'], paper['seed'])
+
+    def _begin_exam(self, exam_type, questions, seed=None):
         self.exam_state = {
-            'type': exam_type,
-            'questions': random.sample(questions, min(15, len(questions))),
+            'type': exam_type,  # choice / fill / judge，混合试卷为 mixed，错题复习为 review
+            'library': self.library,
+            'questions': questions,  # [(题库, 题库内的下标)]
+            'seed': seed,
             'index': 0,
             'score': 0
         }
+        self._start_prefetch()
         self.render_typed_page()
 
+    def start_review(self):
+        """错题复习：按到期先后取至多 15 道到期的错题。有分类题时进入答题界面，只剩主题库的题时进入自定义练习界面；
+        已从题库中删除的题跳过"""
+        scheduler = self.answer_journal().scheduler
+        typed, main = [], []
+        for bank, stem in scheduler.due(n=len(scheduler)):
+            if bank == 'main':
+                if stem in self.quiz_dict:
+                    main.append(stem)
+            elif bank in self.categorized:
+                pos = self.library.position(bank, stem)
+                if pos is not None:
+                    typed.append((bank, pos))
+            if len(typed) >= 15:
+                break
+        if typed:
+            self._begin_exam('review', typed)
+        elif main:
+            self.custom_library = self.library
+            self.custom_exam_qs = main[:15]
+            self.custom_idx = 0
+            self.render_custom_exam_page()
+        else:
+            messagebox.showinfo("提示", "暂无到期的错题，继续保持！")
+
+    def _start_prefetch(self):
+        """开启预取时，为本次考试的题目在后台提前请求 AI 解析"""
+        self._stop_prefetch()
+        if not self.config.get('ai_prefetch') or not self.config.get('api_key'):
+            return
+        # 与 show_result_popup 打开解析时使用的 (题干, 参考答案) 保持一致，才能命中缓存
+        banks = self.exam_state['library'].categorized
+        items = [(banks[key].stem(i), banks[key].answer(i)) for key, i in self.exam_state['questions']]
+        self.prefetcher = AIPrefetcher(items, self._prefetch_explanation,
+                                       workers=self.config['ai_prefetch_workers'],
+                                       budget=self.config['ai_prefetch_budget'])
+
+    def _stop_prefetch(self):
+        if self.prefetcher:
+            self.prefetcher.cancel()
+            self.prefetcher = None
+
+    def _prefetch_explanation(self, q, a):
+        if self.ai_cache.has(self._ai_cache_key(q, a)):
+            return None
+        return self.submit_explanation(q, a)
+
+    def _leave_typed_exam(self):
+        self._stop_prefetch()
+        if self.exam_state['type'] in ('mixed', 'review'):
+            self.show_practice_menu()
+        else:
+            self.show_type_select()
+
     def render_typed_page(self):
-        self.clear_screen()
+        start = time.perf_counter()
         state = self.exam_state
-        q_data = state['questions'][state['index']]
-        exam_type = state['type']
+        exam_type, qid = state['questions'][state['index']]
+        if self.prefetcher:
+            self.prefetcher.focus(state['index'])
+
+        # 弹窗期间已算好的下一题布局直接使用
+        prepared = state.pop('next_layout', None)
+        layout = prepared[1] if prepared and prepared[0] == state['index'] else self._typed_layout(
+            exam_type, state['library'].categorized[exam_type], qid)
+
+        view = self.exam_views.get(exam_type)
+        kind = 'update' if view else 'build'
+        if view is None:
+            view = self.exam_views[exam_type] = self._build_typed_view(exam_type)
+        self.clear_screen()
+        view['root'].pack(fill="both", expand=True)
 
-        # 颜色配置
-        colors = {'choice': self.COLORS['choice'], 'fill': self.COLORS['fill'], 'judge': self.COLORS['judge']}
+        progress = f"进度：{state['index'] + 1} / {len(state['questions'])} | 得分：{state['score']}"
+        if state['type'] == 'mixed':
+            progress += f" | 试卷种子：{state['seed']}"
+        view['progress'].config(text=progress)
+        view['type_label'].config(text=layout['type_text'], fg=layout['type_color'])
+        view['stem'].config(text=layout['stem'])
+        if exam_type == 'choice':
+            self._update_choice_options(view, layout)
+        elif exam_type == 'fill':
+            self._update_fill_input(view, layout)
+        else:
+            self.judge_var.set("")
+
+        self.main_container.update_idletasks()
+        self._record_render_time(view, 'render_typed_page', kind, start)
+
+    def _typed_layout(self, exam_type, bank, qid):
+        """计算一道题要显示的文字和可见选项，不涉及控件"""
         type_colors = {'choice': self.COLORS['primary'], 'fill': self.COLORS['success'],
                        'judge': self.COLORS['warning']}
         type_names = {'choice': '选择题', 'fill': '填空题', 'judge': '判断题'}
+        q_type_str = bank.qtype(qid) if exam_type == 'choice' else type_names[exam_type]
+        is_multi = '多选' in q_type_str
+        layout = {
+            'type_text': f"【{q_type_str}】",
+            'type_color': self.COLORS['danger'] if is_multi else type_colors[exam_type],
+            'stem': bank.stem(qid),
+            'multi': is_multi
+        }
+        if exam_type == 'choice':
+            layout['options'] = tuple((key, f"{key}. {text}") for key, text in bank.options(qid))
+            layout['hint'] = "💡 多选题请选择所有正确选项" if is_multi else "💡 单选题请选择一个正确选项"
+        elif exam_type == 'fill':
+            layout['blanks'] = len(bank.answer(qid).split('|'))
+        return layout
+
+    def _prepare_next_layout(self):
+        """答题结果弹窗打开期间，提前算好下一题的布局"""
+        state = self.exam_state
+        index = state['index'] + 1
+        if index < len(state['questions']):
+            exam_type, qid = state['questions'][index]
+            state['next_layout'] = (index, self._typed_layout(exam_type, state['library'].categorized[exam_type], qid))
+
+    def _record_render_time(self, view, name, kind, start):
+        """记录每题渲染耗时：build 为首次创建整个界面，update 为复用控件只改内容"""
+        ms = (time.perf_counter() - start) * 1000
+        self.render_times.append((kind, ms))
+        self.timings.record(name, ms / 1000, kind=kind)
+        builds = [t for k, t in self.render_times if k == 'build']
+        updates = [t for k, t in self.render_times if k == 'update']
+        text = f"本题渲染 {ms:.1f} ms"
+        if builds and updates:
+            text += f"（新建界面平均 {sum(builds) / len(builds):.1f} ms，复用平均 {sum(updates) / len(updates):.1f} ms）"
+        view['render'].config(text=text)
+
+    def _current_typed_question(self):
+        return self.exam_state['questions'][self.exam_state['index']][1]
+
+    def _build_typed_view(self, exam_type):
+        """每种题型的答题界面只创建一次，之后每道题只更新文字、变量和可见性"""
+        colors = {'choice': self.COLORS['choice'], 'fill': self.COLORS['fill'], 'judge': self.COLORS['judge']}
+        type_colors = {'choice': self.COLORS['primary'], 'fill': self.COLORS['success'],
+                       'judge': self.COLORS['warning']}
+        view = {'root': tk.Frame(self.main_container, bg=self.COLORS['bg'])}
 
         # 导航栏
-        nav = tk.Frame(self.main_container, bg=colors[exam_type], height=40)
+        nav = tk.Frame(view['root'], bg=colors[exam_type], height=40)
         nav.pack(fill="x")
-        tk.Button(nav, text="← 退出练习", command=self.show_type_select,
+        tk.Button(nav, text="← 退出练习", command=self._leave_typed_exam,
                   bg=self.COLORS['danger'], fg="white", relief="flat").pack(side="left", padx=10, pady=5)
-        progress = f"进度：{state['index'] + 1} / {len(state['questions'])} | 得分：{state['score']}"
-        tk.Label(nav, text=progress, bg=colors[exam_type], font=self.FONTS['small']).pack(side="right", padx=10)
+        view['progress'] = tk.Label(nav, bg=colors[exam_type], font=self.FONTS['small'])
+        view['progress'].pack(side="right", padx=10)
 
         # 内容区域
-        content = tk.Frame(self.main_container, bg=self.COLORS['bg'], padx=30, pady=20)
+        content = tk.Frame(view['root'], bg=self.COLORS['bg'], padx=30, pady=20)
         content.pack(fill="both", expand=True)
 
         # 题型标签
-        q_type_str = str(q_data.get('type', '单选题')) if exam_type == 'choice' else type_names[exam_type]
-        is_multi = '多选' in q_type_str
-        label_color = self.COLORS['danger'] if is_multi else type_colors[exam_type]
-        tk.Label(content, text=f"【{q_type_str}】", font=("微软雅黑", 11, "bold"),
-                 bg=self.COLORS['bg'], fg=label_color).pack(anchor="w")
+        view['type_label'] = tk.Label(content, font=("微软雅黑", 11, "bold"), bg=self.COLORS['bg'])
+        view['type_label'].pack(anchor="w")
 
         # 题目卡片
-        self.create_question_card(content, q_data['stem'])
+        card = self.create_question_card(content, "")
+        view['stem'] = card.winfo_children()[0]
 
-        # 根据题型渲染选项
+        # 根据题型创建选项
         if exam_type == 'choice':
-            self._render_choice_options(content, q_data, is_multi)
+            self._build_choice_options(content, view)
         elif exam_type == 'fill':
-            self._render_fill_input(content, q_data)
+            self._build_fill_input(content, view)
         else:
-            self._render_judge_options(content)
+            self._build_judge_options(content)
 
         # 提交按钮
         btn_frame = tk.Frame(content, bg=self.COLORS['bg'])
         btn_frame.pack(pady=20)
-        tk.Button(btn_frame, text="✅ 提交答案", command=lambda: self.submit_typed_answer(q_data),
+        tk.Button(btn_frame, text="✅ 提交答案", command=lambda: self.submit_typed_answer(self._current_typed_question()),
                   bg=type_colors[exam_type], fg="white", font=self.FONTS['medium'],
                   width=15, pady=10, cursor="hand2").pack()
 
-    def _render_choice_options(self, parent, q_data, is_multi):
-        """渲染选择题选项"""
+        view['render'] = tk.Label(content, font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#bbb")
+        view['render'].pack(anchor="e")
+        return view
+
+    def _build_choice_options(self, parent, view):
+        """创建选择题的四个选项行，每行同时备好单选和多选控件"""
         options_frame = tk.Frame(parent, bg=self.COLORS['bg'], pady=10)
         options_frame.pack(fill="x")
 
-        if is_multi:
-            self.choice_vars = {}
-            for key in ['A', 'B', 'C', 'D']:
-                opt = q_data.get(key, '')
-                if opt and str(opt).strip() and str(opt) != 'nan':
-                    var = tk.BooleanVar(value=False)
-                    self.choice_vars[key] = var
-                    opt_frame = tk.Frame(options_frame, bg="white", pady=8, padx=15)
-                    opt_frame.pack(fill="x", pady=5)
-                    tk.Checkbutton(opt_frame, text=f"{key}. {opt}", variable=var,
-                                   font=self.FONTS['normal'], bg="white",
-                                   activebackground="#e6f7ff", anchor="w", cursor="hand2").pack(fill="x", anchor="w")
-            hint = "💡 多选题请选择所有正确选项"
-        else:
-            self.choice_var = tk.StringVar(value="")
-            for key in ['A', 'B', 'C', 'D']:
-                opt = q_data.get(key, '')
-                if opt and str(opt).strip() and str(opt) != 'nan':
-                    opt_frame = tk.Frame(options_frame, bg="white", pady=8, padx=15)
-                    opt_frame.pack(fill="x", pady=5)
-                    tk.Radiobutton(opt_frame, text=f"{key}. {opt}", variable=self.choice_var,
-                                   value=key, font=self.FONTS['normal'], bg="white",
-                                   activebackground="#e6f7ff", anchor="w", cursor="hand2").pack(fill="x", anchor="w")
-            hint = "💡 单选题请选择一个正确选项"
-
-        tk.Label(parent, text=hint, font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#999").pack(anchor="w", pady=10)
-
-    def _render_fill_input(self, parent, q_data):
-        """渲染填空题输入"""
-        answer_str = str(q_data.get('answer', ''))
-        num_blanks = len(answer_str.split('|'))
-
-        tk.Label(parent, text=f"请填写答案（共{num_blanks}个空，用 | 分隔多个答案）：",
-                 bg=self.COLORS['bg'], font=self.FONTS['small']).pack(anchor="w", pady=(20, 5))
+        self.choice_var = tk.StringVar(value="")
+        view['options'] = {}
+        for key in ['A', 'B', 'C', 'D']:
+            opt_frame = tk.Frame(options_frame, bg="white", pady=8, padx=15)
+            var = tk.BooleanVar(value=False)
+            radio = tk.Radiobutton(opt_frame, variable=self.choice_var, value=key, font=self.FONTS['normal'],
+                                   bg="white", activebackground="#e6f7ff", anchor="w", cursor="hand2")
+            check = tk.Checkbutton(opt_frame, variable=var, font=self.FONTS['normal'], bg="white",
+                                   activebackground="#e6f7ff", anchor="w", cursor="hand2")
+            view['options'][key] = (opt_frame, radio, check, var)
+        view['shown'] = (None, ())  # 当前显示的 (是否多选, 选项)，不变时不重新排布
+
+        view['hint'] = tk.Label(parent, font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#999")
+        view['hint'].pack(anchor="w", pady=10)
+
+    def _update_choice_options(self, view, layout):
+        """更新选择题选项的文字和可见性"""
+        self.choice_var.set("")
+        for _, _, _, var in view['options'].values():
+            var.set(False)
+        is_multi, keys = layout['multi'], tuple(key for key, _ in layout['options'])
+        if view['shown'] != (is_multi, keys):
+            for opt_frame, radio, check, _ in view['options'].values():
+                opt_frame.pack_forget()
+                (radio if is_multi else check).pack_forget()
+                (check if is_multi else radio).pack(fill="x", anchor="w")
+            for key in keys:
+                view['options'][key][0].pack(fill="x", pady=5)
+            view['shown'] = (is_multi, keys)
+        for key, text in layout['options']:
+            view['options'][key][2 if is_multi else 1].config(text=text)
+        self.choice_vars = {key: view['options'][key][3] for key in keys}
+        view['hint'].config(text=layout['hint'])
+
+    def _build_fill_input(self, parent, view):
+        """创建填空题输入"""
+        view['blanks'] = tk.Label(parent, bg=self.COLORS['bg'], font=self.FONTS['small'])
+        view['blanks'].pack(anchor="w", pady=(20, 5))
 
         self.fill_entry = ttk.Entry(parent, font=self.FONTS['medium'])
         self.fill_entry.pack(fill="x", pady=10, ipady=8)
-        self.fill_entry.focus()
-        self.fill_entry.bind("<Return>", lambda e: self.submit_typed_answer(q_data))
+        self.fill_entry.bind("<Return>", lambda e: self.submit_typed_answer(self._current_typed_question()))
 
         tk.Label(parent, text="💡 多个空请用 | 分隔，如：答案1 | 答案2",
                  font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#999").pack(anchor="w", pady=5)
 
-    def _render_judge_options(self, parent):
-        """渲染判断题选项"""
+    def _update_fill_input(self, view, layout):
+        view['blanks'].config(text=f"请填写答案（共{layout['blanks']}个空，用 | 分隔多个答案）：")
+        self.fill_entry.delete(0, tk.END)
+        self.fill_entry.focus()
+
+    def _build_judge_options(self, parent):
+        """创建判断题选项"""
         options_frame = tk.Frame(parent, bg=self.COLORS['bg'], pady=20)
         options_frame.pack(fill="x")
 
@@ -502,53 +1191,40 @@ class FinanceApp:
                            font=("微软雅黑", 14, "bold"), bg=bg_color,
                            activebackground=active_bg, cursor="hand2").pack()
 
-    def submit_typed_answer(self, q_data):
+    def submit_typed_answer(self, qid):
         """统一提交答案处理"""
-        exam_type = self.exam_state['type']
-        correct_answer = str(q_data.get('answer', '')).strip()
+        exam_type = self.exam_state['questions'][self.exam_state['index']][0]
+        bank = self.exam_state['library'].categorized[exam_type]
+        correct_answer = bank.answer(qid)
 
-        # 获取用户答案并判断正确性
+        # 获取用户答案
         if exam_type == 'choice':
-            q_type_str = str(q_data.get('type', '单选题'))
+            q_type_str = bank.qtype(qid)
             is_multi = '多选' in q_type_str
             if is_multi:
                 selected = [k for k, v in self.choice_vars.items() if v.get()]
                 user_answer = ''.join(sorted(selected))
             else:
                 user_answer = self.choice_var.get().upper()
-
-            if not user_answer:
-                messagebox.showwarning("提示", "请先选择答案！")
-                return
-
-            correct_set = set(correct_answer.upper().replace(',', '').replace(' ', ''))
-            user_set = set(user_answer)
-            is_correct = (user_set == correct_set)
-
         elif exam_type == 'fill':
             user_answer = self.fill_entry.get().strip()
-            if not user_answer:
-                messagebox.showwarning("提示", "请先填写答案！")
-                return
-
-            user_parts = [p.strip().lower() for p in user_answer.split('|')]
-            correct_parts = [p.strip().lower() for p in correct_answer.split('|')]
-            matched = sum(1 for u in user_parts if any(u in c or c in u for c in correct_parts))
-            is_correct = matched >= len(correct_parts) * 0.8
-
         else:  # judge
             user_answer = self.judge_var.get()
-            if not user_answer:
-                messagebox.showwarning("提示", "请先选择答案！")
-                return
-            is_correct = (user_answer == correct_answer)
+        if not user_answer:
+            messagebox.showwarning("提示", "请先填写答案！" if exam_type == 'fill' else "请先选择答案！")
+            return
+
+        # 判分
+        is_correct = self.exam_state['library'].grade(exam_type, qid, user_answer)
+        self.answer_journal().record(exam_type, bank.stem(qid), is_correct)
 
         # 更新分数
         if is_correct:
             self.exam_state['score'] += 1
 
-        # 显示结果弹窗
-        self.show_result_popup(is_correct, user_answer, correct_answer, q_data['stem'], self._go_next_question)
+        # 显示结果弹窗，弹窗打开期间提前算好下一题的布局
+        self.show_result_popup(is_correct, user_answer, correct_answer, bank.stem(qid), self._go_next_question)
+        self.root.after_idle(self._prepare_next_layout)
 
     def _go_next_question(self):
         """进入下一题或显示总结"""
@@ -561,24 +1237,31 @@ class FinanceApp:
 
     def _show_typed_summary(self):
         """显示答题总结"""
+        self._stop_prefetch()
         state = self.exam_state
         exam_type = state['type']
 
-        colors = {'choice': self.COLORS['choice'], 'fill': self.COLORS['fill'], 'judge': self.COLORS['judge']}
-        titles = {'choice': '选择题', 'fill': '填空题', 'judge': '判断题'}
+        colors = {'choice': self.COLORS['choice'], 'fill': self.COLORS['fill'], 'judge': self.COLORS['judge'],
+                  'mixed': self.COLORS['purple'], 'review': self.COLORS['danger']}
+        titles = {'choice': '选择题', 'fill': '填空题', 'judge': '判断题', 'mixed': '模拟考试', 'review': '错题复习'}
+        retry = {'mixed': lambda: self.start_mixed_exam(), 'review': self.start_review}
+        from_practice = exam_type in retry  # 混合试卷和错题复习从练习菜单进入
 
         self.show_summary(
             title=titles[exam_type],
             color=colors[exam_type],
             total=len(state['questions']),
             score=state['score'],
-            retry_cmd=lambda: self.start_typed_exam(exam_type),
-            back_cmd=self.show_type_select
+            retry_cmd=retry[exam_type] if from_practice else (lambda: self.start_typed_exam(exam_type)),
+            back_cmd=self.show_practice_menu if from_practice else self.show_type_select
         )
 
     # ================= 自定义选题 =================
     def show_custom_select(self):
+        start = time.perf_counter()
         self.clear_screen()
+        # 选题和练习期间使用进入时的题库，热更新不影响列表下标和答案
+        self.custom_library = self.library
         nav = tk.Frame(self.main_container, bg=self.COLORS['judge'], height=40)
         nav.pack(fill="x")
         tk.Button(nav, text="← 返回", command=self.show_practice_menu,
@@ -587,34 +1270,53 @@ class FinanceApp:
         tk.Label(self.main_container, text="请勾选想练习的题目：",
                  font=self.FONTS['medium'], bg=self.COLORS['bg']).pack(pady=10)
 
-        # 滚动列表
-        list_container = tk.Frame(self.main_container, padx=20)
-        list_container.pack(fill="both", expand=True)
-
-        canvas = tk.Canvas(list_container, bg="white")
-        scroll_y = ttk.Scrollbar(list_container, orient="vertical", command=canvas.yview)
-        scroll_frame = tk.Frame(canvas, bg="white")
-
-        scroll_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-        canvas.create_window((0, 0), window=scroll_frame, anchor="nw")
-        canvas.configure(yscrollcommand=scroll_y.set)
-
-        self.custom_vars = {}
-        for q in self.questions:
-            v = tk.BooleanVar()
-            self.custom_vars[q] = v
-            tk.Checkbutton(scroll_frame, text=q[:90] + "..." if len(q) > 90 else q,
-                           variable=v, bg="white", font=self.FONTS['tiny']).pack(anchor="w", pady=2)
-
-        canvas.pack(side="left", fill="both", expand=True)
-        scroll_y.pack(side="right", fill="y")
+        # 关键词过滤
+        filter_box = tk.Frame(self.main_container, bg=self.COLORS['bg'], padx=20)
+        filter_box.pack(fill="x", pady=(0, 5))
+        self.custom_filter = ttk.Entry(filter_box, font=self.FONTS['small'])
+        self.custom_filter.pack(side="left", fill="x", expand=True, ipady=3)
+        self.custom_filter.bind("<KeyRelease>", self._schedule_custom_filter)
+        self.custom_filter_kw = ""
+        self.custom_filter_after_id = None
+        tk.Button(filter_box, text="全选匹配", command=lambda: self.custom_list.check_all(self.custom_list.view),
+                  bg=self.COLORS['primary'], fg="white", relief="flat").pack(side="left", padx=5)
+        tk.Button(filter_box, text="清空勾选", command=lambda: self.custom_list.clear_checked(),
+                  bg=self.COLORS['danger'], fg="white", relief="flat").pack(side="left")
+        self.custom_status = tk.Label(self.main_container, text="", font=self.FONTS['tiny'],
+                                      bg=self.COLORS['bg'], fg="#999")
+        self.custom_status.pack(anchor="w", padx=20)
+
+        # 虚拟化滚动列表：无论题库多大，只创建可见的几十行控件
+        self.custom_list = VirtualCheckList(self.main_container, self.custom_library.questions, self.FONTS['tiny'],
+                                            on_change=self._update_custom_status, bg="white")
+        self.custom_list.pack(fill="both", expand=True, padx=20)
 
         tk.Button(self.main_container, text="开始练习所选题目", command=self.start_custom_practice,
                   bg=self.COLORS['success'], fg="white", font=self.FONTS['medium'], pady=12).pack(fill="x", padx=20,
                                                                                                   pady=15)
+        self.timings.record('show_custom_select', time.perf_counter() - start, questions=len(self.questions))
+
+    def _schedule_custom_filter(self, event=None):
+        if self.custom_filter_after_id:
+            self.root.after_cancel(self.custom_filter_after_id)
+        self.custom_filter_after_id = self.root.after(self.SEARCH_DEBOUNCE_MS, self._apply_custom_filter)
+
+    def _apply_custom_filter(self):
+        self.custom_filter_after_id = None
+        if not self.custom_filter.winfo_exists():
+            return
+        kw = self.custom_filter.get().strip()
+        if kw == self.custom_filter_kw:
+            return
+        self.custom_filter_kw = kw
+        library = self.custom_library
+        self.custom_list.set_view(library.search_index.search_ids(kw) if kw else range(len(library.questions)))
+
+    def _update_custom_status(self):
+        self.custom_status.config(text=f"匹配 {len(self.custom_list.view)} 题 | 已选 {len(self.custom_list.checked)} 题")
 
     def start_custom_practice(self):
-        selected = [q for q, v in self.custom_vars.items() if v.get()]
+        selected = [self.custom_library.questions[i] for i in sorted(self.custom_list.checked)]
         if not selected:
             messagebox.showwarning("提示", "请先勾选题目！")
             return
@@ -623,32 +1325,56 @@ class FinanceApp:
         self.render_custom_exam_page()
 
     def render_custom_exam_page(self):
-        self.clear_screen()
+        start = time.perf_counter()
         q_text = self.custom_exam_qs[self.custom_idx]
 
-        tk.Label(self.main_container, text=f"进度：{self.custom_idx + 1} / {len(self.custom_exam_qs)}",
-                 bg=self.COLORS['bg'], fg="#999").pack(pady=5)
+        view = self.exam_views.get('custom')
+        kind = 'update' if view else 'build'
+        if view is None:
+            view = self.exam_views['custom'] = self._build_custom_view()
+        self.clear_screen()
+        view['root'].pack(fill="both", expand=True)
+
+        view['progress'].config(text=f"进度：{self.custom_idx + 1} / {len(self.custom_exam_qs)}")
+        view['stem'].config(text=q_text)
+        self.custom_entry.delete(0, tk.END)
+        self.custom_entry.focus()
+
+        self.main_container.update_idletasks()
+        self._record_render_time(view, 'render_custom_exam_page', kind, start)
+
+    def _build_custom_view(self):
+        """自定义练习界面只创建一次，换题时只更新进度、题干并清空输入"""
+        view = {'root': tk.Frame(self.main_container, bg=self.COLORS['bg'])}
+        view['progress'] = tk.Label(view['root'], bg=self.COLORS['bg'], fg="#999")
+        view['progress'].pack(pady=5)
 
-        self.create_question_card(self.main_container, q_text)
+        card = self.create_question_card(view['root'], "")
+        view['stem'] = card.winfo_children()[0]
 
-        tk.Label(self.main_container, text="请输入答案：", bg=self.COLORS['bg'],
+        tk.Label(view['root'], text="请输入答案：", bg=self.COLORS['bg'],
                  font=self.FONTS['small']).pack(anchor="w", padx=35, pady=(20, 0))
-        self.custom_entry = ttk.Entry(self.main_container, font=self.FONTS['medium'])
+        self.custom_entry = ttk.Entry(view['root'], font=self.FONTS['medium'])
         self.custom_entry.pack(fill="x", padx=35, pady=10, ipady=5)
-        self.custom_entry.focus()
 
-        ctrl_box = tk.Frame(self.main_container, bg=self.COLORS['bg'])
+        ctrl_box = tk.Frame(view['root'], bg=self.COLORS['bg'])
         ctrl_box.pack(pady=20)
-        tk.Button(ctrl_box, text="提交并看解析", command=lambda: self.judge_custom_answer(q_text),
+        tk.Button(ctrl_box, text="提交并看解析",
+                  command=lambda: self.judge_custom_answer(self.custom_exam_qs[self.custom_idx]),
                   bg=self.COLORS['primary'], fg="white", font=self.FONTS['small'], width=15, pady=8).pack(side="left",
                                                                                                           padx=10)
         tk.Button(ctrl_box, text="退出练习", command=self.show_practice_menu,
                   bg=self.COLORS['danger'], fg="white", font=self.FONTS['small'], width=10).pack(side="left", padx=10)
 
+        view['render'] = tk.Label(view['root'], font=self.FONTS['tiny'], bg=self.COLORS['bg'], fg="#bbb")
+        view['render'].pack(anchor="e", padx=35)
+        return view
+
     def judge_custom_answer(self, q):
         u_ans = self.custom_entry.get().strip()
-        t_ans = self.quiz_dict.get(q, "")
-        is_ok = u_ans.lower() in t_ans.lower() if u_ans else False
+        t_ans = self.custom_library.quiz_dict.get(q, "")
+        is_ok = self.custom_library.grade('main', None, u_ans, stem=q)
+        self.answer_journal().record('main', q, is_ok)
 
         pop = tk.Toplevel(self.root)
         pop.title("结果判定")
@@ -696,10 +1422,17 @@ class FinanceApp:
         if not q or len(q) < 2:
             messagebox.showwarning("提示", "请选中题目文字后再点击解析！")
             return
-        self.open_ai_win(q, self.quiz_dict.get(q, "本地库无对应答案"))
+        # 选中文字多了空白、只选了一部分或题目只在分类题库中时，也能找到对应的题；找到时用完整题干请求解析
+        entry, _ = self.library.lookup(q)
+        if entry is None:
+            self.open_ai_win(q, "本地库无对应答案")
+        else:
+            self.open_ai_win(entry['stem'], entry['answer'])
 
     def open_ai_win(self, q, a):
-        if not self.config.get('api_key'):
+        # 命中缓存时不需要联网，也就不要求配置密钥
+        cached = self.ai_cache.get(self._ai_cache_key(q, a))
+        if not cached and not self.config.get('api_key'):
             messagebox.showwarning("提示", "请先在设置中配置API密钥！")
             return
 
@@ -710,48 +1443,99 @@ class FinanceApp:
         txt = tk.Text(ai_w, font=self.FONTS['normal'], wrap="word", padx=15, pady=15)
         txt.pack(fill="both", expand=True)
         txt.insert(tk.END, "正在连接您的外置大脑...\n\n")
+        txt.tag_config("ai_head", font=("微软雅黑", 11, "bold"), foreground=self.COLORS['purple'])
+        txt.tag_config("ai_reasoning", foreground="#999")
+
+        if cached:
+            reasoning, content = cached
+            self._append_ai_stream(txt, {'kind': None}, [(k, t) for k, t in [('reasoning', reasoning),
+                                                                              ('content', content)] if t])
+            ai_w.title(f"{ai_w.title()} | 本地缓存")
+            return
+        sub = self.call_api(q, a, txt)
+        # 关闭窗口即取消订阅；没有其他窗口或预取在等同一条解析时，请求会被中断
+        ai_w.bind("<Destroy>", lambda e: sub.cancel() if e.widget is ai_w else None)
 
-        threading.Thread(target=self.call_api, args=(q, a, txt), daemon=True).start()
-
-    def call_api(self, q, a, widget):
-        prompt = f"""题目：{q}
-参考答案：{a}
-你是只猫娘，给出详细且好懂的解析，并指出考点。纯文本，不要markdown格式，星号也不要，对于选择题最好的回答方式是针对每一个选项回答为什么正确或者错误。说话要带上"喵"或者颜文字，适量即可"""
-
-        payload = {
-            "model": self.config['model'],
-            "messages": [
-                {"role": "system", "content": """你是一只可爱的猫娘，说话要带上"喵"的后缀。"""},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.3
-        }
-
-        if self.config.get('enable_reasoning', False):
-            payload["enable_thinking"] = True
+    def _ai_cache_key(self, q, a):
+        return explain_cache_key(self.config, q, a)
 
-        headers = {
-            "Authorization": f"Bearer {self.config['api_key']}",
-            "Content-Type": "application/json"
-        }
+    def submit_explanation(self, q, a, on_delta=None):
+        """通过调度器请求解析：与在途的相同请求合并，返回 AISubscription"""
+        return self.ai_scheduler.submit(
+            self._ai_cache_key(q, a),
+            lambda emit, cancelled: self.request_explanation(q, a, on_delta=emit, cancelled=cancelled),
+            on_delta=on_delta)
 
-        try:
-            r = requests.post(self.config['api_url'], json=payload, headers=headers, timeout=20)
-            if r.status_code == 200:
-                ans = r.json()['choices'][0]['message']['content']
-            else:
-                ans = f"API 返回错误 (状态码:{r.status_code})\n请检查API配置是否正确"
-        except Exception as err:
-            ans = f"网络错误: {err}\n\n请检查:\n1. API密钥是否正确\n2. 网络连接是否正常\n3. API端点是否可访问"
+    def request_explanation(self, q, a, on_delta=None, cancelled=None):
+        """请求一条解析（不涉及界面），成功后写入缓存并返回 (reasoning, content)，见 tiku_core.request_explanation"""
+        return request_explanation(self.ai_client, self.ai_cache, self.config, self.timings, q, a,
+                                   on_delta=on_delta, cancelled=cancelled)
 
-        self.root.after(0, lambda: self._update_ai_result(widget, ans))
-
-    def _update_ai_result(self, widget, content):
-        widget.delete(1.0, tk.END)
-        widget.insert(tk.END, content)
+    def call_api(self, q, a, widget):
+        """提交解析请求并把结果显示到 widget：片段先攒在 pending 里，每 AI_FLUSH_MS 毫秒由主线程批量写入。
+        返回 AISubscription，窗口关闭时调用其 cancel()"""
+        pending, lock = [], threading.Lock()
+        view = {'kind': None, 'scheduled': False}
+        start = time.perf_counter()
+        first_token = []
+
+        def flush():
+            with lock:
+                batch = pending[:]
+                pending.clear()
+                view['scheduled'] = False
+            self._append_ai_stream(widget, view, batch)
+
+        def push(kind, text):
+            if kind != 'error' and not first_token:
+                first_token.append(time.perf_counter() - start)
+            with lock:
+                pending.append((kind, text))
+                if view['scheduled']:
+                    return
+                view['scheduled'] = True
+            self.root.after(self.AI_FLUSH_MS, flush)
+
+        def done(future):
+            err = future.exception()
+            if isinstance(err, AIRequestError):
+                push('error', str(err))
+            elif err is not None:
+                push('error', f"\n\n网络错误: {err}\n\n请检查:\n1. API密钥是否正确\n2. 网络连接是否正常\n3. API端点是否可访问")
+            total = time.perf_counter() - start
+            timing = f"首字 {first_token[0]:.1f}s · 共 {total:.1f}s" if first_token else f"共 {total:.1f}s"
+            self.root.after(self.AI_FLUSH_MS, lambda: self._finish_ai_stream(widget, timing))
+
+        sub = self.submit_explanation(q, a, on_delta=push)
+        sub.add_done_callback(done)
+        return sub
+
+    def _append_ai_stream(self, widget, view, batch):
+        if not widget.winfo_exists() or not batch:
+            return
+        if view['kind'] is None:
+            widget.delete(1.0, tk.END)
+        for kind, text in batch:
+            if kind != view['kind']:
+                if kind == 'reasoning':
+                    widget.insert(tk.END, "【思考过程】\n", "ai_head")
+                elif kind == 'content' and view['kind'] == 'reasoning':
+                    widget.insert(tk.END, "\n\n【解析】\n", "ai_head")
+                view['kind'] = kind
+            widget.insert(tk.END, text, "ai_reasoning" if kind == 'reasoning' else ())
+        widget.see(tk.END)
+
+    def _finish_ai_stream(self, widget, timing):
+        if widget.winfo_exists():
+            top = widget.winfo_toplevel()
+            top.title(f"{top.title()} | {timing}")
 
 
 if __name__ == "__main__":
+    if '--serve' in sys.argv[1:]:
+        # 机房共享部署：不创建窗口，以本地 HTTP 服务运行（见 tiku_server.py）
+        from tiku_server import main
+        sys.exit(main(sys.argv[1:], base_dir=getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__)))))
     root = tk.Tk()
     # 窗口居中
     sw, sh = root.winfo_screenwidth(), root.winfo_screenheight()